@@ -0,0 +1,61 @@
+import numpy as np
+
+# --- Fused float32 feature scaling ---
+#
+# The fitted sklearn scaler is just a per-column affine map, x * scale + offset.
+# Calling scaler.transform() per predicted row built a one-row DataFrame,
+# reindexed its columns and computed in float64, and un-scaling one prediction
+# built a zero array as wide as every feature for inverse_transform(). This
+# keeps the fitted parameters as contiguous arrays instead: features are scaled
+# in one multiply-add straight into a (float32) NumPy buffer, and only the
+# target column is inverse-scaled. The results match sklearn to float32
+# rounding.
+
+
+class AffineScaler:
+    """
+    x * scale + offset per feature, from a fitted MinMaxScaler or StandardScaler.
+    'target' names the column inverse_target() un-scales.
+    """
+
+    def __init__(self, scale: np.ndarray, offset: np.ndarray, feature_names, target: str,
+                 clip: tuple | None = None):
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        # float32 for the model inputs...
+        self.scale = np.ascontiguousarray(scale, dtype=np.float32)
+        self.offset = np.ascontiguousarray(offset, dtype=np.float32)
+        self.clip = clip
+        # ...float64 for the target, which comes back out in kW
+        self.target_index = list(self.feature_names_in_).index(target)
+        self.target_scale = float(scale[self.target_index])
+        self.target_offset = float(offset[self.target_index])
+
+    @classmethod
+    def from_sklearn(cls, scaler, target: str = "Power demand") -> "AffineScaler":
+        if hasattr(scaler, "data_min_"): # MinMaxScaler: X * scale_ + min_
+            clip = scaler.feature_range if getattr(scaler, "clip", False) else None
+            return cls(scaler.scale_, scaler.min_, scaler.feature_names_in_, target, clip)
+        if hasattr(scaler, "mean_") or hasattr(scaler, "var_"): # StandardScaler: (X - mean_) / scale_
+            n = scaler.n_features_in_
+            mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n)
+            std = scaler.scale_ if scaler.scale_ is not None else np.ones(n)
+            return cls(1.0 / std, -mean / std, scaler.feature_names_in_, target)
+        raise TypeError(f"Unsupported scaler {type(scaler).__name__}; expected MinMaxScaler or StandardScaler.")
+
+    def transform(self, X: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Scales (n, n_features) raw values (columns in feature_names_in_ order) into
+        'out' (float32, same shape), or a new float32 array.
+        """
+        if out is None:
+            out = np.empty(np.shape(X), dtype=np.float32)
+        np.multiply(X, self.scale, out=out, casting="same_kind")
+        out += self.offset
+        if self.clip is not None:
+            np.clip(out, self.clip[0], self.clip[1], out=out)
+        return out
+
+    def inverse_target(self, scaled: np.ndarray) -> np.ndarray:
+        """Un-scales target column values (e.g. model outputs) to float64."""
+        return (np.asarray(scaled, dtype=np.float64) - self.target_offset) / self.target_scale
@@ -0,0 +1,142 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# main.load_artifacts() loads the model, scaler, rainfall, holidays and calendar table
+import main
+from dataset_cache import load_csv
+
+# --- Offline backtest of the 5-minute model ---
+#
+# Evaluating through /get_live_update costs an HTTP round trip and a full
+# feature_engineer() pass per step. This runs main.py's feature pipeline and
+# scaler ONCE over the whole dataset, takes every 288-step window as a strided
+# view of the scaled matrix (no copies), and runs the model in large batches.
+# Each window predicts the row right after it, exactly like /predict?steps=1
+# with that row's 2304-row history.
+#
+# Usage (from the directory the services run in):
+#   python backtest.py --data delhi_demand_final_cyclical.csv --start 2024-01-01 --batch-size 2048
+#   python backtest.py --output backtest_results.json
+
+RAW_COLUMNS = ['datetime', 'Power demand', 'temp', 'dwpt', 'rhum', 'wdir', 'wspd', 'pres', 'moving_avg_3']
+
+
+def build_windows(features_df: pd.DataFrame, feature_names, timesteps: int):
+    """
+    Scales the engineered rows and returns (windows, window_index, target_rows):
+    windows[i] is a (timesteps, n_features) view of rows i .. i+timesteps-1, and
+    window_index / target_rows list the usable windows and the rows they predict.
+    Windows spanning rows that feature_engineer() dropped (e.g. months without
+    rainfall data) are skipped.
+    """
+    scaled = main.feature_scaler.transform(features_df[feature_names].to_numpy(dtype=np.float64))
+    # (n_windows, n_features, timesteps) -> (n_windows, timesteps, n_features), both views
+    windows = sliding_window_view(scaled, timesteps, axis=0).transpose(0, 2, 1)[:-1]
+
+    # Only windows whose rows and target are consecutive in the raw data
+    source_rows = features_df['source_row'].to_numpy()
+    contiguous = source_rows[timesteps:] - source_rows[:-timesteps] == timesteps
+    window_index = np.flatnonzero(contiguous)
+    return windows, window_index, window_index + timesteps
+
+
+def run_backtest(raw_df: pd.DataFrame, batch_size: int = 2048, start=None, end=None) -> pd.DataFrame:
+    """
+    One row per predicted 5-minute interval: datetime, actual, predicted,
+    hour, season and is_holiday of the target row.
+    """
+    raw_df = raw_df[RAW_COLUMNS].copy()
+    raw_df['datetime'] = pd.to_datetime(raw_df['datetime'])
+    raw_df['source_row'] = np.arange(len(raw_df))
+
+    print(f"Engineering features for {len(raw_df)} rows...")
+    features_df = main.feature_engineer(raw_df)
+    feature_names = list(main.scaler.feature_names_in_)
+    windows, window_index, target_rows = build_windows(features_df, feature_names, main.TIMESTEPS)
+
+    targets = features_df.iloc[target_rows].reset_index(drop=True)
+    keep = np.ones(len(targets), dtype=bool)
+    if start is not None:
+        keep &= (targets['datetime'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        keep &= (targets['datetime'] < pd.Timestamp(end)).to_numpy()
+    window_index, targets = window_index[keep], targets[keep].reset_index(drop=True)
+
+    print(f"Predicting {len(window_index)} windows in batches of {batch_size}...")
+    scaled_preds = np.empty(len(window_index), dtype=np.float32)
+    started = time.perf_counter()
+    for lo in range(0, len(window_index), batch_size):
+        batch = windows[window_index[lo:lo + batch_size]] # fancy indexing: one copy per batch
+        scaled_preds[lo:lo + len(batch)] = np.asarray(main.runner.predict(batch)).reshape(len(batch), -1)[:, 0]
+    elapsed = time.perf_counter() - started
+    print(f"  {len(window_index) / max(elapsed, 1e-9):.0f} windows/s ({elapsed:.1f}s)")
+
+    return pd.DataFrame({
+        'datetime': targets['datetime'],
+        'actual': targets['Power demand'].to_numpy(),
+        'predicted': main.unscale_demand(scaled_preds.astype(np.float64)),
+        'hour': targets['hour'].to_numpy(),
+        'season': targets['season'].to_numpy(),
+        'is_holiday': targets['is_holiday'].to_numpy(),
+    })
+
+
+def error_metrics(results: pd.DataFrame, by=None) -> pd.DataFrame:
+    """
+    MAE, RMSE and MAPE (%) overall or per group. MAPE skips zero actuals.
+    """
+    errors = results.assign(
+        abs_error=(results['predicted'] - results['actual']).abs(),
+        sq_error=(results['predicted'] - results['actual']) ** 2,
+        pct_error=((results['predicted'] - results['actual']).abs()
+                   / results['actual'].abs().replace(0, np.nan)) * 100.0,
+    )
+    grouped = errors.groupby(by) if by else errors.groupby(lambda _: 'all')
+    summary = grouped.agg(
+        count=('abs_error', 'size'),
+        mae=('abs_error', 'mean'),
+        rmse=('sq_error', 'mean'),
+        mape=('pct_error', 'mean'),
+    )
+    summary['rmse'] = np.sqrt(summary['rmse'])
+    return summary
+
+
+def report(results: pd.DataFrame) -> dict:
+    """Overall metrics plus breakdowns per hour, season and holiday flag."""
+    return {
+        name: error_metrics(results, by).round(4).reset_index().to_dict(orient='records')
+        for name, by in [('overall', None), ('by_hour', 'hour'),
+                         ('by_season', 'season'), ('by_holiday', 'is_holiday')]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the 5-minute model over the historical dataset.")
+    parser.add_argument("--data", default="delhi_demand_final_cyclical.csv")
+    parser.add_argument("--start", help="first target datetime to score (inclusive)")
+    parser.add_argument("--end", help="last target datetime to score (exclusive)")
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--output", help="write the metrics as JSON here")
+    args = parser.parse_args()
+
+    main.startup.run(main.load_artifacts)
+    if not main.startup.ready:
+        raise SystemExit(f"Model artifacts not loaded: {main.startup.report()['errors']}")
+
+    results = run_backtest(load_csv(args.data, datetime_columns=['datetime']), args.batch_size, args.start, args.end)
+
+    metrics = report(results)
+    for name in ['overall', 'by_season', 'by_holiday', 'by_hour']:
+        print(f"\n--- {name} ---")
+        print(pd.DataFrame(metrics[name]).to_string(index=False))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(metrics, f, indent=2)
+        print(f"\nWrote {args.output}")
@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks measure the uncached path (see prediction_cache.py)
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+
+from synthetic_data import (
+    make_5min_frame, make_5min_payload, make_monthly_frame, make_monthly_payload, make_rainfall_frame,
+    save_demand_model
+)
+
+# --- Benchmark suite for the forecasting pipeline ---
+#
+# Reproducible, in-process benchmarks on synthetic inputs (synthetic_data.py),
+# so neither the real CSVs nor running servers are needed. The scaler and the
+# monthly model are loaded from model_artifacts/ like the services do; the
+# rainfall table, the calendar table built from it and an untrained demand model
+# with the shipped layers at the scaler's width come from a temporary directory,
+# so the timings don't depend on the shipped .keras files matching the scaler
+# (see check_input_width in main.py). Every benchmark runs
+# 'warmup' untimed + 'repeats' timed iterations, then one more under tracemalloc
+# for its peak Python/NumPy allocation. Results go to a JSON file; 'compare'
+# flags benchmarks whose median time or peak memory grew by more than the
+# threshold between two runs (exit code 1, so CI can gate on it).
+#
+# Usage (from this directory):
+#   python benchmark.py run --output benchmark_results/before.json
+#   python benchmark.py run --only feature_engineer predict_1_step
+#   python benchmark.py compare benchmark_results/before.json benchmark_results/after.json
+
+RESULTS_DIR = "benchmark_results"
+DEFAULT_REPEATS = 20
+DEFAULT_WARMUP = 3
+RECURSIVE_STEPS = 12 # one hour ahead
+# Relative growth of the median time / peak memory reported as a regression
+REGRESSION_THRESHOLD = 0.10
+# Differences below these are noise whatever the ratio
+MIN_DELTA_MS = 0.05
+MIN_DELTA_MB = 0.5
+
+
+def time_calls(fn, repeats: int, warmup: int) -> dict:
+    """Runs fn() warmup + repeats times; latency stats (ms) of the timed calls and their peak memory."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "unit": "ms",
+        "repeats": repeats,
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p90": float(np.percentile(times, 90)),
+        "min": min(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+class Suite:
+    """
+    Builds the benchmarks lazily: main.py / monthly_api.py / the simulator are
+    imported and loaded only if a selected benchmark needs them.
+    """
+
+    def __init__(self):
+        self._main_module = None
+        self._main = None
+        self._monthly = None
+        self._clients = {}
+        self._scratch = tempfile.TemporaryDirectory(prefix="benchmark-")
+
+    def main_module(self):
+        """main.py (not loaded) pointed at synthetic rainfall for the calendar years in the scratch directory."""
+        if self._main_module is None:
+            import main
+            main.RAINFALL_CSV_PATH = os.path.join(self._scratch.name, "monthly_rainfall.csv")
+            main.CALENDAR_TABLE_PATH = os.path.join(self._scratch.name, "calendar_features.npz")
+            make_rainfall_frame(main.CALENDAR_START_YEAR, main.CALENDAR_END_YEAR).to_csv(
+                main.RAINFALL_CSV_PATH, index=False)
+            self._main_module = main
+        return self._main_module
+
+    def features(self):
+        """main.py with only what feature_engineer() reads: rainfall, holidays and the calendar table."""
+        main = self.main_module()
+        if main.CALENDAR is None:
+            from calendar_table import CalendarTable, load_rainfall_data
+            from feature_buffer import build_holiday_dates, build_rainfall_lookup
+            main.RAINFALL_DATA = load_rainfall_data(main.RAINFALL_CSV_PATH)
+            main.HOLIDAY_LIST = main.load_holidays()
+            main.RAINFALL_LOOKUP = build_rainfall_lookup(main.RAINFALL_DATA)
+            main.HOLIDAY_DATES = build_holiday_dates(main.HOLIDAY_LIST)
+            main.CALENDAR = CalendarTable.load_or_build(
+                main.CALENDAR_TABLE_PATH, main.CALENDAR_START_YEAR, main.CALENDAR_END_YEAR,
+                main.HOLIDAY_DATES, main.RAINFALL_LOOKUP
+            )
+        return main
+
+    def main(self):
+        if self._main is None:
+            main = self.main_module()
+            # The stand-in demand model; no benchmark uses the horizon models
+            main.MODEL_PATH = os.path.join(self._scratch.name, "demand_model.keras")
+            save_demand_model(main.MODEL_PATH, len(main.load_scaler().feature_names_in_), main.TIMESTEPS)
+            main.HORIZON_MODEL_PATHS = {}
+            main.startup.run(main.load_artifacts)
+            if not main.startup.ready:
+                raise RuntimeError(f"main.py artifacts failed to load: {main.startup.report()['errors']}")
+            self._main = main
+        return self._main
+
+    def monthly_api(self):
+        if self._monthly is None:
+            import monthly_api
+            monthly_api.startup.run(monthly_api.load_artifacts)
+            if not monthly_api.startup.ready:
+                raise RuntimeError(f"monthly_api.py artifacts failed to load: {monthly_api.startup.report()['errors']}")
+            self._monthly = monthly_api
+        return self._monthly
+
+    def client(self, module):
+        from fastapi.testclient import TestClient
+        if module.__name__ not in self._clients:
+            self._clients[module.__name__] = TestClient(module.app)
+        return self._clients[module.__name__]
+
+    # Each benchmark returns (callable, extra result fields)
+
+    def feature_engineer(self):
+        main = self.features()
+        raw = make_5min_frame().rename(columns={"Power_demand": "Power demand"})
+        raw["datetime"] = pd.to_datetime(raw["datetime"])
+        return (lambda: main.feature_engineer(raw)), {"rows": len(raw)}
+
+    def _predict(self, steps: int):
+        main = self.main()
+        client = self.client(main)
+        payload = make_5min_payload()
+
+        def call():
+            response = client.post(f"/predict?steps={steps}", json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict returned {response.status_code}: {response.text[:300]}")
+        return call, {"rows": len(payload), "steps": steps}
+
+    def predict_1_step(self):
+        return self._predict(1)
+
+    def predict_n_step(self):
+        return self._predict(RECURSIVE_STEPS)
+
+    def predict_monthly(self):
+        monthly_api = self.monthly_api()
+        client = self.client(monthly_api)
+        payload = make_monthly_payload()
+
+        def call():
+            response = client.post("/predict_monthly", json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict_monthly returned {response.status_code}: {response.text[:300]}")
+        return call, {"months": len(payload)}
+
+    def _simulator(self, rows: int):
+        """simulator_api_v2 over synthetic datasets, loaded the way load_all_data() does."""
+        import simulator_api_v2 as sim
+        from simulation_data import FiveMinuteSeries, MonthlySeries
+        from simulation_sessions import SessionRegistry
+
+        five_min = make_5min_frame(rows, start="2024-01-01 00:00:00").rename(columns={"Power_demand": "Power demand"})
+        five_min["datetime"] = pd.to_datetime(five_min["datetime"])
+        monthly = make_monthly_frame(months=36, start_year=2022).rename(columns={"Year": "year", "Month": "month"})
+        monthly["date"] = pd.to_datetime(monthly[["year", "month"]].assign(day=1)) + pd.offsets.MonthEnd(0)
+        monthly = monthly.set_index("date").sort_index()
+
+        sim.GLOBAL_DATA_5MIN_DF, sim.GLOBAL_DATA_MONTHLY_DF = five_min, monthly
+        sim.FIVE_MIN_SERIES, sim.MONTHLY_SERIES = FiveMinuteSeries(five_min), MonthlySeries(monthly)
+        sim.monthly_bounds.cache_clear()
+        sim.sessions = SessionRegistry(sim.FIVE_MIN_SERIES.datetimes, sim.REQUIRED_5MIN_HISTORY_ROWS,
+                                       sim.REQUIRED_5MIN_HISTORY_ROWS)
+        return sim
+
+    def simulator_prepare_tick(self):
+        """Data side of a tick: row, both prediction inputs (HTTP bodies) and the graph data."""
+        sim = self._simulator(rows=2304 + 4096)
+        state = {"index": sim.REQUIRED_5MIN_HISTORY_ROWS}
+
+        def call():
+            sim.prepare_tick(state["index"], state["index"] + 1)
+            # Walk through the data and wrap around before its last row
+            state["index"] = sim.REQUIRED_5MIN_HISTORY_ROWS + (state["index"] + 1 - sim.REQUIRED_5MIN_HISTORY_ROWS) % 4000
+        return call, {"wire_format": sim.PREDICTION_5MIN_WIRE_FORMAT}
+
+    def simulator_tick_inprocess(self):
+        """A full tick with both predictors in this process (PREDICTION_MODE=inprocess)."""
+        self.main(), self.monthly_api()
+        sim = self._simulator(rows=2304 + 4096)
+        from prediction_engines import InProcessEngine
+        engine = InProcessEngine()
+        engine.main, engine.monthly_api = self._main, self._monthly
+        sim.engine = engine
+
+        import asyncio
+        loop = asyncio.new_event_loop()
+
+        def call():
+            update = loop.run_until_complete(sim.advance_tick())
+            if update["predicted_next_5_min_demand_kw"] is None:
+                raise RuntimeError("5-min prediction failed during the tick (see the warning above).")
+        return call, {}
+
+
+BENCHMARKS = [
+    "feature_engineer", "predict_1_step", "predict_n_step", "predict_monthly",
+    "simulator_prepare_tick", "simulator_tick_inprocess",
+]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, repeats: int, warmup: int) -> dict:
+    suite = Suite()
+    results = {}
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        try:
+            fn, extra = getattr(suite, name)()
+            result = {**time_calls(fn, repeats, warmup), **extra}
+            if name == "feature_engineer":
+                result["rows_per_second"] = extra["rows"] / (result["median"] / 1000.0)
+            print(f"  median {result['median']:.3f} ms, p90 {result['p90']:.3f} ms, "
+                  f"peak {result['peak_memory_mb']:.1f} MB")
+        except Exception as e:
+            # Recorded, not fatal: the other benchmarks still run
+            result = {"error": f"{type(e).__name__}: {e}"}
+            print(f"  failed: {result['error']}")
+        results[name] = result
+
+    return {
+        "meta": {
+            "created_utc": datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": os.environ.get("INFERENCE_BACKEND", "keras"),
+            "repeats": repeats,
+            "warmup": warmup,
+            # ru_maxrss is KiB on Linux
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    One row per benchmark in both runs: medians, peaks, ratios and whether
+    time or memory regressed (grew by more than 'threshold' and the noise floor).
+    """
+    rows = []
+    for name in sorted(set(old["benchmarks"]) & set(new["benchmarks"])):
+        before, after = old["benchmarks"][name], new["benchmarks"][name]
+        if "error" in before or "error" in after:
+            rows.append({"name": name, "error": after.get("error") or before.get("error"),
+                         "regression": "error" in after and "error" not in before})
+            continue
+        time_ratio = after["median"] / before["median"]
+        memory_ratio = after["peak_memory_mb"] / before["peak_memory_mb"] if before["peak_memory_mb"] else 1.0
+        slower = time_ratio > 1 + threshold and after["median"] - before["median"] > MIN_DELTA_MS
+        bigger = memory_ratio > 1 + threshold and after["peak_memory_mb"] - before["peak_memory_mb"] > MIN_DELTA_MB
+        rows.append({
+            "name": name,
+            "median_before_ms": before["median"],
+            "median_after_ms": after["median"],
+            "time_ratio": time_ratio,
+            "peak_before_mb": before["peak_memory_mb"],
+            "peak_after_mb": after["peak_memory_mb"],
+            "memory_ratio": memory_ratio,
+            "regression": slower or bigger,
+        })
+    return rows
+
+
+def print_comparison(rows: list):
+    print(f"{'benchmark':<26}{'before ms':>12}{'after ms':>12}{'ratio':>8}{'peak MB':>16}{'ratio':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        if "error" in row:
+            print(f"{row['name']:<26}{'error: ' + row['error'][:60]}{flag}")
+            continue
+        print(f"{row['name']:<26}{row['median_before_ms']:>12.3f}{row['median_after_ms']:>12.3f}"
+              f"{row['time_ratio']:>8.2f}"
+              f"{row['peak_before_mb']:>7.1f} -> {row['peak_after_mb']:<6.1f}{row['memory_ratio']:>8.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting pipeline and compare runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run (default: all)")
+    run_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    run_parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    run_parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<timestamp>.json)")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help="relative growth reported as a regression (0.10 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_suite(args.only or BENCHMARKS, args.repeats, args.warmup)
+        output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        rows = compare(before, after, args.threshold)
+        print_comparison(rows)
+        regressions = [row["name"] for row in rows if row["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
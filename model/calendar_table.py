@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from feature_buffer import SEASON_MAP, SEASONS
+
+# --- Precomputed calendar / exogenous feature table ---
+#
+# Everything feature_engineer() derives from the timestamp alone (calendar
+# breakdown, weekend / holiday flags, monthly rainfall, sin/cos encodings,
+# season) is computed once for a range of years and looked up by integer
+# offset: offset = (timestamp - epoch) / 5 minutes, epoch = Jan 1 of the first
+# year. The table is stored factorized, so it stays small and exact (float64):
+#   - a per-day block (n_days rows), row = offset // 288
+#   - a per-5-minute-slot block (288 rows), row = offset % 288
+#
+# Regenerate it for other years with:
+#   python calendar_table.py --start-year 2021 --end-year 2030 \
+#       --rainfall model_artifacts/monthly_rainfall.csv --out model_artifacts/calendar_features.npz
+
+SLOTS_PER_DAY = 288
+STEP = np.timedelta64(5, 'm')
+
+DAILY_COLUMNS = [
+    'year', 'month', 'day', 'day_of_week', 'is_weekend', 'is_holiday',
+    'has_rainfall', 'Monthly_Rainy_Days', 'Monthly_Total_Rainfall',
+    'day_of_week_sin', 'day_of_week_cos', 'month_sin', 'month_cos', 'season_code',
+]
+INTRADAY_COLUMNS = ['hour', 'minute', 'hour_sin', 'hour_cos']
+
+
+def load_rainfall_data(path: str) -> pd.DataFrame:
+    """
+    Reads the wide rainfall CSV (Year, Metric, Jan..Dec) into the tidy
+    [Year, month, Monthly_Rainy_Days, Monthly_Total_Rainfall] frame.
+    """
+    rainfall_df_raw = pd.read_csv(path)
+    rainfall_long = rainfall_df_raw.melt(
+        id_vars=['Year', 'Metric'],
+        value_vars=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+        var_name='MonthName', value_name='Value'
+    )
+    rainfall_tidy = rainfall_long.pivot_table(
+        index=['Year', 'MonthName'], columns='Metric', values='Value'
+    ).reset_index().rename(columns={
+        'Rainy Days': 'Monthly_Rainy_Days',
+        'Total Rainfall': 'Monthly_Total_Rainfall'
+    })
+    month_map = {
+        'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+        'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+    }
+    rainfall_tidy['month'] = rainfall_tidy['MonthName'].map(month_map)
+    return rainfall_tidy[['Year', 'month', 'Monthly_Rainy_Days', 'Monthly_Total_Rainfall']].copy()
+
+
+def source_fingerprint(start_year: int, end_year: int, holiday_dates, rainfall_lookup) -> str:
+    """Hash of everything the table is built from, to detect stale files."""
+    h = hashlib.sha1(f"{start_year}-{end_year}".encode())
+    h.update(",".join(sorted(d.isoformat() for d in holiday_dates)).encode())
+    h.update(repr(sorted(rainfall_lookup.items())).encode())
+    return h.hexdigest()
+
+
+class CalendarTable:
+    """
+    Calendar features at 5-minute resolution for [start_year, end_year].
+    """
+
+    def __init__(self, start_year: int, end_year: int, daily: np.ndarray,
+                 intraday: np.ndarray, fingerprint: str):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.daily = daily
+        self.intraday = intraday
+        self.fingerprint = fingerprint
+        self.epoch = np.datetime64(f"{start_year}-01-01T00:00", 'm')
+        self.size = len(daily) * SLOTS_PER_DAY
+        self._daily_index = {name: i for i, name in enumerate(DAILY_COLUMNS)}
+        self._intraday_index = {name: i for i, name in enumerate(INTRADAY_COLUMNS)}
+
+    @classmethod
+    def build(cls, start_year: int, end_year: int, holiday_dates, rainfall_lookup) -> "CalendarTable":
+        """
+        Computes the table. 'holiday_dates' is a set of dates and 'rainfall_lookup'
+        maps (year, month) -> (rainy_days, total_rainfall), as in feature_buffer.py.
+        """
+        first, last = date(start_year, 1, 1), date(end_year, 12, 31)
+        days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+        daily = np.zeros((len(days), len(DAILY_COLUMNS)), dtype=np.float64)
+        for i, d in enumerate(days):
+            day_of_week = d.weekday()
+            rainfall = rainfall_lookup.get((d.year, d.month))
+            daily[i] = [
+                d.year, d.month, d.day, day_of_week,
+                int(day_of_week in (5, 6)),
+                int(d in holiday_dates),
+                int(rainfall is not None),
+                rainfall[0] if rainfall else 0.0,
+                rainfall[1] if rainfall else 0.0,
+                np.sin(2 * np.pi * day_of_week / 7.0),
+                np.cos(2 * np.pi * day_of_week / 7.0),
+                np.sin(2 * np.pi * d.month / 12.0),
+                np.cos(2 * np.pi * d.month / 12.0),
+                SEASONS.index(SEASON_MAP[d.month]),
+            ]
+
+        intraday = np.zeros((SLOTS_PER_DAY, len(INTRADAY_COLUMNS)), dtype=np.float64)
+        for slot in range(SLOTS_PER_DAY):
+            hour, minute = divmod(slot * 5, 60)
+            intraday[slot] = [
+                hour, minute,
+                np.sin(2 * np.pi * hour / 24.0),
+                np.cos(2 * np.pi * hour / 24.0),
+            ]
+
+        fingerprint = source_fingerprint(start_year, end_year, holiday_dates, rainfall_lookup)
+        return cls(start_year, end_year, daily, intraday, fingerprint)
+
+    def save(self, path: str):
+        np.savez(
+            path, daily=self.daily, intraday=self.intraday,
+            years=np.array([self.start_year, self.end_year]),
+            fingerprint=np.array(self.fingerprint),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CalendarTable":
+        with np.load(path, allow_pickle=False) as saved:
+            start_year, end_year = (int(y) for y in saved['years'])
+            return cls(start_year, end_year, saved['daily'], saved['intraday'], str(saved['fingerprint']))
+
+    @classmethod
+    def load_or_build(cls, path: str, start_year: int, end_year: int,
+                      holiday_dates, rainfall_lookup) -> "CalendarTable":
+        """
+        Loads the table from 'path' if it was built from the same years, holidays and
+        rainfall; otherwise rebuilds it and writes it back.
+        """
+        expected = source_fingerprint(start_year, end_year, holiday_dates, rainfall_lookup)
+        if path and os.path.exists(path):
+            table = cls.load(path)
+            if table.fingerprint == expected:
+                return table
+            print("Calendar table is stale, rebuilding...")
+        table = cls.build(start_year, end_year, holiday_dates, rainfall_lookup)
+        if path:
+            table.save(path)
+        return table
+
+    def offsets(self, timestamps) -> np.ndarray | None:
+        """
+        Integer offsets of 'timestamps' from the epoch, or None if any of them is not
+        on the 5-minute grid or falls outside the table.
+        """
+        minutes = np.asarray(timestamps)
+        if minutes.dtype.kind != 'M':
+            return None # e.g. tz-aware timestamps, whose calendar fields are local time
+        minutes = minutes.astype('datetime64[ns]')
+        if np.any(minutes != minutes.astype('datetime64[m]')):
+            return None # seconds / sub-second parts
+        delta = minutes.astype('datetime64[m]') - self.epoch
+        if np.any(delta % STEP != np.timedelta64(0, 'm')):
+            return None
+        offsets = (delta // STEP).astype(np.int64)
+        if len(offsets) and (offsets.min() < 0 or offsets.max() >= self.size):
+            return None
+        return offsets
+
+    def columns(self, offsets: np.ndarray) -> dict:
+        """
+        {column name: array} for the rows at 'offsets' (DAILY_COLUMNS + INTRADAY_COLUMNS).
+        """
+        day_rows = self.daily[offsets // SLOTS_PER_DAY]
+        slot_rows = self.intraday[offsets % SLOTS_PER_DAY]
+        out = {name: day_rows[:, i] for name, i in self._daily_index.items()}
+        out.update({name: slot_rows[:, i] for name, i in self._intraday_index.items()})
+        return out
+
+
+if __name__ == "__main__":
+    import holidays
+    from feature_buffer import build_holiday_dates, build_rainfall_lookup
+
+    parser = argparse.ArgumentParser(description="Regenerate the calendar feature table.")
+    parser.add_argument("--start-year", type=int, required=True)
+    parser.add_argument("--end-year", type=int, required=True)
+    parser.add_argument("--rainfall", default="model_artifacts/monthly_rainfall.csv")
+    parser.add_argument("--out", default="model_artifacts/calendar_features.npz")
+    args = parser.parse_args()
+
+    years = list(range(args.start_year, args.end_year + 1))
+    holiday_dates = build_holiday_dates(holidays.India(subdiv='DL', years=years))
+    rainfall_lookup = build_rainfall_lookup(load_rainfall_data(args.rainfall))
+
+    table = CalendarTable.build(args.start_year, args.end_year, holiday_dates, rainfall_lookup)
+    table.save(args.out)
+    print(f"Wrote {table.size} rows ({len(table.daily)} days) to {args.out}")
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# --- Memory-mapped columnar cache for the CSV datasets ---
+#
+# The simulators used to pd.read_csv() and parse the datetimes of the full
+# dataset at startup, once per uvicorn worker, each worker holding its own copy.
+# The first load now converts the CSV to one .npy file per column (datetimes as
+# datetime64); every later load memory-maps those files read-only, so startup
+# is a few np.load() calls and the pages are shared by all workers through the
+# OS page cache. The cache is rebuilt when the CSV's size or mtime changes.
+
+CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", ".dataset_cache")
+CACHE_FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def _cache_key(csv_path: str, datetime_columns) -> dict:
+    source = os.stat(csv_path)
+    return {
+        "source": os.path.abspath(csv_path),
+        "size": source.st_size,
+        "mtime_ns": source.st_mtime_ns,
+        "datetime_columns": list(datetime_columns),
+        "version": CACHE_FORMAT_VERSION,
+    }
+
+
+def _read_meta(cache_path: str) -> dict | None:
+    try:
+        with open(os.path.join(cache_path, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _build(csv_path: str, key: dict, cache_path: str):
+    df = pd.read_csv(csv_path)
+    for col in key["datetime_columns"]:
+        df[col] = pd.to_datetime(df[col])
+
+    tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            # Fixed-width unicode, so the file loads without pickle
+            values = values.astype(str)
+        np.save(os.path.join(tmp_path, f"{i:04d}.npy"), values)
+    with open(os.path.join(tmp_path, META_FILE), "w") as f:
+        json.dump({"key": key, "columns": list(df.columns), "rows": len(df)}, f)
+
+    # Swap the new cache in. If another worker got there first its cache is just as good.
+    old_path = f"{cache_path}.old-{os.getpid()}"
+    if os.path.exists(cache_path):
+        os.rename(cache_path, old_path)
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_csv(csv_path: str, datetime_columns=(), cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    pd.read_csv(csv_path) with 'datetime_columns' parsed by pd.to_datetime(), served
+    from the memory-mapped cache (built on first use or when the CSV changed).
+    The returned DataFrame's columns are read-only views of the cache files.
+    """
+    key = _cache_key(csv_path, datetime_columns)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    digest = hashlib.sha1(key["source"].encode()).hexdigest()[:8]
+    cache_path = os.path.join(cache_dir, f"{name}-{digest}")
+
+    meta = _read_meta(cache_path)
+    if meta is None or meta["key"] != key:
+        print(f"Building columnar cache for {csv_path} in {cache_path}...")
+        os.makedirs(cache_dir, exist_ok=True)
+        _build(csv_path, key, cache_path)
+        meta = _read_meta(cache_path)
+        if meta is None:
+            raise OSError(f"Could not build the dataset cache in {cache_path}.")
+
+    columns = {
+        col: np.load(os.path.join(cache_path, f"{i:04d}.npy"), mmap_mode='r', allow_pickle=False)
+        for i, col in enumerate(meta["columns"])
+    }
+    return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,161 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+from inference import InferenceRunner, TFLiteRunner, tflite_path, tflite_paths
+
+# --- Export the Keras models to quantized TFLite ---
+#
+# Writes <model>.b<n>.tflite next to a .keras file for INFERENCE_BACKEND=tflite
+# (see inference.py), then checks it against the Keras model on the same
+# windows and fails if the outputs drift more than --tolerance. New exports are
+# written under temporary names and only replace the current ones once the
+# check passes, so a failed conversion leaves the service's exports as they were.
+#
+# The LSTMs only lower to TFLite's fused kernels with a static batch size, so
+# one file is exported per --batch-sizes entry.
+#
+# Usage (from the directory the services run in):
+#   python export_model.py model_artifacts/best_demand_model.keras
+#   python export_model.py model_artifacts/best_seq2seq_model.keras --batch-sizes 1 8
+#   python export_model.py model_artifacts/best_demand_model.keras --check-only
+
+# Full int8 (with a representative dataset) crashes the converter on these LSTMs.
+# 'dynamic' (int8 weights) is the smallest but drifts by ~0.02 on the scaled
+# outputs; float16 halves the weights and stays within ~3e-4.
+QUANTIZATION_MODES = ["none", "dynamic", "float16"]
+# Batched TFLite is slower than Keras for these models (the exported graph
+# grows with the batch size), so by default only single windows are exported
+# and TFLiteRunner hands larger batches to Keras.
+DEFAULT_BATCH_SIZES = [1]
+
+
+def parity_windows(input_shape, samples: int, seed: int = 0, path: str = None) -> np.ndarray:
+    """
+    Windows for the parity check: a saved (n, timesteps, n_features) .npy of real
+    scaled windows if given, otherwise uniform values in the MinMax scaler's [0, 1] range.
+    """
+    if path:
+        return np.load(path).astype(np.float32)[:samples]
+    rng = np.random.default_rng(seed)
+    return rng.random((samples,) + tuple(input_shape[1:]), dtype=np.float32)
+
+
+def convert(model, batch_size: int, quantize: str) -> bytes:
+    """Converts 'model' to a TFLite flatbuffer for a fixed batch size."""
+    forward = tf.function(lambda x: model(x, training=False))
+    spec = tf.TensorSpec((batch_size,) + tuple(model.input_shape[1:]), tf.float32)
+    # Bake the weights in as constants; the converted resource-variable reads fail at invoke
+    frozen = convert_variables_to_constants_v2(forward.get_concrete_function(spec))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([frozen])
+    if quantize != "none":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def publish(keras_path: str, staged: dict):
+    """
+    Moves checked exports ({batch size: temporary path}) into place and removes
+    the exports of batch sizes that are no longer requested.
+    """
+    for batch_size, path in tflite_paths(keras_path).items():
+        if batch_size not in staged:
+            os.remove(path)
+    for batch_size, path in staged.items():
+        os.replace(path, tflite_path(keras_path, batch_size))
+
+
+def parity_check(keras_runner: InferenceRunner, lite_runner: TFLiteRunner, windows: np.ndarray) -> dict:
+    """
+    Compares the two backends on the same windows (scaled outputs) and times both.
+    """
+    started = time.perf_counter()
+    expected = keras_runner.predict(windows).reshape(len(windows), -1)
+    keras_s = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = lite_runner.predict(windows).reshape(len(windows), -1)
+    lite_s = time.perf_counter() - started
+
+    error = np.abs(actual - expected)
+    single = windows[:1]
+    keras_runner.predict(single)
+    lite_runner.predict(single)
+    started = time.perf_counter()
+    for _ in range(20):
+        keras_runner.predict(single)
+    keras_single_ms = (time.perf_counter() - started) / 20 * 1000.0
+    started = time.perf_counter()
+    for _ in range(20):
+        lite_runner.predict(single)
+    lite_single_ms = (time.perf_counter() - started) / 20 * 1000.0
+
+    return {
+        "windows": len(windows),
+        "max_abs_error": float(error.max()),
+        "mean_abs_error": float(error.mean()),
+        # Scaled outputs live in ~[0, 1], so this is roughly a fraction of the demand range
+        "max_error_vs_output_range": float(error.max() / max(np.ptp(expected), 1e-9)),
+        "keras_batch_ms": keras_s * 1000.0,
+        "tflite_batch_ms": lite_s * 1000.0,
+        "keras_single_ms": keras_single_ms,
+        "tflite_single_ms": lite_single_ms,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a Keras model to TFLite and check parity.")
+    parser.add_argument("model", help="path to the .keras model")
+    parser.add_argument("--quantize", choices=QUANTIZATION_MODES, default="float16")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--windows", help=".npy of real scaled windows for the parity check")
+    parser.add_argument("--samples", type=int, default=256, help="windows used for the parity check")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="max allowed absolute error on the scaled outputs")
+    parser.add_argument("--check-only", action="store_true", help="only run the parity check")
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    windows = parity_windows(model.input_shape, args.samples, path=args.windows)
+
+    staged = {}
+    try:
+        if not args.check_only:
+            for batch_size in sorted(args.batch_sizes):
+                print(f"Converting {args.model} ({args.quantize}, batch size {batch_size})...")
+                flatbuffer = convert(model, batch_size, args.quantize)
+                staged[batch_size] = tflite_path(args.model, batch_size) + ".tmp"
+                with open(staged[batch_size], "wb") as f:
+                    f.write(flatbuffer)
+                print(f"  Wrote {staged[batch_size]} ({len(flatbuffer) / 1024:.0f} KB)")
+
+        paths = staged or tflite_paths(args.model)
+        if not paths:
+            sys.exit(f"No .tflite export of {args.model} found.")
+        keras_runner = InferenceRunner(model, name="keras")
+        keras_runner.warm_up()
+        lite_runner = TFLiteRunner(paths, name="tflite")
+        lite_runner.warm_up()
+        report = parity_check(keras_runner, lite_runner, windows)
+        for key, value in report.items():
+            print(f"  {key}: {value:.6g}" if isinstance(value, float) else f"  {key}: {value}")
+
+        if report["max_abs_error"] > args.tolerance:
+            print(f"FAILED: max abs error {report['max_abs_error']:.6g} > tolerance {args.tolerance}")
+            sys.exit(1)
+        if staged:
+            publish(args.model, staged)
+            print(f"Published {', '.join(tflite_path(args.model, b) for b in staged)}")
+            staged = {}
+        print("Parity OK")
+    finally:
+        # Exports that failed conversion or the parity check
+        for path in staged.values():
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,237 @@
+import copy
+
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from affine_scaler import AffineScaler
+
+# --- Rolling feature buffer for recursive forecasting ---
+#
+# The recursive /predict loop used to re-run the full feature_engineer()
+# pipeline on the whole 2304-row window for every step. Only the newest row
+# actually changes between steps, so this buffer keeps:
+#   - a ring of raw demand values (long enough for the 1-week lag),
+#   - the last raw row (for the naive "weather doesn't change" assumption),
+#   - a double-written ring of *scaled* feature rows for the model window.
+# Each new row computes only its own calendar / lag / cyclical / season
+# features and is scaled on its own, so a step costs the same regardless of
+# the window size. Scaling is the fused float32 affine map (affine_scaler.py),
+# written straight into the window: no DataFrame and no allocation per step.
+#
+# fork(K) turns one buffer into K trajectories advanced together (Monte Carlo
+# forecasts): every array gets a leading trajectory axis, calendar features
+# are computed once per step for all of them, and windows() is the
+# (K, timesteps, n_features) batch for one forward pass.
+
+SEASON_MAP = {
+    1: 'Winter', 2: 'Winter', 3: 'Summer', 4: 'Summer', 5: 'Summer',
+    6: 'Monsoon', 7: 'Monsoon', 8: 'Monsoon', 9: 'Monsoon',
+    10: 'Post-Monsoon', 11: 'Post-Monsoon', 12: 'Winter'
+}
+SEASONS = ['Winter', 'Summer', 'Monsoon', 'Post-Monsoon']
+
+WEATHER_COLUMNS = ['temp', 'dwpt', 'rhum', 'wdir', 'wspd', 'pres']
+
+# Lags used by feature_engineer(), in rows of 5 minutes
+LAG_1HR = 12
+LAG_24HR = 288
+LAG_1WEEK = 2016
+
+STEP = timedelta(minutes=5)
+
+
+def build_rainfall_lookup(rainfall_data: pd.DataFrame) -> dict:
+    """
+    Turns the tidy RAINFALL_DATA frame into a {(year, month): (rainy_days, total_rainfall)}
+    dict so single rows don't need a pandas merge. Missing values become 0, like the
+    fillna(0) after the merge in feature_engineer(). Months that are not in the table
+    are not in the dict either (see engineer_row()).
+    """
+    lookup = {}
+    for year, month, rainy_days, total in rainfall_data[
+        ['Year', 'month', 'Monthly_Rainy_Days', 'Monthly_Total_Rainfall']
+    ].itertuples(index=False):
+        lookup[(int(year), int(month))] = (
+            0.0 if pd.isna(rainy_days) else float(rainy_days),
+            0.0 if pd.isna(total) else float(total),
+        )
+    return lookup
+
+
+def build_holiday_dates(holiday_list) -> frozenset:
+    """
+    Snapshot of the holiday dates. `date in holidays.India(...)` silently adds new
+    years to the object, while Series.isin() only sees the years that were loaded,
+    so we freeze the loaded keys to keep the same behaviour.
+    """
+    return frozenset(holiday_list.keys())
+
+
+def engineer_row(ts, demand, moving_avg, weather, lags, holiday_dates, rainfall_lookup) -> dict:
+    """
+    Computes the feature_engineer() columns for ONE raw row.
+
+    'weather' maps WEATHER_COLUMNS to values and 'lags' is (lag_1hr, lag_24hr, lag_1week).
+    """
+    month = ts.month
+    day_of_week = ts.weekday()
+    season = SEASON_MAP[month]
+
+    # The left merge leaves the right-hand 'Year' column NaN for months missing from
+    # the rainfall table, and feature_engineer()'s dropna() then removes the row.
+    rainfall = rainfall_lookup.get((ts.year, month))
+    if rainfall is None:
+        rainfall_year, (rainy_days, total_rainfall) = np.nan, (0.0, 0.0)
+    else:
+        rainfall_year, (rainy_days, total_rainfall) = ts.year, rainfall
+
+    row = {
+        'Power demand': demand,
+        'moving_avg_3': moving_avg,
+        'year': ts.year,
+        'month': month,
+        'day': ts.day,
+        'hour': ts.hour,
+        'minute': ts.minute,
+        'day_of_week': day_of_week,
+        'is_weekend': int(day_of_week in (5, 6)),
+        'is_holiday': int(ts.date() in holiday_dates),
+        'Year': rainfall_year,
+        'Monthly_Rainy_Days': rainy_days,
+        'Monthly_Total_Rainfall': total_rainfall,
+        'demand_lag_1hr': lags[0],
+        'demand_lag_24hr': lags[1],
+        'demand_lag_1week': lags[2],
+        'hour_sin': np.sin(2 * np.pi * ts.hour / 24.0),
+        'hour_cos': np.cos(2 * np.pi * ts.hour / 24.0),
+        'day_of_week_sin': np.sin(2 * np.pi * day_of_week / 7.0),
+        'day_of_week_cos': np.cos(2 * np.pi * day_of_week / 7.0),
+        'month_sin': np.sin(2 * np.pi * month / 12.0),
+        'month_cos': np.cos(2 * np.pi * month / 12.0),
+    }
+    row.update(weather)
+    for s in SEASONS:
+        row[f'season_{s}'] = int(season == s)
+    return row
+
+
+class RollingFeatureBuffer:
+    """
+    Stateful model window for the recursive forecast loop.
+
+    Build it once from the raw request window and its feature_engineer() output,
+    then alternate window() and advance(prediction). A fork()ed buffer holds
+    several trajectories: alternate windows() and advance(predictions, weather).
+    """
+
+    def __init__(self, raw_df: pd.DataFrame, features_df: pd.DataFrame, scaler: AffineScaler,
+                 holiday_dates, rainfall_lookup, timesteps: int):
+        self.scaler = scaler
+        self.feature_order = list(scaler.feature_names_in_)
+        self.holiday_dates = holiday_dates
+        self.rainfall_lookup = rainfall_lookup
+        self.timesteps = timesteps
+        self.trajectories = 1
+        # Feature columns that differ between trajectories, by position in feature_order
+        self._varying = {
+            name: self.feature_order.index(name)
+            for name in ['Power demand', 'moving_avg_3', 'demand_lag_1hr', 'demand_lag_24hr',
+                         'demand_lag_1week', *WEATHER_COLUMNS]
+            if name in self.feature_order
+        }
+
+        # Raw demand ring per trajectory, indexed backwards from the newest row
+        demand = raw_df['Power demand'].to_numpy(dtype=np.float64)
+        self._demand = np.empty((1, LAG_1WEEK), dtype=np.float64)
+        self._demand[0] = demand[-LAG_1WEEK:]
+        self._demand_head = LAG_1WEEK - 1 # slot of the newest value
+
+        # Last raw row, the template for every predicted row
+        last_raw_row = raw_df.iloc[-1]
+        self._last_ts = pd.to_datetime(last_raw_row['datetime']).to_pydatetime()
+        self._weather = {col: last_raw_row[col] for col in WEATHER_COLUMNS}
+
+        # Scaled float32 feature window per trajectory, written twice so window()
+        # is always a contiguous view
+        self._window = np.empty((1, 2 * timesteps, len(self.feature_order)), dtype=np.float32)
+        self.scaler.transform(
+            features_df.tail(timesteps)[self.feature_order].to_numpy(dtype=np.float64),
+            out=self._window[0, :timesteps]
+        )
+        self._window[0, timesteps:] = self._window[0, :timesteps]
+        self._window_start = 0
+        # Raw values of the rows being appended, reused by every advance()
+        self._row = np.empty((1, len(self.feature_order)), dtype=np.float64)
+
+    def fork(self, trajectories: int) -> "RollingFeatureBuffer":
+        """
+        A buffer of 'trajectories' copies of this one's (first) trajectory, to be
+        advanced together. This buffer is left unchanged.
+        """
+        forked = copy.copy(self)
+        forked.trajectories = trajectories
+        forked._demand = np.repeat(self._demand[:1], trajectories, axis=0)
+        forked._window = np.repeat(self._window[:1], trajectories, axis=0)
+        forked._row = np.empty((trajectories, len(self.feature_order)), dtype=np.float64)
+        return forked
+
+    def _demand_back(self, rows_back: int) -> np.ndarray:
+        """Raw demand 'rows_back' rows before the row after the newest one, per trajectory (a copy)."""
+        return self._demand[:, (self._demand_head - rows_back + 1) % LAG_1WEEK].copy()
+
+    def window(self) -> np.ndarray:
+        """The scaled (timesteps, n_features) model input. A view, do not modify."""
+        return self._window[0, self._window_start:self._window_start + self.timesteps]
+
+    def windows(self) -> np.ndarray:
+        """Every trajectory's window, (trajectories, timesteps, n_features). A view, do not modify."""
+        return self._window[:, self._window_start:self._window_start + self.timesteps]
+
+    def advance(self, predicted_demand, weather: np.ndarray = None):
+        """
+        Appends the "fake" raw row for the next 5 minutes built from a prediction
+        (one per trajectory), exactly like the old loop did with pd.concat +
+        feature_engineer(). The row keeps the last raw row's weather unless
+        'weather' gives (trajectories, len(WEATHER_COLUMNS)) values for it.
+
+        Raises ValueError if the new row would be dropped by feature_engineer()
+        (e.g. a month missing from the rainfall table), because the window would
+        then run short of clean rows.
+        """
+        predicted = np.asarray(predicted_demand, dtype=np.float64).reshape(self.trajectories)
+        # Same rounding as the old strftime('%Y-%m-%d %H:%M:%S') round trip
+        new_ts = (self._last_ts + STEP).replace(microsecond=0)
+        per_trajectory = {
+            'Power demand': predicted,
+            'moving_avg_3': (predicted + self._demand_back(1) + self._demand_back(2)) / 3.0,
+            'demand_lag_1hr': self._demand_back(LAG_1HR),
+            'demand_lag_24hr': self._demand_back(LAG_24HR),
+            'demand_lag_1week': self._demand_back(LAG_1WEEK),
+        }
+        if weather is not None:
+            per_trajectory.update(zip(WEATHER_COLUMNS, np.asarray(weather, dtype=np.float64).T))
+
+        # Calendar / rainfall features are the same for every trajectory
+        row = engineer_row(
+            new_ts, 0.0, 0.0, self._weather, (0.0, 0.0, 0.0),
+            self.holiday_dates, self.rainfall_lookup
+        )
+
+        # Push the raw values
+        self._demand_head = (self._demand_head + 1) % LAG_1WEEK
+        self._demand[:, self._demand_head] = predicted
+        self._last_ts = new_ts
+
+        # feature_engineer() drops rows with NaNs, so they never reach the window
+        if any(pd.isna(v) for v in row.values()) or any(np.isnan(v).any() for v in per_trajectory.values()):
+            raise ValueError(f"Predicted row for {new_ts} has missing features and would be dropped.")
+
+        self._row[:] = [row[name] for name in self.feature_order]
+        for name, j in self._varying.items():
+            if name in per_trajectory:
+                self._row[:, j] = per_trajectory[name]
+        slot = self._window_start
+        self.scaler.transform(self._row, out=self._window[:, slot])
+        self._window[:, slot + self.timesteps] = self._window[:, slot]
+        self._window_start = (slot + 1) % self.timesteps
@@ -0,0 +1,169 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# --- Server-side history store for the 5-minute API ---
+#
+# Clients used to POST the full 2304-row history with every /predict call.
+# The store keeps that history server-side as one NumPy array per column, so
+# clients only append the newest row(s) and ask for a prediction by timestamp.
+#
+# Rows live in a linear buffer of 2 * capacity; when it fills up the newest
+# 'capacity' rows are moved back to the front. Appends are amortized O(1) and
+# any window is a contiguous slice, found with a binary search on timestamps.
+# The lag features are row offsets (12 rows = 1 hour), so only rows continuing
+# the stored history on the 5-minute grid are accepted.
+
+VALUE_COLUMNS = ['Power demand', 'temp', 'dwpt', 'rhum', 'wdir', 'wspd', 'pres', 'moving_avg_3']
+INTERVAL = np.timedelta64(5, 'm')
+
+
+class RowNotStored(LookupError):
+    """Raised by window() for an end timestamp that isn't in the store."""
+
+
+class HistoryStore:
+    """
+    Append-only columnar store of raw 5-minute rows, optionally persisted to an .npz file.
+    """
+
+    def __init__(self, capacity: int, path: str = None):
+        self.capacity = capacity
+        self.path = path
+        self._lock = threading.Lock()
+
+        # Timestamps as datetime64[s]; values stay float64 so predictions from the
+        # store match predictions from a JSON request bit for bit
+        self._timestamps = np.empty(2 * capacity, dtype='datetime64[s]')
+        self._values = {col: np.empty(2 * capacity, dtype=np.float64) for col in VALUE_COLUMNS}
+        self._size = 0
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def latest(self):
+        """Timestamp of the newest row, or None when empty."""
+        return self._timestamps[self._size - 1] if self._size else None
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Appends raw rows ('datetime' + VALUE_COLUMNS). Rows at or before the newest stored
+        timestamp are skipped, so retried ingests are harmless. Returns how many rows were added.
+        Raises ValueError (and adds nothing) unless the new rows are INTERVAL apart and
+        the first one is INTERVAL after the newest stored row.
+        """
+        timestamps = pd.to_datetime(df['datetime']).to_numpy(dtype='datetime64[s]')
+        if len(timestamps) > 1 and np.any(np.diff(timestamps) <= np.timedelta64(0, 's')):
+            raise ValueError("Rows must be in strictly increasing datetime order.")
+
+        with self._lock:
+            keep = slice(None)
+            if self._size:
+                keep = timestamps > self._timestamps[self._size - 1]
+            timestamps = timestamps[keep]
+            new_rows = len(timestamps)
+            if new_rows == 0:
+                return 0
+            previous = self._timestamps[self._size - 1] if self._size else timestamps[0] - INTERVAL
+            gaps = np.flatnonzero(np.diff(timestamps, prepend=previous) != INTERVAL)
+            if len(gaps):
+                after = timestamps[gaps[0] - 1] if gaps[0] else previous
+                raise ValueError(f"Rows must be 5 minutes apart with no gaps: {timestamps[gaps[0]]} "
+                                 f"follows {after}.")
+
+            values = {col: df[col].to_numpy(dtype=np.float64)[keep] for col in VALUE_COLUMNS}
+            # Only the newest 'capacity' rows can ever be kept
+            if new_rows > self.capacity:
+                timestamps = timestamps[-self.capacity:]
+                values = {col: v[-self.capacity:] for col, v in values.items()}
+
+            self._make_room(len(timestamps))
+            end = self._size + len(timestamps)
+            self._timestamps[self._size:end] = timestamps
+            for col in VALUE_COLUMNS:
+                self._values[col][self._size:end] = values[col]
+            self._size = end
+        return new_rows
+
+    def _make_room(self, rows: int):
+        # Move the newest rows back to the front when the buffer would overflow
+        if self._size + rows <= 2 * self.capacity:
+            return
+        keep = self.capacity - rows
+        start = self._size - keep
+        self._timestamps[:keep] = self._timestamps[start:self._size]
+        for col in VALUE_COLUMNS:
+            self._values[col][:keep] = self._values[col][start:self._size]
+        self._size = keep
+
+    def window(self, rows: int, end=None) -> pd.DataFrame:
+        """
+        The 'rows' rows ending at timestamp 'end' (inclusive; default: the newest row),
+        as a raw DataFrame in the layout feature_engineer() expects.
+        Raises RowNotStored if 'end' isn't stored and ValueError if there isn't enough history.
+        """
+        with self._lock:
+            if self._size == 0:
+                raise ValueError("History store is empty.")
+            if end is None:
+                stop = self._size
+            else:
+                end = np.datetime64(pd.Timestamp(end).to_datetime64(), 's')
+                stop = int(np.searchsorted(self._timestamps[:self._size], end, side='right'))
+                if stop == 0 or self._timestamps[stop - 1] != end:
+                    raise RowNotStored(f"No stored row at {end}.")
+            start = stop - rows
+            if start < 0:
+                raise ValueError(f"Not enough history before {self._timestamps[stop - 1]}. "
+                                 f"Requires {rows} rows, have {stop}.")
+
+            data = {'datetime': self._timestamps[start:stop].copy()}
+            for col in VALUE_COLUMNS:
+                data[col] = self._values[col][start:stop].copy()
+        return pd.DataFrame(data)
+
+    def save(self):
+        """Writes the stored rows to 'path' (no-op without a path)."""
+        if not self.path:
+            return
+        with self._lock:
+            arrays = {'datetime': self._timestamps[:self._size]}
+            arrays.update({col: self._values[col][:self._size] for col in VALUE_COLUMNS})
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """
+        Reads rows saved by save(), keeping the newest 'capacity' and, for files
+        written before appends were checked, only the rows after the last gap.
+        """
+        with np.load(self.path) as saved:
+            df = pd.DataFrame({'datetime': saved['datetime']})
+            for col in VALUE_COLUMNS:
+                df[col] = saved[col]
+        gaps = np.flatnonzero(np.diff(df['datetime'].to_numpy()) != INTERVAL)
+        if len(gaps):
+            print(f"WARNING: {self.path} has gaps; keeping the {len(df) - gaps[-1] - 1} rows after the last one.")
+            df = df.iloc[gaps[-1] + 1:]
+        self.append(df)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._size
+            first = str(self._timestamps[0]) if size else None
+            last = str(self._timestamps[size - 1]) if size else None
+        return {
+            "rows": size,
+            "capacity": self.capacity,
+            "first": first,
+            "latest": last,
+            "memory_bytes": self._timestamps.nbytes + sum(v.nbytes for v in self._values.values()),
+            "path": self.path,
+        }
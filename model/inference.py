@@ -0,0 +1,242 @@
+import glob
+import os
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+# --- Compiled inference runner for the Keras models ---
+#
+# model.predict() builds Keras' data adapter and callback machinery on every
+# call, which is pure overhead for a batch of one. The runner traces the model
+# once into a tf.function with a fixed (None, timesteps, n_features) signature
+# and calls it directly, so every call after warm-up runs the compiled graph.
+#
+# With INFERENCE_BACKEND=tflite the services load the quantized .tflite files
+# written by export_model.py next to each .keras file instead. Single-window
+# latency roughly halves, and TensorFlow is never imported for small batches
+# when ai_edge_litert or tflite_runtime is installed, which cuts cold start and
+# per-worker memory.
+
+# 'keras' or 'tflite' (falls back to keras when the .tflite file is missing)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras").lower()
+
+# Thread pool sizing (0 lets TensorFlow pick)
+INTRA_OP_THREADS = int(os.environ.get("INFERENCE_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.environ.get("INFERENCE_INTER_OP_THREADS", "0"))
+
+# How many recent calls the latency percentiles are computed over
+LATENCY_WINDOW = 1000
+
+
+def configure_threads(intra_op: int = INTRA_OP_THREADS, inter_op: int = INTER_OP_THREADS):
+    """
+    Sizes TensorFlow's thread pools. Must run before the first model is loaded,
+    TensorFlow can't resize them once the runtime is initialized.
+    """
+    if INFERENCE_BACKEND == "tflite":
+        return # TFLite interpreters take their thread count directly
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        print(f"WARNING: Could not configure inference threads. {e}")
+
+
+class InferenceRunner:
+    """
+    Wraps a loaded Keras model with a traced, batch-capable forward pass.
+    """
+
+    def __init__(self, model, name: str = "model"):
+        import tensorflow as tf
+        self.model = model
+        self.name = name
+        self.input_shape = tuple(model.input_shape)   # (None, timesteps, n_features)
+        self.output_shape = tuple(model.output_shape)
+
+        self._forward = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=self.input_shape, dtype=tf.float32)],
+        )
+        self._latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def warm_up(self):
+        """
+        Traces the graph with a dummy batch so the first real request doesn't pay for it.
+        """
+        dummy = np.zeros((1,) + self.input_shape[1:], dtype=np.float32)
+        self._forward(dummy)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Runs the model on a (batch, timesteps, n_features) array and returns a NumPy array.
+        """
+        x = np.asarray(batch, dtype=np.float32)
+        start = time.perf_counter()
+        out = self._forward(x).numpy()
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with self._lock:
+            self._latencies_ms.append(elapsed_ms)
+            self.calls += 1
+        return out
+
+    def latency_stats(self) -> dict:
+        """
+        Latency percentiles (ms) over the last LATENCY_WINDOW calls.
+        """
+        with self._lock:
+            latencies = np.array(self._latencies_ms)
+            calls = self.calls
+        if len(latencies) == 0:
+            return {"calls": calls, "p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            "calls": calls,
+            "p50_ms": float(p50),
+            "p90_ms": float(p90),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies.max()),
+        }
+
+
+def tflite_interpreter_class():
+    """The lightest available TFLite Interpreter: LiteRT, tflite_runtime, then TensorFlow's."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteRunner:
+    """
+    Same interface as InferenceRunner, over the .tflite files from export_model.py.
+
+    The LSTMs only convert with a static batch size, so there is one file per
+    batch size and batches are padded up to the nearest exported size. TFLite
+    only wins for small batches (it runs the unrolled LSTM one window at a time),
+    so anything larger than the largest export goes to the Keras model at
+    'keras_path', loaded on first use. Interpreters aren't thread-safe, so each
+    worker thread gets its own.
+    """
+
+    def __init__(self, paths: dict, name: str = "model", num_threads: int = INTRA_OP_THREADS,
+                 keras_path: str = None):
+        self.paths = dict(sorted(paths.items())) # {batch size: .tflite path}
+        self.name = name
+        self.keras_path = keras_path
+        self._fallback = None
+        self.num_threads = num_threads or None
+        self.batch_sizes = list(self.paths)
+        self._model_content = {}
+        for batch_size, path in self.paths.items():
+            with open(path, "rb") as f:
+                self._model_content[batch_size] = f.read()
+        self._local = threading.local()
+
+        interpreter = self._interpreter(self.batch_sizes[0])
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in input_details["shape"][1:])
+        self.output_shape = (None,) + tuple(int(d) for d in output_details["shape"][1:])
+
+        self._latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        # Separate from _lock, so small batches never wait for the Keras model to load
+        self._fallback_lock = threading.Lock()
+        self.calls = 0
+
+    def _interpreter(self, batch_size: int):
+        interpreters = getattr(self._local, "interpreters", None)
+        if interpreters is None:
+            interpreters = self._local.interpreters = {}
+        interpreter = interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = tflite_interpreter_class()(
+                model_content=self._model_content[batch_size], num_threads=self.num_threads
+            )
+            interpreter.allocate_tensors()
+            interpreters[batch_size] = interpreter
+        return interpreter
+
+    def warm_up(self):
+        """Creates and runs every batch size's interpreter in this thread."""
+        for batch_size in self.batch_sizes:
+            self._run(np.zeros((batch_size,) + self.input_shape[1:], dtype=np.float32))
+
+    def _run(self, x: np.ndarray) -> np.ndarray:
+        rows = len(x)
+        batch_size = next((b for b in self.batch_sizes if b >= rows), self.batch_sizes[-1])
+        if rows < batch_size:
+            x = np.concatenate([x, np.zeros((batch_size - rows,) + x.shape[1:], dtype=np.float32)])
+        interpreter = self._interpreter(batch_size)
+        interpreter.set_tensor(interpreter.get_input_details()[0]["index"], x)
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]["index"])[:rows]
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Runs the model on a (batch, timesteps, n_features) array and returns a NumPy array.
+        """
+        x = np.asarray(batch, dtype=np.float32)
+        if len(x) > self.batch_sizes[-1] and self.keras_path:
+            return self.fallback().predict(x)
+        start = time.perf_counter()
+        largest = self.batch_sizes[-1]
+        out = np.concatenate([self._run(x[lo:lo + largest]) for lo in range(0, len(x), largest)])
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with self._lock:
+            self._latencies_ms.append(elapsed_ms)
+            self.calls += 1
+        return out
+
+    def fallback(self) -> InferenceRunner:
+        """The Keras runner for large batches, loaded on first use."""
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    import tensorflow as tf
+                    print(f"Loading {self.keras_path} for large '{self.name}' batches...")
+                    self._fallback = InferenceRunner(tf.keras.models.load_model(self.keras_path), name=self.name)
+        return self._fallback
+
+    latency_stats = InferenceRunner.latency_stats
+
+
+def tflite_path(keras_path: str, batch_size: int) -> str:
+    """Where export_model.py writes the batch-size-'batch_size' .tflite version of a .keras model."""
+    return f"{os.path.splitext(keras_path)[0]}.b{batch_size}.tflite"
+
+
+def tflite_paths(keras_path: str) -> dict:
+    """{batch size: path} of the exported .tflite files for 'keras_path'."""
+    prefix = os.path.splitext(keras_path)[0] + ".b"
+    paths = {}
+    for path in glob.glob(glob.escape(prefix) + "*.tflite"):
+        size = path[len(prefix):-len(".tflite")]
+        if size.isdigit():
+            paths[int(size)] = path
+    return paths
+
+
+def load_runner(keras_path: str, name: str, backend: str = INFERENCE_BACKEND):
+    """
+    Loads the model at 'keras_path' with the configured backend: the exported
+    .tflite files for 'tflite' (if there are any), otherwise the Keras model.
+    """
+    if backend == "tflite":
+        paths = tflite_paths(keras_path)
+        if paths:
+            return TFLiteRunner(paths, name=name, keras_path=keras_path)
+        print(f"WARNING: No .tflite export of {keras_path} (run export_model.py). Using the Keras model for '{name}'.")
+    import tensorflow as tf
+    return InferenceRunner(tf.keras.models.load_model(keras_path), name=name)
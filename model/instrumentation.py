@@ -0,0 +1,429 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from functools import wraps
+
+from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse
+
+# --- Instrumentation: stage timers, counters, /metrics and a sampling profiler ---
+#
+# One process-wide registry shared by every service in the process (the
+# in-process prediction engine puts main.py and monthly_api.py next to the
+# simulator), rendered in the Prometheus text format at /metrics:
+#   stage_duration_seconds         hot-path stages (parse, feature_engineer,
+#                                  scale, model_predict, inverse_transform, ...)
+#   http_requests_total            requests by route and status
+#   http_request_duration_seconds  end-to-end request latency by route
+#   recursion_steps_total          recursive forecast steps by model
+#   upstream_request_duration_seconds  simulator -> prediction API calls
+# plus gauges read at scrape time from the existing .stats() of the worker
+# pools, micro-batchers, prediction caches, upstreams and startup stages.
+#
+# The sampling profiler is off by default; POST /debug/profiler?action=start
+# turns it on at runtime (or PROFILER_ENABLED=1 at startup). It records every
+# thread's stack each PROFILER_INTERVAL_MS; GET /debug/profiler returns the
+# hottest stacks and functions, or collapsed stacks for flamegraph.pl.
+# The /debug/profiler routes are unauthenticated and process-wide, so the
+# services only register them with ENABLE_DEBUG_PROFILER=1.
+
+ENABLE_DEBUG_PROFILER = os.environ.get("ENABLE_DEBUG_PROFILER", "0") == "1"
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", 5))
+# Deepest stack kept per sample (innermost frames)
+PROFILER_MAX_DEPTH = 64
+
+# Histogram buckets in seconds, from sub-millisecond stages to slow requests
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, series[-2]
+            yield f"{self.name}_count", labels, series[-1]
+
+
+def stats_samples(name: str, stats: dict, labels: dict = None):
+    """
+    Flattens a .stats() dict into gauge samples: nested keys are joined with
+    '_', booleans become 0/1, strings become a 1-valued sample with the string
+    as a 'value' label (e.g. a circuit's state), None and lists are skipped.
+    """
+    labels = labels or {}
+    for key, value in stats.items():
+        metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"{name}_{key}")
+        if isinstance(value, dict):
+            yield from stats_samples(metric, value, labels)
+        elif isinstance(value, bool):
+            yield metric, labels, float(value)
+        elif isinstance(value, (int, float)):
+            yield metric, labels, value
+        elif isinstance(value, str):
+            yield metric, {**labels, "value": value}, 1
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms by name, plus collectors: functions called at
+    scrape time that return (name, labels, value) gauge samples.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        # Gauges grouped by name, so each TYPE line appears once
+        gauges = {}
+        for collector in collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, []).append((labels, value))
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "stage_duration_seconds", "Time spent in one hot-path stage.", ("service", "stage"))
+REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP requests served.", ("service", "method", "route", "status"))
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "End-to-end HTTP request latency.", ("service", "route"))
+RECURSION_STEPS = metrics.counter(
+    "recursion_steps_total", "Recursive forecast steps run.", ("service", "model"))
+UPSTREAM_SECONDS = metrics.histogram(
+    "upstream_request_duration_seconds", "Calls to the prediction APIs.", ("upstream", "outcome"))
+
+
+def metrics_response() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class Instrumentation:
+    """
+    One service's handle on the shared registry: stage timers, step counters,
+    the HTTP middleware and collectors, all labelled with the service name.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def stage(self, name: str):
+        """Context manager timing one stage into stage_duration_seconds."""
+        return STAGE_SECONDS.time(service=self.service, stage=name)
+
+    def timed(self, name: str):
+        """Decorator form of stage()."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count_steps(self, model: str, steps: int = 1):
+        RECURSION_STEPS.inc(steps, service=self.service, model=model)
+
+    async def http_middleware(self, request, call_next):
+        """Counts and times every request by route template (not raw path)."""
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            REQUESTS.inc(service=self.service, method=request.method, route=route, status=status)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, service=self.service, route=route)
+
+    def collect(self, name: str, stats_fn):
+        """
+        Exports 'stats_fn()' (a .stats()-style dict, or {label value: dict}
+        for one series per pool / batcher / upstream) as gauges named 'name_*'.
+        """
+        def collector():
+            stats = stats_fn()
+            if stats and all(isinstance(v, dict) for v in stats.values()):
+                for key, value in stats.items():
+                    yield from stats_samples(name, value, {"service": self.service, "name": key})
+            elif stats:
+                yield from stats_samples(name, stats, {"service": self.service})
+        metrics.add_collector(collector)
+
+
+# Leaf frames of threads that are just waiting (idle pool workers, the event
+# loop's selector); left out of the profile unless asked for
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("base_events.py", "_run_once"),
+}
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread each 'interval_ms' in a background
+    thread and tallies the stacks. Cheap enough to leave on briefly under load.
+    """
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self._stacks = Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.started_at = None
+        self.sampled_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, reset: bool = True):
+        if self.running:
+            return
+        if reset:
+            self.reset()
+        self._stop.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self.sampled_seconds += time.perf_counter() - self.started_at
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.sampled_seconds = 0.0
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_ms / 1000.0):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append((os.path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                stacks.append(tuple(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def report(self, top: int = 25, include_idle: bool = False) -> dict:
+        """Hottest stacks, and functions by self (leaf) and total (anywhere on the stack) samples."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        if not include_idle:
+            stacks = [(s, n) for s, n in stacks if s and s[-1][:2] not in IDLE_FRAMES]
+        leaf, anywhere = Tally(), Tally()
+        for stack, count in stacks:
+            leaf[stack[-1]] += count
+            for frame in set(stack):
+                anywhere[frame] += count
+
+        def name(frame):
+            return f"{frame[1]} ({frame[0]}:{frame[2]})"
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "thread_stack_samples": sum(n for _, n in stacks),
+            "top_stacks": [
+                {"count": n, "stack": " > ".join(name(f) for f in s[-8:])}
+                for s, n in sorted(stacks, key=lambda item: -item[1])[:top]
+            ],
+            "top_self": [{"function": name(f), "count": n} for f, n in leaf.most_common(top)],
+            "top_total": [{"function": name(f), "count": n} for f, n in anywhere.most_common(top)],
+        }
+
+    def collapsed(self, include_idle: bool = False) -> str:
+        """Stacks in the 'collapsed' format flamegraph.pl / speedscope read."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        lines = [
+            ";".join(f"{f[1]} ({f[0]})" for f in stack) + f" {count}"
+            for stack, count in stacks
+            if stack and (include_idle or stack[-1][:2] not in IDLE_FRAMES)
+        ]
+        return "\n".join(lines) + "\n"
+
+    def control(self, action: str) -> dict:
+        """start | stop | reset, for the /debug/profiler endpoints."""
+        if action == "start":
+            self.start()
+        elif action == "stop":
+            self.stop()
+        elif action == "reset":
+            self.reset()
+        else:
+            raise ValueError(f"Unknown profiler action '{action}'; use start, stop or reset.")
+        return {"running": self.running, "samples": self.samples}
+
+
+# Process-wide: one sampler sees every thread, whichever service turns it on
+profiler = SamplingProfiler()
+if PROFILER_ENABLED:
+    profiler.start()
+
+
+def profiler_report(format: str = "json", top: int = 25, include_idle: bool = False):
+    """GET /debug/profiler: the report as JSON, or collapsed stacks as text."""
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(include_idle))
+    return profiler.report(top, include_idle)
+
+
+def add_profiler_routes(app, enabled: bool = ENABLE_DEBUG_PROFILER):
+    """
+    Registers POST and GET /debug/profiler on 'app', only if 'enabled'
+    (ENABLE_DEBUG_PROFILER=1): they are unauthenticated and process-wide.
+    """
+    if not enabled:
+        return
+
+    @app.post("/debug/profiler")
+    def control_profiler(action: str):
+        """
+        Starts, stops or resets the sampling profiler ('action' = start | stop | reset).
+        """
+        try:
+            return profiler.control(action)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/debug/profiler")
+    def get_profile(format: str = "json", top: int = 25, include_idle: bool = False):
+        """
+        Hottest stacks and functions sampled so far; format=collapsed for flamegraph.pl.
+        """
+        return profiler_report(format, top, include_idle)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+
+# --- Server-side ticker broadcasting live updates ---
+#
+# Polling clients each advanced the simulation and re-ran both predictions.
+# The broadcaster runs ONE ticker while anybody is subscribed: every
+# 'interval_seconds' it computes the next update once and fans it out to every
+# subscriber's queue, so model work per tick is constant however many
+# dashboards are open. A new (or lagging) subscriber first gets the latest full
+# update as a snapshot, then only deltas. The ticker stops when the last
+# subscriber leaves.
+
+LIVE_TICK_SECONDS = float(os.environ.get("LIVE_TICK_SECONDS", 5))
+# Messages buffered per subscriber; one that falls further behind is resynced
+# with a fresh snapshot instead of being sent the backlog
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class EndOfStream(Exception):
+    """Raised by the tick function when there is nothing left to simulate."""
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.synced = False # has had a snapshot since (re)joining
+
+    def offer(self, message: dict) -> bool:
+        """Queues 'message', or returns False if the subscriber is too far behind."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class LiveBroadcaster:
+    """
+    'tick_fn' is an async function returning the next full update (or raising
+    EndOfStream); 'delta_fn(previous, update)' returns what changed between two
+    updates. Messages are dicts with a 'type' of 'snapshot', 'delta', 'error' or 'end'.
+    """
+
+    def __init__(self, tick_fn, delta_fn, interval_seconds: float = LIVE_TICK_SECONDS):
+        self.tick_fn = tick_fn
+        self.delta_fn = delta_fn
+        self.interval_seconds = interval_seconds
+        self.latest = None
+        self._subscribers = set()
+        self._task = None
+        self.ticks = 0
+        self.messages = 0
+        self.resyncs = 0
+        self.last_tick_ms = None
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        if self.latest is not None:
+            subscriber.synced = subscriber.offer({"type": "snapshot", **self.latest})
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while self._subscribers:
+            start = time.perf_counter()
+            try:
+                update = await self.tick_fn()
+            except EndOfStream as e:
+                self._broadcast_all({"type": "end", "detail": str(e)})
+                return
+            except Exception as e:
+                # Keep ticking; the next tick may succeed (e.g. an upstream came back)
+                print(f"Warning: live update tick failed: {e}")
+                self._broadcast_all({"type": "error", "detail": str(e)})
+            else:
+                self.ticks += 1
+                self.last_tick_ms = (time.perf_counter() - start) * 1000.0
+                self._broadcast(update)
+            await asyncio.sleep(max(0.0, self.interval_seconds - (time.perf_counter() - start)))
+
+    def _broadcast(self, update: dict):
+        previous, self.latest = self.latest, update
+        snapshot = {"type": "snapshot", **update}
+        delta = {"type": "delta", **self.delta_fn(previous, update)} if previous is not None else None
+        for subscriber in list(self._subscribers):
+            if subscriber.synced and delta is not None:
+                if subscriber.offer(delta):
+                    self.messages += 1
+                    continue
+                # Too far behind: drop the backlog and resync from a snapshot
+                self.resyncs += 1
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+            subscriber.synced = subscriber.offer(snapshot)
+            self.messages += subscriber.synced
+
+    def _broadcast_all(self, message: dict):
+        for subscriber in list(self._subscribers):
+            if not subscriber.offer(message):
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(message)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval_seconds,
+            "ticks": self.ticks,
+            "messages": self.messages,
+            "resyncs": self.resyncs,
+            "last_tick_ms": self.last_tick_ms,
+        }
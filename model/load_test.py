@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from synthetic_data import make_5min_payload, make_monthly_payload
+
+# --- Load test for the prediction services ---
+#
+# Fires a fixed number of requests at each concurrency level and prints
+# throughput and latency, so we can see whether a service scales with
+# concurrent clients or serializes them.
+#
+# Usage (services must be running):
+#   python load_test.py predict   --concurrency 1 2 4 8 16
+#   python load_test.py monthly   --url http://127.0.0.1:8001
+#   python load_test.py simulator --url http://127.0.0.1:8002 --requests 100
+
+TARGETS = {
+    # name: (default base URL, method, path, payload factory)
+    "predict": ("http://127.0.0.1:8000", "POST", "/predict?steps=1", make_5min_payload),
+    "monthly": ("http://127.0.0.1:8001", "POST", "/predict_monthly", make_monthly_payload),
+    "simulator": ("http://127.0.0.1:8002", "GET", "/get_live_update_v2", None),
+}
+
+
+async def run_level(client: httpx.AsyncClient, method: str, path: str, payload,
+                    concurrency: int, total_requests: int) -> dict:
+    """
+    Sends 'total_requests' requests with 'concurrency' clients in flight.
+    """
+    latencies = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+    }
+
+
+async def main(args):
+    default_url, method, path, payload_factory = TARGETS[args.target]
+    payload = payload_factory() if payload_factory else None
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+
+    async with httpx.AsyncClient(base_url=args.url or default_url, timeout=args.timeout, limits=limits) as client:
+        # One untimed request so connection setup and lazy server init don't skew level 1
+        await run_level(client, method, path, payload, 1, 1)
+
+        print(f"{'clients':>8} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for concurrency in args.concurrency:
+            result = await run_level(client, method, path, payload, concurrency, args.requests)
+            print(f"{result['concurrency']:>8} {result['requests']:>6} {result['errors']:>6} "
+                  f"{result['throughput_rps']:>9.1f} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a prediction service.")
+    parser.add_argument("target", choices=sorted(TARGETS))
+    parser.add_argument("--url", help="Base URL (defaults to the service's usual port)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(main(parser.parse_args()))
@@ -1,28 +1,55 @@
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-import joblib
-import holidays
-import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List
-from datetime import datetime, timedelta
+from typing import Dict, List
+import os
+from datetime import datetime
+from feature_buffer import (
+    SEASON_MAP, SEASONS, WEATHER_COLUMNS, RollingFeatureBuffer, build_holiday_dates, build_rainfall_lookup
+)
+from calendar_table import CalendarTable, load_rainfall_data
+from affine_scaler import AffineScaler
+from inference import INFERENCE_BACKEND, configure_threads, load_runner, tflite_paths
+from micro_batcher import MicroBatcher
+from worker_pools import BoundedPool, pool_size_from_env
+from history_store import HistoryStore, RowNotStored
+from prediction_cache import PredictionCache, cache_key, frame_fingerprint, model_version
+from startup import Startup, StartupError, with_import_lock
+from monte_carlo import (
+    MAX_MONTE_CARLO_TRAJECTORIES, MONTE_CARLO_RESIDUALS_PATH, MONTE_CARLO_TRAJECTORIES,
+    load_hourly_residuals, parse_quantiles, summarize, weather_analogue_paths, window_residual_sigma
+)
+from instrumentation import Instrumentation, add_profiler_routes, metrics_response
+from wire_format import (
+    JSON, WireFormatError, columnar_response, columns_to_frame, media_type, negotiate, openapi_body,
+    parse_object, parse_rows, points_to_frame
+)
 
 # --- 1. Configuration & Global Variables ---
 MODEL_PATH = "model_artifacts/best_demand_model.keras"
+# Direct multi-horizon models: one forward pass returns a whole horizon
+HORIZON_MODEL_PATHS = {
+    "seq2seq": "model_artifacts/best_seq2seq_model.keras",
+    "multi_step": "model_artifacts/best_multi_step_model.keras",
+}
 SCALER_PATH = "model_artifacts/demand_scaler.pkl"
 RAINFALL_CSV_PATH = "model_artifacts/monthly_rainfall.csv"
+# Precomputed calendar features (rebuilt automatically when the years, holidays or
+# rainfall change; see calendar_table.py). Holidays are loaded for the same years.
+CALENDAR_TABLE_PATH = "model_artifacts/calendar_features.npz"
+CALENDAR_START_YEAR = int(os.environ.get("CALENDAR_START_YEAR", 2021))
+CALENDAR_END_YEAR = int(os.environ.get("CALENDAR_END_YEAR", 2025))
 
 TIMESTEPS = 288
 LAG_WEEKS = 2016
 REQUIRED_INPUT_ROWS = TIMESTEPS + LAG_WEEKS # 2304
 
-SEASON_MAP = {
-    1: 'Winter', 2: 'Winter', 3: 'Summer', 4: 'Summer', 5: 'Summer',
-    6: 'Monsoon', 7: 'Monsoon', 8: 'Monsoon', 9: 'Monsoon',
-    10: 'Post-Monsoon', 11: 'Post-Monsoon', 12: 'Winter'
-}
+# Server-side history (see /history/ingest and /predict_at)
+HISTORY_STORE_CAPACITY = int(os.environ.get("HISTORY_STORE_CAPACITY", 2 * REQUIRED_INPUT_ROWS))
+HISTORY_STORE_PATH = os.environ.get("HISTORY_STORE_PATH") or None # e.g. model_artifacts/history.npz
+HISTORY_PERSIST_EVERY = 12 # rows, i.e. once an hour of 5-minute data
 
 # --- 2. Initialize FastAPI App ---
 app = FastAPI(
@@ -30,41 +57,153 @@ app = FastAPI(
     description="API to predict 5-minute power demand recursively."
 )
 
+# Stage timers, request / recursion-step counters and /metrics (see instrumentation.py)
+instrumentation = Instrumentation("demand-api")
+app.middleware("http")(instrumentation.http_middleware)
+
 # --- 3. Load Artifacts on Startup ---
-try:
-    print("Loading model...")
-    model = tf.keras.models.load_model(MODEL_PATH)
-    print("Loading scaler...")
-    scaler = joblib.load(SCALER_PATH)
-    
-    print("Loading and processing rainfall data...")
-    rainfall_df_raw = pd.read_csv(RAINFALL_CSV_PATH)
-    rainfall_long = rainfall_df_raw.melt(
-        id_vars=['Year', 'Metric'],
-        value_vars=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
-        var_name='MonthName', value_name='Value'
-    )
-    rainfall_tidy = rainfall_long.pivot_table(
-        index=['Year', 'MonthName'], columns='Metric', values='Value'
-    ).reset_index().rename(columns={
-        'Rainy Days': 'Monthly_Rainy_Days',
-        'Total Rainfall': 'Monthly_Total_Rainfall'
-    })
-    month_map = {
-        'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-        'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+# Artifacts load in the background once the server is up (see startup.py):
+# /healthz answers right away, /readyz and the prediction endpoints once the
+# model, scaler, rainfall, holidays and calendar table are loaded and warmed up.
+# Scripts that import main (backtest.py) call load_artifacts() themselves.
+runner, scaler, RAINFALL_DATA, HOLIDAY_LIST = None, None, None, None
+RAINFALL_LOOKUP, HOLIDAY_DATES, CALENDAR = None, None, None
+# The fitted scaler as a fused float32 affine map (see affine_scaler.py)
+feature_scaler = None
+# Per-hour 1-step RMSE (kW) for /predict_quantiles, None without a backtest report
+RESIDUAL_SIGMA = None
+horizon_runners = {}
+batchers = {}
+MODEL_VERSIONS = {}
+startup = Startup("demand-api")
+
+# Blocking work runs in bounded pools so the event loop keeps serving requests:
+# pandas feature engineering in 'features', batched forward passes in 'inference'
+pools = {
+    "features": BoundedPool("features", pool_size_from_env("features", 4)),
+    "inference": BoundedPool("inference", pool_size_from_env("inference", 2)),
+}
+
+history_store = HistoryStore(HISTORY_STORE_CAPACITY, HISTORY_STORE_PATH)
+print(f"History store: {len(history_store)} rows loaded.")
+
+# Identical windows (retries, simulators replaying the dataset) reuse earlier
+# results. Keys include a version of the model (and its .tflite exports, which
+# predict slightly differently), scaler and calendar inputs.
+prediction_cache = PredictionCache("predict")
+
+# The existing stats, exported as gauges at /metrics too
+instrumentation.collect("worker_pool", lambda: {name: p.stats() for name, p in pools.items()})
+instrumentation.collect("micro_batcher", lambda: {name: b.stats() for name, b in batchers.items()})
+instrumentation.collect("prediction_cache", prediction_cache.stats)
+instrumentation.collect("history_store", history_store.stats)
+instrumentation.collect("startup", startup.report)
+
+
+def load_scaler():
+    import joblib
+    return joblib.load(SCALER_PATH)
+
+
+def load_holidays():
+    import holidays
+    return holidays.India(subdiv='DL', years=list(range(CALENDAR_START_YEAR, CALENDAR_END_YEAR + 1)))
+
+
+def check_input_width(model_runner, n_features: int):
+    """Raises StartupError unless the model takes the scaler's n_features inputs."""
+    width = model_runner.input_shape[-1]
+    if width != n_features:
+        raise StartupError(
+            f"Model '{model_runner.name}' expects {width} input features, but the scaler "
+            f"({SCALER_PATH}) has {n_features}. Retrain or re-export them together."
+        )
+
+
+def load_artifacts():
+    """
+    Loads everything the endpoints need into the module globals: independent
+    artifacts in parallel, then the calendar table (needs holidays + rainfall),
+    then a warm-up pass. Raises if a required artifact fails; the horizon
+    models are optional (/predict keeps working without them).
+    """
+    global runner, scaler, feature_scaler, RESIDUAL_SIGMA, RAINFALL_DATA, HOLIDAY_LIST, RAINFALL_LOOKUP, HOLIDAY_DATES, CALENDAR
+
+    # The thread pools must be sized (which imports TensorFlow) before any model loads
+    loaded = startup.run_parallel({
+        "configure_threads": with_import_lock(configure_threads),
+        "scaler": with_import_lock(load_scaler),
+        "rainfall": lambda: load_rainfall_data(RAINFALL_CSV_PATH),
+        "holidays": with_import_lock(load_holidays),
+        "residuals": lambda: load_hourly_residuals(MONTE_CARLO_RESIDUALS_PATH),
+    }, optional=["residuals"])
+    loaded.update(startup.run_parallel({
+        "model": lambda: load_runner(MODEL_PATH, "demand"),
+        **{f"{name}_model": (lambda p=path, n=name: load_runner(p, n)) for name, path in HORIZON_MODEL_PATHS.items()},
+    }, optional=[f"{name}_model" for name in HORIZON_MODEL_PATHS]))
+
+    RAINFALL_DATA, HOLIDAY_LIST = loaded["rainfall"], loaded["holidays"]
+    RAINFALL_LOOKUP = build_rainfall_lookup(RAINFALL_DATA)
+    HOLIDAY_DATES = build_holiday_dates(HOLIDAY_LIST)
+    with startup.stage("calendar_table"):
+        CALENDAR = CalendarTable.load_or_build(
+            CALENDAR_TABLE_PATH, CALENDAR_START_YEAR, CALENDAR_END_YEAR, HOLIDAY_DATES, RAINFALL_LOOKUP
+        )
+    scaler = loaded["scaler"]
+    feature_scaler = AffineScaler.from_sklearn(scaler)
+    RESIDUAL_SIGMA = loaded["residuals"]
+    loaded_horizon_runners = {
+        name: loaded[f"{name}_model"] for name in HORIZON_MODEL_PATHS if loaded[f"{name}_model"] is not None
     }
-    rainfall_tidy['month'] = rainfall_tidy['MonthName'].map(month_map)
-    RAINFALL_DATA = rainfall_tidy[['Year', 'month', 'Monthly_Rainy_Days', 'Monthly_Total_Rainfall']].copy()
-    
-    print("Loading holiday list...")
-    HOLIDAY_LIST = holidays.India(subdiv='DL', years=[2021, 2022, 2023, 2024, 2025])
-    
-    print("\n--- Server Ready ---")
 
-except Exception as e:
-    print(f"FATAL ERROR: Could not load artifacts. {e}")
-    model, scaler, RAINFALL_DATA, HOLIDAY_LIST = None, None, None, None
+    # Every request feeds scaler-width windows: a model of another width would
+    # fail each one inside its batcher after /readyz said ready
+    n_features = len(scaler.feature_names_in_)
+    with startup.stage("input_width"):
+        check_input_width(loaded["model"], n_features)
+    for name in list(loaded_horizon_runners):
+        with startup.stage(f"input_width_{name}", required=False):
+            try:
+                check_input_width(loaded_horizon_runners[name], n_features)
+            except StartupError:
+                del loaded_horizon_runners[name]
+                raise
+
+    MODEL_VERSIONS.update({
+        name: model_version(
+            path, *tflite_paths(path).values(), SCALER_PATH, RAINFALL_CSV_PATH,
+            extra=f"{INFERENCE_BACKEND}:{CALENDAR.fingerprint}"
+        )
+        for name, path in {"demand": MODEL_PATH, **HORIZON_MODEL_PATHS}.items()
+    })
+    MODEL_VERSIONS["residuals"] = model_version(MONTE_CARLO_RESIDUALS_PATH)
+
+    # Trace every model's graph, then run the request pipeline once on a synthetic
+    # window (in a month with rainfall data) so pandas, the calendar table and
+    # the scaler are warm too
+    startup.run_parallel({
+        f"warm_up_{r.name}": r.warm_up for r in [loaded["model"], *loaded_horizon_runners.values()]
+    }, optional=[f"warm_up_{name}" for name in loaded_horizon_runners])
+    with startup.stage("warm_up_features", required=False):
+        year, month = min(RAINFALL_LOOKUP)
+        build_feature_buffer(pd.DataFrame({
+            'datetime': pd.date_range(f"{year}-{month:02d}-01", periods=REQUIRED_INPUT_ROWS, freq="5min"),
+            **{col: np.zeros(REQUIRED_INPUT_ROWS) for col in RAW_COLUMN_SCHEMA if col != 'datetime'},
+        }).rename(columns={"Power_demand": "Power demand"}))
+
+    # Concurrent callers share batched forward passes, one batcher per model
+    batchers.update({
+        name: MicroBatcher(instrumentation.timed(f"model_predict:{name}")(r.predict), executor=pools["inference"].executor)
+        for name, r in {"demand": loaded["model"], **loaded_horizon_runners}.items()
+    })
+    # Last, so the endpoints never see a runner without its batcher
+    horizon_runners.update(loaded_horizon_runners)
+    runner = loaded["model"]
+
+
+@app.on_event("startup")
+def start_loading():
+    startup.run_in_background(load_artifacts)
 
 # --- 4. Define Input/Output Schemas ---
 
@@ -79,12 +218,82 @@ class RawDataPoint(BaseModel):
     pres: float
     moving_avg_3: float
 
+# Column-level schema for columnar (Arrow / msgpack / npz) request bodies
+RAW_COLUMN_SCHEMA = {
+    name: "datetime" if name == "datetime" else "float"
+    for name in RawDataPoint.__annotations__
+}
+
+class FutureWeather(BaseModel):
+    # A weather forecast for the intervals after the history, one value per
+    # interval and column (columnar, like the wire formats)
+    temp: List[float]
+    dwpt: List[float]
+    rhum: List[float]
+    wdir: List[float]
+    wspd: List[float]
+    pres: List[float]
+
+class ForecastRequest(BaseModel):
+    """
+    /predict body with a weather forecast: the usual rows plus future_weather,
+    used instead of repeating the last row's weather in recursive steps.
+    """
+    history: List[RawDataPoint]
+    future_weather: FutureWeather | None = None
+
+# future_weather, validated like a columnar request body
+FUTURE_WEATHER_SCHEMA = {name: "float" for name in FutureWeather.__annotations__}
+
+# OpenAPI request bodies of the endpoints that read (and negotiate) the raw body
+RAW_ROWS_BODY = openapi_body(List[RawDataPoint])
+FORECAST_BODY = openapi_body(List[RawDataPoint], ForecastRequest)
+
+class IngestResponse(BaseModel):
+    rows_ingested: int
+    total_rows: int
+    latest_datetime: str | None
+
 class PredictionResponse(BaseModel):
     # The API now returns a LIST of predictions
     predicted_demand_kw: List[float]
     prediction_time_utc: str
     warning: str = ""
 
+class ScenarioAxis(BaseModel):
+    # A model input column (see /predict_scenarios) and the values to sweep it over
+    column: str
+    values: List[float]
+    # 'offset': values are added to the column (e.g. temp +2), 'set': the column is set to them
+    kind: str = "offset"
+
+class ScenarioSweepRequest(BaseModel):
+    """
+    One base history plus a grid of perturbations: every combination of the axis
+    values is one scenario.
+    """
+    history: List[RawDataPoint]
+    axes: List[ScenarioAxis]
+
+class ScenarioSweepResponse(BaseModel):
+    axes: List[ScenarioAxis]
+    # Nested lists, one dimension per axis (in request order), then the forecast steps
+    surface: list
+    baseline_demand_kw: List[float]
+    model_name: str
+    prediction_time_utc: str
+
+class QuantileForecastResponse(BaseModel):
+    # The deterministic trajectory: /predict's forecast to float32 tolerance
+    # (it runs inside a larger batch)
+    point_forecast_kw: List[float]
+    mean_kw: List[float]
+    # Quantile (as a string, e.g. "0.05") -> one value per step
+    quantiles: Dict[str, List[float]]
+    trajectories: int
+    prediction_time_utc: str
+    warning: str = ""
+
 # --- 5. Feature Engineering Pipeline ---
 
 def feature_engineer(data_df: pd.DataFrame) -> pd.DataFrame:
@@ -96,6 +305,10 @@ def feature_engineer(data_df: pd.DataFrame) -> pd.DataFrame:
 
     # 1. Datetime features
     df['datetime'] = pd.to_datetime(df['datetime'])
+    offsets = CALENDAR.offsets(df['datetime'].to_numpy()) if CALENDAR is not None else None
+    if offsets is not None:
+        return feature_engineer_from_table(df, offsets)
+
     df['year'] = df['datetime'].dt.year
     df['month'] = df['datetime'].dt.month
     df['day'] = df['datetime'].dt.day
@@ -149,118 +362,598 @@ def feature_engineer(data_df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-# --- 6. The RECURSIVE Prediction Endpoint ---
+def feature_engineer_from_table(df: pd.DataFrame, offsets: np.ndarray) -> pd.DataFrame:
+    """
+    feature_engineer() for timestamps the calendar table covers: the calendar,
+    holiday, rainfall, season and cyclical columns are looked up by offset and
+    everything is added in one concat. Same columns, order and values as the
+    step-by-step version.
+    """
+    calendar = CALENDAR.columns(offsets)
+    demand = df['Power demand']
+
+    new = {col: calendar[col].astype(np.int64) for col in
+           ['year', 'month', 'day', 'hour', 'minute', 'day_of_week', 'is_weekend', 'is_holiday']}
+    # Months missing from the rainfall table merge to a NaN 'Year', so dropna() removes them
+    new['Year'] = np.where(calendar['has_rainfall'] == 1, calendar['year'], np.nan)
+    new['Monthly_Rainy_Days'] = calendar['Monthly_Rainy_Days']
+    new['Monthly_Total_Rainfall'] = calendar['Monthly_Total_Rainfall']
+    season_codes = calendar['season_code'].astype(np.int64)
+    new['season'] = np.asarray(SEASONS, dtype=object)[season_codes]
+    new['demand_lag_1hr'] = demand.shift(12).to_numpy()
+    new['demand_lag_24hr'] = demand.shift(288).to_numpy()
+    new['demand_lag_1week'] = demand.shift(2016).to_numpy()
+    for col in ['hour_sin', 'hour_cos', 'day_of_week_sin', 'day_of_week_cos', 'month_sin', 'month_cos']:
+        new[col] = calendar[col]
+
+    # Dummies in get_dummies() order (present seasons sorted), then the missing ones
+    present = sorted(SEASONS[code] for code in np.unique(season_codes))
+    for season in present + [s for s in SEASONS if s not in present]:
+        new[f'season_{season}'] = (season_codes == SEASONS.index(season)).astype(np.int64)
+
+    df = pd.concat([df, pd.DataFrame(new, index=df.index)], axis=1)
+    return df.dropna().reset_index(drop=True)
+
+# --- 6. Shared Prediction Helpers ---
+
+RECURSIVE_WARNING = ("Predictions beyond the first step are recursive and may be inaccurate "
+                     "due to error accumulation and naive weather assumptions.")
+FORECAST_WEATHER_WARNING = ("Predictions beyond the first step are recursive and may be inaccurate "
+                            "due to error accumulation.")
+
+def parse_raw_rows(body: bytes, content_type: str | None) -> pd.DataFrame:
+    """
+    Parses a list of RawDataPoint rows (JSON) or the same columns in a columnar
+    format into the raw DataFrame layout ('Power demand' column).
+    """
+    with instrumentation.stage("parse"):
+        input_df = parse_rows(body, content_type, RawDataPoint, RAW_COLUMN_SCHEMA)
+    return input_df.rename(columns={"Power_demand": "Power demand"})
+
+def raw_frame(columns: dict) -> pd.DataFrame:
+    """
+    RawDataPoint columns as NumPy arrays (e.g. from a simulator calling in-process)
+    -> the raw DataFrame layout, validated like a columnar request body. The
+    datetimes stay datetime64: nothing is sent, so there is nothing to normalize.
+    """
+    try:
+        input_df = columns_to_frame(columns, RAW_COLUMN_SCHEMA, normalize_datetimes=False)
+    except WireFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return input_df.rename(columns={"Power_demand": "Power demand"})
+
+def history_frame(points: List[RawDataPoint]) -> pd.DataFrame:
+    """
+    Validated RawDataPoint rows (the 'history' of a JSON object body) -> the raw
+    DataFrame layout.
+    """
+    return points_to_frame(points, RAW_COLUMN_SCHEMA).rename(columns={"Power_demand": "Power demand"})
+
+async def read_raw_rows(request: Request) -> pd.DataFrame:
+    """
+    Reads and parses the request body in the features pool.
+    """
+    body = await request.body()
+    return await pools["features"].run(parse_raw_rows, body, request.headers.get("content-type"))
+
+def parse_forecast_request(body: bytes, content_type: str | None):
+    """
+    A /predict body: the rows parse_raw_rows() accepts, or a JSON ForecastRequest
+    object. Returns (input_df, future weather DataFrame in WEATHER_COLUMNS order
+    or None).
+    """
+    if media_type(content_type) != JSON or body.lstrip()[:1] != b"{":
+        return parse_raw_rows(body, content_type), None
+
+    with instrumentation.stage("parse"):
+        forecast_request = parse_object(body, content_type, ForecastRequest)
+        input_df = history_frame(forecast_request.history)
+        future_weather = None
+        if forecast_request.future_weather is not None:
+            try:
+                future_weather = columns_to_frame(forecast_request.future_weather.dict(), FUTURE_WEATHER_SCHEMA)
+            except WireFormatError as e:
+                raise HTTPException(status_code=400, detail=f"future_weather: {e}")
+            if not np.isfinite(future_weather.to_numpy()).all():
+                raise HTTPException(status_code=400, detail="future_weather values must be finite numbers.")
+    return input_df, future_weather
+
+def check_steps(steps: int):
+    """400 unless at least one step is requested."""
+    if steps < 1:
+        raise HTTPException(status_code=400, detail=f"'steps' must be at least 1, got {steps}.")
+
+def prediction_response(request: Request, predictions_list, warning: str = ""):
+    """
+    The PredictionResponse as JSON, or as a 'predicted_demand_kw' column in the
+    columnar format the client asked for (metadata goes in headers).
+    """
+    prediction_time = datetime.utcnow().isoformat()
+    response_type = negotiate(request.headers.get("accept"))
+    if response_type != JSON:
+        return columnar_response(
+            {"predicted_demand_kw": np.asarray(predictions_list, dtype=np.float64)},
+            response_type,
+            headers={"X-Prediction-Time-UTC": prediction_time, "X-Warning": warning}
+        )
+    return {
+        "predicted_demand_kw": predictions_list,
+        "prediction_time_utc": prediction_time,
+        "warning": warning
+    }
+
+def build_feature_buffer(input_df: pd.DataFrame) -> RollingFeatureBuffer:
+    """
+    Validates the raw window, runs feature_engineer() once and returns the
+    scaled rolling buffer holding the last TIMESTEPS rows.
+    """
+    if len(input_df) < REQUIRED_INPUT_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough data. Requires {REQUIRED_INPUT_ROWS} rows, got {len(input_df)}."
+        )
+
+    # 1. Run the full feature engineering pipeline ONCE on the request window
+    try:
+        with instrumentation.stage("feature_engineer"):
+            features_df = feature_engineer(input_df)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Feature engineering failed: {e}")
+
+    # 2. Make sure there are TIMESTEPS clean rows for the model
+    if len(features_df) < TIMESTEPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough clean data after processing. Need {TIMESTEPS} rows, "
+                   f"but only {len(features_df)} were left."
+        )
+
+    # 3. Scale the last TIMESTEPS rows into the rolling buffer
+    try:
+        with instrumentation.stage("scale"):
+            return RollingFeatureBuffer(
+                input_df, features_df, feature_scaler, HOLIDAY_DATES, RAINFALL_LOOKUP, TIMESTEPS
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scaling failed: {e}")
+
+def unscale_demand(scaled_demand: np.ndarray) -> np.ndarray:
+    """
+    Un-scales model outputs: only the 'Power demand' column's affine map.
+    """
+    with instrumentation.stage("inverse_transform"):
+        return feature_scaler.inverse_target(scaled_demand)
+
+async def recursive_forecast(buffer: RollingFeatureBuffer, steps: int,
+                             future_weather: np.ndarray = None) -> List[float]:
+    """
+    Runs the single-step model 'steps' times, feeding each prediction back in.
+    Every step goes through the micro-batcher, so concurrent requests share forward passes.
+    'future_weather' (at least steps - 1 rows in WEATHER_COLUMNS order) is the
+    weather of the predicted rows; without it they repeat the last row's.
+    """
+    predictions_list = []
+
+    with batchers["demand"].active():
+        for i in range(steps):
+            # 4. Predict (batched with any other in-flight requests)
+            scaled_pred = (await batchers["demand"].submit(buffer.window()))[0]
+            instrumentation.count_steps("demand")
+
+            # 5. Un-scale the prediction
+            real_pred = unscale_demand(np.array([scaled_pred]))[0]
+
+            # Add the prediction to our list
+            predictions_list.append(real_pred)
+
+            # 6. Prepare for the *next* loop (if not the last step).
+            # The buffer appends a "fake" raw row with the predicted demand and
+            # the forecast weather for that interval, or the last row's weather
+            # (naive assumption: weather doesn't change), and only engineers/scales
+            # that one row.
+            if i < steps - 1:
+                try:
+                    with instrumentation.stage("buffer_advance"):
+                        buffer.advance(real_pred, None if future_weather is None else future_weather[i:i + 1])
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Not enough clean data after processing. Need {TIMESTEPS} rows. {e}"
+                    )
+
+    return predictions_list
+
+async def forecast_demand(input_df: pd.DataFrame, steps: int = 1,
+                          future_weather: pd.DataFrame = None) -> List[float]:
+    """
+    Demand (kW) for the 'steps' intervals after a raw history window, through the
+    prediction cache. Shared by the endpoints and by in-process callers (see
+    prediction_engines.py). 'future_weather' (WEATHER_COLUMNS, one row per
+    interval after the history) replaces the frozen last-row weather.
+    """
+    if not runner or not scaler:
+        raise startup.unavailable("Model artifacts not loaded.")
+    if future_weather is not None and len(future_weather) < steps - 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"future_weather covers {len(future_weather)} intervals; {steps} steps need at least {steps - 1}."
+        )
+    key = cache_key("predict", MODEL_VERSIONS["demand"], steps, frame_fingerprint(input_df),
+                    *([] if future_weather is None else [frame_fingerprint(future_weather.head(steps - 1))]))
+    predictions_list = prediction_cache.get(key)
+    if predictions_list is None:
+        buffer = await pools["features"].run(build_feature_buffer, input_df)
+        predictions_list = await recursive_forecast(
+            buffer, steps, None if future_weather is None else future_weather[WEATHER_COLUMNS].to_numpy(dtype=np.float64)
+        )
+        prediction_cache.put(key, predictions_list)
+    return predictions_list
+
+# --- 7. The RECURSIVE Prediction Endpoint ---
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(raw_data: List[RawDataPoint], steps: int = 1):
+@app.post("/predict", response_model=PredictionResponse, openapi_extra=FORECAST_BODY)
+async def predict(request: Request, steps: int = 1):
     """
     Predicts the power demand for the next 'steps' 5-minute intervals.
     
     - 'steps=1': Single, accurate prediction.
     - 'steps > 1': Recursive, less accurate prediction.
+
+    Body: a JSON list of RawDataPoint rows, or the same columns as Arrow IPC /
+    msgpack / npz (see wire_format.py), chosen by Content-Type. For a weather
+    forecast instead of the last row's weather, send a JSON object
+    {"history": [rows], "future_weather": {"temp": [...], ..., "pres": [...]}}
+    with one value per interval after the history (the last step's is not
+    needed), e.g. 287 for a day-ahead steps=288 forecast.
+    """
+    if not runner or not scaler:
+        raise startup.unavailable("Model artifacts not loaded.")
+    check_steps(steps)
+
+    body = await request.body()
+    input_df, future_weather = await pools["features"].run(
+        parse_forecast_request, body, request.headers.get("content-type")
+    )
+    predictions_list = await forecast_demand(input_df, steps, future_weather)
+
+    # After the loop, return the full list
+    warning = ""
+    if steps > 1:
+        warning = RECURSIVE_WARNING if future_weather is None else FORECAST_WEATHER_WARNING
+    return prediction_response(request, predictions_list, warning)
+
+# --- 8. The DIRECT Multi-Horizon Prediction Endpoint ---
+
+@app.post("/predict_horizon", response_model=PredictionResponse, openapi_extra=RAW_ROWS_BODY)
+async def predict_horizon(request: Request, steps: int = TIMESTEPS, model_name: str = "seq2seq"):
+    """
+    Predicts the next 'steps' 5-minute intervals with ONE forward pass of a
+    multi-horizon model ('seq2seq' or 'multi_step').
+
+    If 'steps' is longer than the horizon the model emits, falls back to the
+    recursive single-step path used by /predict.
     """
-    if not model or not scaler:
-        raise HTTPException(status_code=500, detail="Model artifacts not loaded.")
-        
-    if len(raw_data) < REQUIRED_INPUT_ROWS:
+    if not scaler:
+        raise startup.unavailable("Model artifacts not loaded.")
+    if model_name not in HORIZON_MODEL_PATHS:
         raise HTTPException(
             status_code=400,
-            detail=f"Not enough data. Requires {REQUIRED_INPUT_ROWS} rows, got {len(raw_data)}."
+            detail=f"Unknown model '{model_name}'. Choose one of {list(HORIZON_MODEL_PATHS)}."
         )
+    check_steps(steps)
 
-    # Convert to DataFrame
-    input_df = pd.DataFrame([row.dict() for row in raw_data])
-    input_df = input_df.rename(columns={"Power_demand": "Power demand"})
+    horizon_runner = horizon_runners.get(model_name)
+    if horizon_runner is None:
+        raise startup.unavailable(f"Horizon model '{model_name}' not loaded.")
 
-    predictions_list = []
-    current_df = input_df.copy()
+    # multi_step emits (batch, horizon), seq2seq emits (batch, horizon, 1)
+    model_horizon = int(np.prod(horizon_runner.output_shape[1:]))
 
-    for i in range(steps):
-        # 1. Run the full feature engineering pipeline
-        try:
-            features_df = feature_engineer(current_df)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Feature engineering failed: {e}")
-
-        # 2. Get the last TIMESTEPS rows for the model
-        if len(features_df) < TIMESTEPS:
+    input_df = await read_raw_rows(request)
+    key = cache_key("horizon", model_name, MODEL_VERSIONS[model_name], MODEL_VERSIONS["demand"],
+                    steps, frame_fingerprint(input_df))
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return prediction_response(request, *cached)
+
+    buffer = await pools["features"].run(build_feature_buffer, input_df)
+
+    if steps > model_horizon:
+        if not runner:
+            raise startup.unavailable("Model artifacts not loaded.")
+        predictions_list = await recursive_forecast(buffer, steps)
+        warning = f"Requested {steps} steps but '{model_name}' only emits {model_horizon}. {RECURSIVE_WARNING}"
+    else:
+        scaled_preds = (await batchers[model_name].submit(buffer.window())).reshape(-1)[:steps]
+        predictions_list = unscale_demand(scaled_preds).tolist()
+        warning = ""
+
+    prediction_cache.put(key, [predictions_list, warning])
+    return prediction_response(request, predictions_list, warning)
+
+# --- 9. Scenario Sweep Endpoint ---
+
+MAX_SCENARIOS = 1024
+
+def scenario_batch(window: np.ndarray, axes: List[ScenarioAxis]) -> np.ndarray:
+    """
+    The base scaled window followed by one perturbed copy per grid point, as a
+    (1 + n_scenarios, TIMESTEPS, n_features) float32 batch. Perturbations are in
+    raw units and apply to every row of the window; with the affine scaler an
+    offset of d is a shift of d * scale in scaled space.
+    """
+    feature_names = list(scaler.feature_names_in_)
+    grids = np.meshgrid(*[np.asarray(axis.values, dtype=np.float64) for axis in axes], indexing='ij')
+    n_scenarios = grids[0].size
+
+    batch = np.empty((1 + n_scenarios,) + window.shape, dtype=np.float32)
+    batch[:] = window
+    for axis, grid in zip(axes, grids):
+        j = feature_names.index(axis.column)
+        values = grid.reshape(-1, 1)
+        if axis.kind == "offset":
+            batch[1:, :, j] += values * feature_scaler.scale[j]
+        else:
+            batch[1:, :, j] = values * feature_scaler.scale[j] + feature_scaler.offset[j]
+    return batch
+
+@app.post("/predict_scenarios", response_model=ScenarioSweepResponse)
+async def predict_scenarios(sweep: ScenarioSweepRequest, model_name: str = "demand", steps: int = 1):
+    """
+    What-if sweep: predicts every combination of the perturbation axes from one base
+    history with ONE batched forward pass, and returns the demand surface.
+
+    'model_name' is 'demand' (next 5 minutes) or a horizon model ('seq2seq',
+    'multi_step') for 'steps' intervals per scenario. Axis columns must be model
+    inputs (scaler.feature_names_in_); calendar flags that the model doesn't see
+    can't be swept.
+    """
+    sweep_runner = {"demand": runner, **horizon_runners}.get(model_name)
+    if sweep_runner is None or not scaler:
+        raise startup.unavailable(f"Model '{model_name}' not loaded.")
+    model_horizon = int(np.prod(sweep_runner.output_shape[1:]))
+    if not 1 <= steps <= model_horizon:
+        raise HTTPException(status_code=400, detail=f"'{model_name}' predicts 1 to {model_horizon} steps.")
+
+    feature_names = list(scaler.feature_names_in_)
+    if not sweep.axes:
+        raise HTTPException(status_code=400, detail="Send at least one axis.")
+    for axis in sweep.axes:
+        if axis.column not in feature_names:
             raise HTTPException(
                 status_code=400,
-                detail=f"Not enough clean data after processing. Need {TIMESTEPS} rows, "
-                       f"but only {len(features_df)} were left."
+                detail=f"Can't sweep '{axis.column}': not a model input. Choose from {feature_names}."
             )
-        
-        final_window_df = features_df.tail(TIMESTEPS)
-        
-        # 3. Scale the data
-        try:
-            feature_order = scaler.feature_names_in_
-            X_scaled = scaler.transform(final_window_df[feature_order])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Scaling failed: {e}")
-        
-        # 4. Reshape and Predict
-        X_reshaped = np.expand_dims(X_scaled, axis=0)
-        scaled_pred = model.predict(X_reshaped)[0][0]
-        
-        # 5. Un-scale the prediction
-        dummy_array = np.zeros((1, scaler.n_features_in_))
-        dummy_array[0, 0] = scaled_pred
-        real_pred = scaler.inverse_transform(dummy_array)[0, 0]
-        
-        # Add the prediction to our list
-        predictions_list.append(real_pred)
-
-        # 6. Prepare for the *next* loop (if not the last step)
-        if i < steps - 1:
-            # Get the last *raw* row to copy weather data
-            last_raw_row = current_df.iloc[-1]
-            
-            # Create a new "fake" raw row
-            new_datetime = (pd.to_datetime(last_raw_row['datetime']) + timedelta(minutes=5))
-            
-            # Calculate the new 'moving_avg_3'
-            new_moving_avg = (
-                real_pred + 
-                last_raw_row['Power demand'] + 
-                current_df.iloc[-2]['Power demand']
-            ) / 3.0
-
-            new_raw_row_dict = {
-                "datetime": new_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                "Power demand": real_pred, # Use the predicted demand
-                "moving_avg_3": new_moving_avg,
-                
-                # --- Naive Assumption: Weather doesn't change ---
-                "temp": last_raw_row['temp'],
-                "dwpt": last_raw_row['dwpt'],
-                "rhum": last_raw_row['rhum'],
-                "wdir": last_raw_row['wdir'],
-                "wspd": last_raw_row['wspd'],
-                "pres": last_raw_row['pres']
-            }
-
-            # Append this new row (as a DataFrame)
-            current_df = pd.concat([
-                current_df, 
-                pd.DataFrame([new_raw_row_dict])
-            ], ignore_index=True)
-            
-            # Drop the *oldest* row to keep the window size constant
-            current_df = current_df.iloc[1:]
+        if axis.kind not in ("offset", "set") or not axis.values:
+            raise HTTPException(status_code=400, detail=f"Axis '{axis.column}' needs values and a kind of 'offset' or 'set'.")
+    n_scenarios = int(np.prod([len(axis.values) for axis in sweep.axes]))
+    if n_scenarios > MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"{n_scenarios} scenarios requested; the limit is {MAX_SCENARIOS}.")
 
-    # After the loop, return the full list
+    input_df = await pools["features"].run(history_frame, sweep.history)
+    buffer = await pools["features"].run(build_feature_buffer, input_df)
+    batch = scenario_batch(buffer.window(), sweep.axes)
+
+    predict_fn = instrumentation.timed(f"model_predict:{model_name}")(sweep_runner.predict)
+    scaled = (await pools["inference"].run(predict_fn, batch)).reshape(len(batch), -1)[:, :steps]
+    demand = unscale_demand(scaled.reshape(-1)).reshape(scaled.shape)
+
+    grid_shape = [len(axis.values) for axis in sweep.axes]
     return {
-        "predicted_demand_kw": predictions_list,
+        "axes": sweep.axes,
+        "surface": demand[1:].reshape(grid_shape + [steps]).tolist(),
+        "baseline_demand_kw": demand[0].tolist(),
+        "model_name": model_name,
         "prediction_time_utc": datetime.utcnow().isoformat(),
-        "warning": "Predictions beyond the first step are recursive and may be inaccurate due to error accumulation and naive weather assumptions." if steps > 1 else ""
     }
 
-# --- 7. Root Endpoint ---
+# --- 10. Monte Carlo Quantile Endpoint ---
+
+async def ensemble_forecast(input_df: pd.DataFrame, steps: int, trajectories: int, seed: int) -> np.ndarray:
+    """
+    (1 + trajectories, steps) demand paths (kW): row 0 is the deterministic
+    forecast (/predict's to float32 tolerance: batching can change the
+    rounding), the others resample weather from historical analogues and add
+    residual noise, floored at 0 kW (see monte_carlo.py). All of them advance in one
+    batched forward pass per step.
+    """
+    buffer = await pools["features"].run(build_feature_buffer, input_df)
+    rng = np.random.default_rng(seed)
+    weather = np.empty((1 + trajectories, steps, len(WEATHER_COLUMNS)))
+    raw_weather = input_df[WEATHER_COLUMNS].to_numpy(dtype=np.float64)
+    weather[0] = raw_weather[-1] # the naive "weather doesn't change" row of /predict
+    try:
+        weather[1:] = weather_analogue_paths(raw_weather, steps, trajectories, rng)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    sigma = RESIDUAL_SIGMA if RESIDUAL_SIGMA is not None else \
+        window_residual_sigma(input_df['Power demand'].to_numpy(dtype=np.float64))
+
+    ensemble = buffer.fork(1 + trajectories)
+    predict_fn = instrumentation.timed("model_predict:demand")(runner.predict)
+    last_ts = pd.Timestamp(input_df['datetime'].iloc[-1])
+    paths = np.empty((1 + trajectories, steps))
+    for i in range(steps):
+        scaled = await pools["inference"].run(predict_fn, ensemble.windows())
+        instrumentation.count_steps("demand")
+        demand = unscale_demand(np.asarray(scaled).reshape(len(paths), -1)[:, 0])
+        hour = (last_ts + (i + 1) * pd.Timedelta(minutes=5)).hour
+        demand[1:] += rng.normal(0.0, sigma[hour], trajectories)
+        np.maximum(demand[1:], 0.0, out=demand[1:]) # demand can't go negative
+        paths[:, i] = demand
+
+        # Each trajectory's row for this step: its own prediction and weather
+        if i < steps - 1:
+            try:
+                with instrumentation.stage("buffer_advance"):
+                    ensemble.advance(demand, weather[:, i])
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Not enough clean data after processing. Need {TIMESTEPS} rows. {e}"
+                )
+    return paths
+
+@app.post("/predict_quantiles", response_model=QuantileForecastResponse, openapi_extra=RAW_ROWS_BODY)
+async def predict_quantiles(request: Request, steps: int = 1, trajectories: int = MONTE_CARLO_TRAJECTORIES,
+                            quantiles: str | None = None, seed: int = 0):
+    """
+    Prediction intervals for the next 'steps' (up to TIMESTEPS) 5-minute intervals
+    from 'trajectories' Monte Carlo forecasts, plus the point forecast.
+
+    'quantiles' is a comma-separated list (default 0.05,0.25,0.5,0.75,0.95);
+    'seed' makes the ensemble reproducible (and cacheable). Accepts the same
+    body formats as /predict.
+    """
+    if not runner or not scaler:
+        raise startup.unavailable("Model artifacts not loaded.")
+    if not 1 <= steps <= TIMESTEPS:
+        raise HTTPException(status_code=400, detail=f"Quantile forecasts cover 1 to {TIMESTEPS} steps.")
+    if not 1 <= trajectories <= MAX_MONTE_CARLO_TRAJECTORIES:
+        raise HTTPException(status_code=400, detail=f"Use 1 to {MAX_MONTE_CARLO_TRAJECTORIES} trajectories.")
+    try:
+        quantile_levels = parse_quantiles(quantiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    input_df = await read_raw_rows(request)
+    key = cache_key("quantiles", MODEL_VERSIONS["demand"], MODEL_VERSIONS["residuals"], steps, trajectories,
+                    ",".join(map(str, quantile_levels)), seed, frame_fingerprint(input_df))
+    result = prediction_cache.get(key)
+    if result is None:
+        paths = await ensemble_forecast(input_df, steps, trajectories, seed)
+        result = {
+            "point_forecast_kw": paths[0].tolist(),
+            **summarize(paths[1:], quantile_levels),
+            "trajectories": trajectories,
+            "warning": "" if RESIDUAL_SIGMA is not None else
+                       "No backtest residuals loaded; noise is estimated from the request window.",
+        }
+        prediction_cache.put(key, result)
+    return {**result, "prediction_time_utc": datetime.utcnow().isoformat()}
+
+# --- 11. Server-Side History Endpoints ---
+
+@app.post("/history/ingest", response_model=IngestResponse, openapi_extra=RAW_ROWS_BODY)
+async def ingest_history(request: Request):
+    """
+    Appends the newest raw row(s) to the server-side history. Rows at or before
+    the newest stored datetime are ignored, so retries are safe; the rest must
+    continue the stored history every 5 minutes (400 for a gap).
+    Accepts the same body formats as /predict.
+    """
+    input_df = await read_raw_rows(request)
+    try:
+        rows_ingested = history_store.append(input_df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Persist roughly every HISTORY_PERSIST_EVERY rows
+    if HISTORY_STORE_PATH and rows_ingested and \
+            len(history_store) % HISTORY_PERSIST_EVERY < rows_ingested:
+        await pools["features"].run(history_store.save)
+
+    latest = history_store.latest
+    return {
+        "rows_ingested": rows_ingested,
+        "total_rows": len(history_store),
+        "latest_datetime": str(latest) if latest is not None else None
+    }
+
+@app.post("/predict_at", response_model=PredictionResponse)
+async def predict_at(request: Request, timestamp: str | None = None, steps: int = 1):
+    """
+    Same as /predict, but the history comes from the server-side store:
+    predicts the 'steps' intervals after 'timestamp' (default: the newest stored row).
+    """
+    if not runner or not scaler:
+        raise startup.unavailable("Model artifacts not loaded.")
+    check_steps(steps)
+
+    try:
+        input_df = history_store.window(REQUIRED_INPUT_ROWS, end=timestamp)
+    except RowNotStored as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    predictions_list = await forecast_demand(input_df, steps)
+
+    return prediction_response(request, predictions_list, RECURSIVE_WARNING if steps > 1 else "")
+
+@app.get("/history/stats")
+def history_stats():
+    """
+    Rows held, covered time range and memory used by the history store.
+    """
+    return history_store.stats()
+
+@app.on_event("shutdown")
+def persist_history():
+    history_store.save()
+
+# --- 12. Health, Startup & Inference Stats Endpoints ---
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and serving (artifacts may still be loading).
+    """
+    return startup.liveness()
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 once every required artifact is loaded and warmed up, 503
+    otherwise. The body has the status and per-stage startup timings.
+    """
+    return startup.readiness()
+
+@app.get("/inference_stats")
+def inference_stats():
+    """
+    Latency percentiles of the compiled forward passes, per model.
+    """
+    runners = {"demand": runner, **horizon_runners}
+    return {name: r.latency_stats() for name, r in runners.items() if r is not None}
+
+@app.get("/pool_stats")
+def pool_stats():
+    """
+    Worker pool usage: workers, concurrency limit, in-flight and waiting calls.
+    """
+    return {name: p.stats() for name, p in pools.items()}
+
+@app.get("/batching_stats")
+def batching_stats():
+    """
+    Micro-batching metrics per model: batch sizes and queue wait.
+    """
+    return {name: b.stats() for name, b in batchers.items()}
+
+@app.get("/cache_stats")
+def cache_stats():
+    """
+    Prediction cache counters: entries, hits, misses, evictions and expirations.
+    """
+    return {"predict": prediction_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: stage timings, request and recursion-step counters, and
+    the pool / batcher / cache / startup stats above as gauges.
+    """
+    return metrics_response()
+
+# /debug/profiler, only with ENABLE_DEBUG_PROFILER=1 (see instrumentation.py)
+add_profiler_routes(app)
+
+# --- 13. Root Endpoint ---
 @app.get("/")
 def read_root():
     return {"message": "Delhi Power Demand API is running."}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
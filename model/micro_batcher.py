@@ -0,0 +1,184 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# --- Request micro-batching in front of a model ---
+#
+# Concurrent /predict callers each used to run their own batch-of-one forward
+# pass. The batcher queues their (timesteps, n_features) windows, waits up to
+# max_wait_ms (or until max_batch_size windows are queued), runs ONE batched
+# forward pass off the event loop and hands every caller its own output row.
+# A lone caller (nothing else queued, waiting or active) doesn't wait at all:
+# a recursive /predict?steps=288 on an idle server would otherwise pay
+# max_wait_ms on each of its 288 passes. Callers that submit many windows in
+# a row wrap the loop in active(), so other callers wait for their next window
+# instead of dispatching between its steps.
+
+MAX_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_MAX_SIZE", "32"))
+MAX_WAIT_MS = float(os.environ.get("PREDICT_BATCH_MAX_WAIT_MS", "2"))
+
+# How many recent requests the queue-wait percentiles are computed over
+WAIT_WINDOW = 1000
+
+
+class MicroBatcher:
+    """
+    Collects single windows from concurrent callers into batched calls of 'predict_fn'.
+
+    'predict_fn' takes a (batch, timesteps, n_features) array and returns one output
+    row per window. It runs in 'executor' (None = the loop's default thread pool).
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.executor = executor
+
+        self._queue = None
+        self._worker = None
+        self._waiting = 0 # submit() calls awaiting their row
+        self._active = 0 # open active() blocks
+
+        # Metrics
+        self.batch_sizes = Counter()
+        self._waits_ms = deque(maxlen=WAIT_WINDOW)
+        self.requests = 0
+        self.batches = 0
+        self.immediate_batches = 0
+
+    async def submit(self, window: np.ndarray) -> np.ndarray:
+        """
+        Queues one window and waits for its row of the batched output.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._waiting += 1
+        try:
+            await self._queue.put((window, future, time.perf_counter()))
+            return await future
+        finally:
+            self._waiting -= 1
+
+    @contextmanager
+    def active(self):
+        """
+        Marks a caller that will submit several windows in a row (e.g. a recursive
+        forecast), so other callers keep batching with it between its steps.
+        """
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+
+    def _ensure_worker(self):
+        # Started lazily so the queue and task belong to the running event loop
+        if self._worker is None or self._worker.done():
+            loop = asyncio.get_running_loop()
+            old_queue, self._queue = self._queue, asyncio.Queue()
+            # A dead worker leaves its queued windows behind: requeue the ones
+            # from this loop, fail the ones whose loop is gone
+            while old_queue is not None and not old_queue.empty():
+                item = old_queue.get_nowait()
+                future = item[1]
+                if future.done():
+                    continue
+                if future.get_loop() is loop:
+                    self._queue.put_nowait(item)
+                else:
+                    try:
+                        future.set_exception(RuntimeError("Micro-batcher worker stopped."))
+                    except RuntimeError: # its event loop is closed
+                        pass
+            self._worker = loop.create_task(self._run())
+
+    def _alone(self, batch: list) -> bool:
+        """True if no other caller could join this batch."""
+        return self._queue.empty() and self._waiting <= len(batch) and self._active <= 1
+
+    async def _collect(self, batch: list):
+        """
+        Waits for the first window, then gathers more into 'batch' until it is
+        full or max_wait_ms has passed since the first one arrived.
+        """
+        batch.append(await self._queue.get())
+        if self._alone(batch):
+            self.immediate_batches += 1
+            return
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Anything that is already queued rides along for free
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                await self._dispatch(loop, batch)
+        finally:
+            # Cancelled or crashed: don't leave the current batch or the queued
+            # callers waiting forever
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Micro-batcher worker stopped."))
+
+    async def _dispatch(self, loop, batch: list):
+        """Runs one batched forward pass and resolves its callers' futures."""
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self._waits_ms.append((started - enqueued) * 1000.0)
+        self.requests += len(batch)
+        self.batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+        windows = np.stack([window for window, _, _ in batch])
+        try:
+            outputs = await loop.run_in_executor(self.executor, self.predict_fn, windows)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future, _) in enumerate(batch):
+            if not future.done(): # the caller may have been cancelled
+                future.set_result(outputs[i])
+
+    def stats(self) -> dict:
+        """
+        Batch size distribution and queue-wait percentiles (ms).
+        """
+        waits = np.array(self._waits_ms)
+        wait_stats = {"p50_ms": None, "p90_ms": None, "p99_ms": None}
+        if len(waits):
+            p50, p90, p99 = np.percentile(waits, [50, 90, 99])
+            wait_stats = {"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99)}
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "immediate_batches": self.immediate_batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else None,
+            "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+            "queue_wait": wait_stats,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+        }
@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+
+from feature_buffer import LAG_24HR, WEATHER_COLUMNS
+
+# --- Monte Carlo forecast ensembles ---
+#
+# /predict only returns a point forecast, and past step 1 it freezes the
+# weather and feeds its own predictions back as if they were exact. For
+# prediction intervals, /predict_quantiles runs K perturbed recursive
+# trajectories next to the deterministic one, all in ONE buffer
+# (RollingFeatureBuffer.fork), so every step is one (1 + K, timesteps,
+# n_features) forward pass instead of K separate loops:
+#   - weather: each trajectory replays how the weather changed over the same
+#     hours on one of the last ANALOGUE_DAYS days of the request window
+#     (historical analogues), starting from the last observed row;
+#   - residuals: each prediction gets N(0, sigma[hour]) noise (floored at
+#     0 kW) before it is fed back, with sigma the per-hour RMSE from a
+#     backtest.py --output report (or, without one, the spread of 5-minute
+#     demand changes in the window).
+
+MONTE_CARLO_TRAJECTORIES = int(os.environ.get("MONTE_CARLO_TRAJECTORIES", 64))
+MAX_MONTE_CARLO_TRAJECTORIES = int(os.environ.get("MAX_MONTE_CARLO_TRAJECTORIES", 512))
+MONTE_CARLO_RESIDUALS_PATH = os.environ.get("MONTE_CARLO_RESIDUALS_PATH", "model_artifacts/backtest_results.json")
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+ANALOGUE_DAYS = 7
+
+
+def load_hourly_residuals(path: str) -> np.ndarray | None:
+    """
+    Per-hour RMSE (kW) of the 1-step model, shape (24,), from the 'by_hour'
+    table of a backtest.py --output report. Hours missing from the report get
+    the mean of the others. None if there is no report.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        by_hour = json.load(f).get("by_hour", [])
+    sigma = np.full(24, np.nan)
+    for row in by_hour:
+        sigma[int(row["hour"])] = row["rmse"]
+    if np.isnan(sigma).all():
+        return None
+    return np.where(np.isnan(sigma), np.nanmean(sigma), sigma)
+
+
+def window_residual_sigma(demand: np.ndarray) -> np.ndarray:
+    """Fallback residuals: the std of the window's 5-minute demand changes, for every hour."""
+    return np.full(24, float(np.std(np.diff(demand))))
+
+
+def weather_analogue_paths(weather: np.ndarray, steps: int, trajectories: int,
+                           rng: np.random.Generator) -> np.ndarray:
+    """
+    (trajectories, steps, len(WEATHER_COLUMNS)) weather for the 'steps' rows after
+    a raw window whose weather is 'weather' (n_rows, len(WEATHER_COLUMNS)).
+
+    Each trajectory picks one of the last ANALOGUE_DAYS days and adds that day's
+    changes since the same time of day to the last observed row. Raises
+    ValueError if the window holds less than one full analogue day or 'steps'
+    reaches past it (more than a day ahead).
+    """
+    n_rows = len(weather)
+    days = min(ANALOGUE_DAYS, (n_rows - 1) // LAG_24HR)
+    if days < 1 or steps > LAG_24HR:
+        raise ValueError(f"Weather analogues cover up to {LAG_24HR} steps from at least one day of history.")
+
+    analogue_days = rng.integers(1, days + 1, size=trajectories)
+    base = n_rows - 1 - analogue_days * LAG_24HR # the analogue of the last observed row
+    rows = base[:, None] + np.arange(1, steps + 1)
+    paths = weather[-1] + (weather[rows] - weather[base][:, None, :])
+
+    # Keep the perturbed values physical
+    wdir, rhum, wspd = (WEATHER_COLUMNS.index(c) for c in ('wdir', 'rhum', 'wspd'))
+    paths[..., wdir] %= 360.0
+    np.clip(paths[..., rhum], 0.0, 100.0, out=paths[..., rhum])
+    np.maximum(paths[..., wspd], 0.0, out=paths[..., wspd])
+    return paths
+
+
+def parse_quantiles(text: str | None) -> tuple:
+    """'0.05,0.5,0.95' -> sorted unique floats strictly between 0 and 1 (ValueError otherwise)."""
+    if not text:
+        return DEFAULT_QUANTILES
+    message = "Quantiles must be comma-separated numbers between 0 and 1."
+    try:
+        quantiles = sorted({float(q) for q in text.split(",") if q.strip()})
+    except ValueError:
+        raise ValueError(message)
+    if not quantiles or not all(0.0 < q < 1.0 for q in quantiles):
+        raise ValueError(message)
+    return tuple(quantiles)
+
+
+def summarize(paths: np.ndarray, quantiles) -> dict:
+    """Mean and quantiles (keyed by their string form) over the trajectories of (K, steps) paths."""
+    values = np.quantile(paths, quantiles, axis=0)
+    return {
+        "mean_kw": paths.mean(axis=0).tolist(),
+        "quantiles": {str(q): v.tolist() for q, v in zip(quantiles, values)},
+    }
@@ -1,11 +1,17 @@
 import pandas as pd
 import numpy as np
-import joblib
-import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List
 from datetime import datetime
+from worker_pools import BoundedPool, pool_size_from_env
+from prediction_cache import PredictionCache, cache_key, frame_fingerprint, model_version
+from startup import Startup, with_import_lock
+from instrumentation import Instrumentation, add_profiler_routes, metrics_response
+from wire_format import (
+    JSON, WireFormatError, columnar_response, columns_to_frame, negotiate, openapi_body, parse_rows
+)
 
 # --- 1. Configuration & Global Variables ---
 MODEL_PATH = "model_artifacts/monthly_demand_model.joblib"
@@ -24,17 +30,47 @@ app = FastAPI(
     description="API to predict total monthly power demand."
 )
 
+# Stage timers, request counters and /metrics (see instrumentation.py)
+instrumentation = Instrumentation("monthly-api")
+app.middleware("http")(instrumentation.http_middleware)
+
 # --- 3. Load Model and Features on Startup ---
-try:
-    print("Loading monthly model...")
-    monthly_model = joblib.load(MODEL_PATH)
-    print("Loading monthly model features...")
-    model_features = joblib.load(FEATURES_PATH)
-    print(f"  Model expects {len(model_features)} features.")
-    print("\n--- Monthly API Ready ---")
-except Exception as e:
-    print(f"FATAL ERROR: Could not load monthly artifacts. {e}")
-    monthly_model, model_features = None, None
+# Loaded in the background once the server is up (see startup.py); /readyz
+# reports when they're in, with per-stage timings.
+monthly_model, model_features = None, None
+startup = Startup("monthly-api")
+
+def load_artifacts():
+    """
+    Loads the monthly model and its feature list (in parallel) and warms up predict().
+    """
+    global monthly_model, model_features
+    import joblib
+
+    loaded = startup.run_parallel({
+        "monthly_model": with_import_lock(lambda: joblib.load(MODEL_PATH)),
+        "model_features": with_import_lock(lambda: joblib.load(FEATURES_PATH)),
+    })
+    print(f"  Model expects {len(loaded['model_features'])} features.")
+    with startup.stage("warm_up"):
+        loaded["monthly_model"].predict(np.zeros((1, len(loaded["model_features"]))))
+    monthly_model, model_features = loaded["monthly_model"], loaded["model_features"]
+
+@app.on_event("startup")
+def start_loading():
+    startup.run_in_background(load_artifacts)
+
+# pandas lag features + model.predict run here instead of on the event loop
+monthly_pool = BoundedPool("monthly", pool_size_from_env("monthly", 4))
+
+# Repeated histories (simulator ticks within the same month, retries) reuse earlier results
+prediction_cache = PredictionCache("predict_monthly")
+MODEL_VERSION = model_version(MODEL_PATH, FEATURES_PATH)
+
+# The existing stats, exported as gauges at /metrics too
+instrumentation.collect("worker_pool", lambda: {"monthly": monthly_pool.stats()})
+instrumentation.collect("prediction_cache", prediction_cache.stats)
+instrumentation.collect("startup", startup.report)
 
 # --- 4. Define Input/Output Schemas ---
 
@@ -60,44 +96,97 @@ class MonthlyDataPoint(BaseModel):
     Total_Vehicles_Plying: float
     # Add any other features included during training
 
+# Column-level schema for columnar (Arrow / msgpack / npz) request bodies
+MONTHLY_COLUMN_SCHEMA = {
+    name: "int" if annotation is int else "float"
+    for name, annotation in MonthlyDataPoint.__annotations__.items()
+}
+
 class MonthlyPredictionResponse(BaseModel):
     predicted_total_demand_kw: float
     prediction_for_month: str # e.g., "2025-11"
     prediction_time_utc: str
 
+class MonthlyBatchRequest(BaseModel):
+    """
+    Many histories (e.g. what-if variants), each forecast 'horizon' months ahead.
+    """
+    histories: List[List[MonthlyDataPoint]]
+    horizon: int = 1
+
+class MonthlyForecastPoint(BaseModel):
+    prediction_for_month: str
+    predicted_total_demand_kw: float
+
+class MonthlyBatchResponse(BaseModel):
+    # One list of 'horizon' forecasts per history, in request order
+    predictions: List[List[MonthlyForecastPoint]]
+    prediction_time_utc: str
+    warning: str = ""
+
+MAX_BATCH_HORIZON = 36 # months
+# Months after the first are predicted recursively: each prediction becomes the
+# next month's demand, weather repeats the same month of the previous year and
+# the annual indicators carry forward from the last month.
+SEASONAL_COLUMNS = ['temp', 'dwpt', 'rhum', 'wdir', 'wspd', 'pres', 'Total_Rainfall_mm']
+RECURSIVE_MONTHLY_WARNING = ("Months beyond the first are recursive: they use earlier predictions as "
+                             "demand history and last year's weather for the same month.")
+
 # --- 5. The Monthly Prediction Endpoint ---
 
-@app.post("/predict_monthly", response_model=MonthlyPredictionResponse)
-async def predict_monthly(historical_data: List[MonthlyDataPoint]):
+def forecast_next_month(body: bytes, content_type: str | None) -> dict:
     """
-    Predicts the total power demand for the NEXT month.
-    
-    Expects a JSON list of the last 12 months of aggregated data.
+    Blocking part of /predict_monthly: body parsing, lag features and the model call.
+    """
+    # 1. Convert to DataFrame (JSON rows or columnar body)
+    # Ensure columns match EXACTLY what the model was trained on
+    with instrumentation.stage("parse"):
+        input_df = parse_rows(body, content_type, MonthlyDataPoint, MONTHLY_COLUMN_SCHEMA)
+    return forecast_from_frame(input_df)
+
+def monthly_frame(columns: dict) -> pd.DataFrame:
+    """
+    MonthlyDataPoint columns as NumPy arrays (e.g. from a simulator calling
+    in-process) -> the history DataFrame, validated like a columnar request body.
+    """
+    try:
+        return columns_to_frame(columns, MONTHLY_COLUMN_SCHEMA)
+    except WireFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def forecast_from_frame(input_df: pd.DataFrame) -> dict:
+    """
+    Next month's demand from a parsed history (MonthlyDataPoint columns).
+    Shared by /predict_monthly and in-process callers (see prediction_engines.py).
     """
     if not monthly_model or not model_features:
-        raise HTTPException(status_code=500, detail="Monthly model artifacts not loaded.")
+        raise startup.unavailable("Monthly model artifacts not loaded.")
 
-    # 1. Check if we have enough historical data (at least 12 months for lag_12)
-    if len(historical_data) < 12:
+    # 2. Check if we have enough historical data (at least 12 months for lag_12)
+    if len(input_df) < 12:
         raise HTTPException(
             status_code=400,
             detail=f"Not enough historical data. Requires at least 12 months "
-                   f"to calculate lag features. You sent {len(historical_data)}."
+                   f"to calculate lag features. You sent {len(input_df)}."
         )
 
-    # 2. Convert to DataFrame
-    # Ensure columns match EXACTLY what the model was trained on
-    input_df = pd.DataFrame([row.dict() for row in historical_data])
     # Rename Year and Month for consistency if needed
     input_df = input_df.rename(columns={"Year": "year", "Month": "month"}) 
     
     # Use only the last 12+ months needed for lags calculation
     input_df = input_df.tail(12 + 3) # Keep enough for rolling avg + lags
 
+    # Same last months as an earlier request -> same prediction
+    key = cache_key("monthly", MODEL_VERSION, frame_fingerprint(input_df))
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return {**cached, "prediction_time_utc": datetime.utcnow().isoformat()}
+
     # 3. Create Lag Features for the *potential* next row
-    input_df['demand_lag_12'] = input_df['Total_Demand_kW'].shift(12)
-    input_df['demand_lag_1'] = input_df['Total_Demand_kW'].shift(1)
-    input_df['demand_rolling_3'] = input_df['Total_Demand_kW'].shift(1).rolling(3).mean()
+    with instrumentation.stage("feature_engineer"):
+        input_df['demand_lag_12'] = input_df['Total_Demand_kW'].shift(12)
+        input_df['demand_lag_1'] = input_df['Total_Demand_kW'].shift(1)
+        input_df['demand_rolling_3'] = input_df['Total_Demand_kW'].shift(1).rolling(3).mean()
 
     # 4. Get the *last* row - this contains the features for the next prediction
     features_for_prediction = input_df.iloc[-1]
@@ -124,7 +213,8 @@ async def predict_monthly(historical_data: List[MonthlyDataPoint]):
 
 
     # 6. Make prediction
-    prediction = monthly_model.predict(feature_vector)[0]
+    with instrumentation.stage("model_predict"):
+        prediction = monthly_model.predict(feature_vector)[0]
 
     # 7. Determine the next month for the response
     last_year = int(features_for_prediction['year'])
@@ -137,14 +227,197 @@ async def predict_monthly(historical_data: List[MonthlyDataPoint]):
         next_month = last_month + 1
     prediction_month_str = f"{next_year}-{next_month:02d}"
 
+    result = {
+        "predicted_total_demand_kw": float(prediction),
+        "prediction_for_month": prediction_month_str,
+    }
+    prediction_cache.put(key, result)
+
+    return {**result, "prediction_time_utc": datetime.utcnow().isoformat()}
+
+@app.post("/predict_monthly", response_model=MonthlyPredictionResponse,
+          openapi_extra=openapi_body(List[MonthlyDataPoint]))
+async def predict_monthly(request: Request):
+    """
+    Predicts the total power demand for the NEXT month.
+    
+    Expects a JSON list of the last 12 months of aggregated data, or the same
+    columns as Arrow IPC / msgpack / npz (see wire_format.py), chosen by Content-Type.
+    """
+    if not monthly_model or not model_features:
+        raise startup.unavailable("Monthly model artifacts not loaded.")
+
+    body = await request.body()
+    result = await monthly_pool.run(forecast_next_month, body, request.headers.get("content-type"))
 
+    response_type = negotiate(request.headers.get("accept"))
+    if response_type != JSON:
+        return columnar_response(
+            {
+                "predicted_total_demand_kw": np.array([result["predicted_total_demand_kw"]], dtype=np.float64),
+                "prediction_for_month": np.array([result["prediction_for_month"]]),
+            },
+            response_type,
+            headers={"X-Prediction-Time-UTC": result["prediction_time_utc"]}
+        )
+    return result
+
+@app.get("/pool_stats")
+def pool_stats():
+    """
+    Worker pool usage: workers, concurrency limit, in-flight and waiting calls.
+    """
+    return {"monthly": monthly_pool.stats()}
+
+@app.get("/cache_stats")
+def cache_stats():
+    """
+    Prediction cache counters: entries, hits, misses, evictions and expirations.
+    """
+    return {"predict_monthly": prediction_cache.stats()}
+
+# --- 6. Batch / Multi-Month Endpoint ---
+
+def batch_features(columns: dict) -> np.ndarray:
+    """
+    The feature matrix forecast_next_month() would build for each history, for all
+    histories at once. 'columns' maps each MonthlyDataPoint value column to an
+    (n_histories, n_months) array of the most recent months.
+    """
+    demand = columns['Total_Demand_kW']
+    features = {name: values[:, -1] for name, values in columns.items()}
+    # Same as shift(12), shift(1) and shift(1).rolling(3).mean() at the last row
+    features['demand_lag_12'] = demand[:, -13]
+    features['demand_lag_1'] = demand[:, -2]
+    features['demand_rolling_3'] = demand[:, -4:-1].mean(axis=1)
+    return np.column_stack([features[name] for name in model_features])
+
+def forecast_batch(batch: MonthlyBatchRequest) -> dict:
+    """
+    Blocking part of /predict_monthly_batch: stacks the histories, then makes one
+    model.predict call per forecast month for all of them.
+    """
+    short = [i for i, history in enumerate(batch.histories) if len(history) < 13]
+    if short:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Histories {short} are too short. Each needs at least 13 consecutive months "
+                   f"to calculate the lag features."
+        )
+
+    # Last 15 months of every history as (n_histories, 15) arrays (rows beyond
+    # a shorter history are NaN and never read)
+    window = 12 + 3
+    value_columns = [name for name in MONTHLY_COLUMN_SCHEMA if name not in ('Year', 'Month')]
+    columns = {name: np.full((len(batch.histories), window), np.nan) for name in value_columns}
+    for i, history in enumerate(batch.histories):
+        recent = history[-window:]
+        for name in value_columns:
+            columns[name][i, window - len(recent):] = [getattr(point, name) for point in recent]
+    last = [history[-1] for history in batch.histories]
+    month_index = np.array([point.Year * 12 + point.Month - 1 for point in last])
+
+    predictions = np.empty((len(batch.histories), batch.horizon))
+    for step in range(batch.horizon):
+        with instrumentation.stage("batch_features"):
+            features = batch_features(columns)
+        if np.isnan(features).any():
+            raise HTTPException(
+                status_code=400,
+                detail="Could not calculate necessary lag features from the provided histories. "
+                       "Ensure every history has at least 13 consecutive months with all columns."
+            )
+        with instrumentation.stage("model_predict_batch"):
+            predictions[:, step] = monthly_model.predict(features)
+        instrumentation.count_steps("monthly", len(batch.histories))
+
+        if step < batch.horizon - 1:
+            # Append the predicted month and drop the oldest one
+            for name, values in columns.items():
+                if name == 'Total_Demand_kW':
+                    new = predictions[:, step]
+                elif name in SEASONAL_COLUMNS:
+                    new = values[:, -12]
+                else:
+                    new = values[:, -1]
+                columns[name] = np.column_stack([values[:, 1:], new])
+
+    months = [
+        [f"{(m + 1 + step) // 12}-{(m + 1 + step) % 12 + 1:02d}" for step in range(batch.horizon)]
+        for m in month_index
+    ]
+    return {"predictions": predictions, "months": months}
+
+@app.post("/predict_monthly_batch", response_model=MonthlyBatchResponse)
+async def predict_monthly_batch(batch: MonthlyBatchRequest, request: Request):
+    """
+    Forecasts 'horizon' months ahead for every history in one call. The first month
+    of each history is exactly what /predict_monthly returns for it.
+
+    The response is JSON, or the columns history / step / prediction_for_month /
+    predicted_total_demand_kw in the columnar format named by Accept.
+    """
+    if not monthly_model or not model_features:
+        raise startup.unavailable("Monthly model artifacts not loaded.")
+    if not batch.histories:
+        raise HTTPException(status_code=400, detail="Send at least one history.")
+    if not 1 <= batch.horizon <= MAX_BATCH_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon must be between 1 and {MAX_BATCH_HORIZON}.")
+
+    result = await monthly_pool.run(forecast_batch, batch)
+    prediction_time = datetime.utcnow().isoformat()
+    warning = RECURSIVE_MONTHLY_WARNING if batch.horizon > 1 else ""
+
+    response_type = negotiate(request.headers.get("accept"))
+    if response_type != JSON:
+        n_histories, horizon = result["predictions"].shape
+        return columnar_response(
+            {
+                "history": np.repeat(np.arange(n_histories), horizon),
+                "step": np.tile(np.arange(1, horizon + 1), n_histories),
+                "prediction_for_month": np.array(result["months"]).reshape(-1),
+                "predicted_total_demand_kw": result["predictions"].reshape(-1),
+            },
+            response_type,
+            headers={"X-Prediction-Time-UTC": prediction_time, "X-Warning": warning}
+        )
     return {
-        "predicted_total_demand_kw": prediction,
-        "prediction_for_month": prediction_month_str,
-        "prediction_time_utc": datetime.utcnow().isoformat()
+        "predictions": [
+            [{"prediction_for_month": month, "predicted_total_demand_kw": value}
+             for month, value in zip(months, values)]
+            for months, values in zip(result["months"], result["predictions"].tolist())
+        ],
+        "prediction_time_utc": prediction_time,
+        "warning": warning
     }
 
-# --- 6. (Optional) Root Endpoint ---
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and serving (artifacts may still be loading).
+    """
+    return startup.liveness()
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 once the model is loaded and warmed up, 503 otherwise. The
+    body has the status and per-stage startup timings.
+    """
+    return startup.readiness()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: stage timings, request counters, and the pool / cache /
+    startup stats as gauges.
+    """
+    return metrics_response()
+
+# /debug/profiler, only with ENABLE_DEBUG_PROFILER=1 (see instrumentation.py)
+add_profiler_routes(app)
+
+# --- 7. (Optional) Root Endpoint ---
 @app.get("/")
 def read_root():
     return {"message": "Delhi Monthly Power Demand API is running."}
@@ -152,4 +425,5 @@ def read_root():
 # This allows running the file directly: python monthly_api.py
 if __name__ == "__main__":
     # Run on a different port than the 5-min API
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001) 
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# --- Prediction result cache ---
+#
+# The simulators, the dashboard and client retries keep sending the same input
+# window. Results are cached under a fingerprint of the parsed window (blake2b
+# over the raw column bytes), the request parameters and the model version, so
+# an identical request skips feature engineering and the model entirely.
+#
+# Each process keeps a bounded LRU with a TTL. With PREDICTION_CACHE_DB set,
+# entries are also written to a local SQLite file that every worker reads on a
+# local miss (a stand-in for a shared store like Redis).
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 256)) # entries; 0 disables
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", 300))
+PREDICTION_CACHE_DB = os.environ.get("PREDICTION_CACHE_DB") or None # e.g. model_artifacts/prediction_cache.db
+
+
+def frame_fingerprint(df: pd.DataFrame) -> bytes:
+    """
+    blake2b digest of a DataFrame's column names, dtypes and values.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for name in df.columns:
+        values = df[name].to_numpy()
+        h.update(f"{name}:{values.dtype}:{len(values)};".encode())
+        if values.dtype == object:
+            h.update("\x1f".join(map(str, values)).encode())
+        else:
+            h.update(np.ascontiguousarray(values).tobytes())
+    return h.digest()
+
+
+def model_version(*paths: str, extra: str = "") -> str:
+    """
+    Version tag for a set of artifact files (path, size and mtime of each), so
+    entries made with an older model or scaler never match.
+    """
+    h = hashlib.blake2b(extra.encode(), digest_size=8)
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            h.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        except OSError:
+            h.update(f"{path}:missing;".encode())
+    return h.hexdigest()
+
+
+def cache_key(*parts) -> str:
+    """Joins key parts (strings, numbers, fingerprint bytes) into one cache key."""
+    return "|".join(p.hex() if isinstance(p, bytes) else str(p) for p in parts)
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU + TTL cache of JSON-serializable prediction results.
+    """
+
+    def __init__(self, name: str, max_entries: int = PREDICTION_CACHE_SIZE,
+                 ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS, shared_path: str = PREDICTION_CACHE_DB):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        if shared_path and max_entries > 0:
+            self._db = sqlite3.connect(shared_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(cache TEXT, key TEXT, value TEXT, expires_at REAL, PRIMARY KEY (cache, key))"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str):
+        """The cached value for 'key', or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM predictions WHERE cache = ? AND key = ? AND expires_at > ?",
+                    (self.name, key, now)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self.shared_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value):
+        """Stores 'value' (must be JSON-serializable) for ttl_seconds."""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                    (self.name, key, json.dumps(value), expires_at)
+                )
+                self._db.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+
+    def _store(self, key: str, value, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE cache = ?", (self.name,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared_store": self._db is not None,
+            }
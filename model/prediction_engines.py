@@ -0,0 +1,144 @@
+import os
+from abc import ABC, abstractmethod
+
+from simulation_data import FiveMinuteSeries, MonthlySeries
+from upstream_client import UpstreamClient
+
+# --- Prediction engines: the same two predictors, over HTTP or in-process ---
+#
+# The simulator already holds the exact rows main.py and monthly_api.py need.
+# Over HTTP (the default, for scaled-out deployments) it encodes them, sends
+# them to ports 8000 / 8001 and the services decode them again. In-process it
+# imports both services as libraries, loads their artifacts itself and hands
+# them the NumPy column slices directly: no encoding, no sockets, no parsing.
+# Both engines go through the services' own validation, prediction cache and
+# micro-batchers, so the predictions are identical.
+#
+# PREDICTION_MODE=inprocess picks the in-process engine (single-box deployments).
+
+PREDICTION_MODE = os.environ.get("PREDICTION_MODE", "http").lower()
+
+
+class PredictionEngine(ABC):
+    """
+    Common interface. *_input() build a request's input from the simulator's
+    datasets (blocking, run them in a worker pool); predict_*() await the
+    prediction and raise on failure.
+    """
+
+    mode = None
+
+    def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    def five_min_input(self, series: FiveMinuteSeries, start: int, stop: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def monthly_input(self, series: MonthlySeries, start: int, stop: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def predict_5min(self, five_min_input) -> float | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def predict_monthly(self, monthly_input) -> float | None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"mode": self.mode}
+
+
+class HttpEngine(PredictionEngine):
+    """
+    Calls the running services through a pooled UpstreamClient with upstreams
+    named '5min' and 'monthly'.
+    """
+
+    mode = "http"
+
+    def __init__(self, upstreams: UpstreamClient, five_min_path: str, monthly_path: str,
+                 five_min_wire_format: str):
+        self.upstreams = upstreams
+        self.five_min_path = five_min_path
+        self.monthly_path = monthly_path
+        self.five_min_wire_format = five_min_wire_format
+
+    def open(self):
+        self.upstreams.open()
+
+    async def close(self):
+        await self.upstreams.aclose()
+
+    def five_min_input(self, series: FiveMinuteSeries, start: int, stop: int) -> bytes:
+        # A columnar body: a slice + one encode
+        return series.window_payload(start, stop, self.five_min_wire_format)
+
+    def monthly_input(self, series: MonthlySeries, start: int, stop: int) -> list:
+        return series.records[start:stop]
+
+    async def predict_5min(self, five_min_input: bytes) -> float | None:
+        response = await self.upstreams.post(
+            "5min", self.five_min_path, content=five_min_input,
+            headers={"content-type": self.five_min_wire_format}
+        )
+        result = response.json()
+        if result.get("predicted_demand_kw"):
+            return result["predicted_demand_kw"][0]
+        return None
+
+    async def predict_monthly(self, monthly_input: list) -> float | None:
+        response = await self.upstreams.post("monthly", self.monthly_path, json=monthly_input)
+        return response.json().get("predicted_total_demand_kw")
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "upstreams": self.upstreams.stats()}
+
+
+class InProcessEngine(PredictionEngine):
+    """
+    Imports main.py and monthly_api.py and calls their forecast functions
+    directly. Their artifacts load in the background on open(); until then
+    predict_*() raise their 503 HTTPException like the services would. The
+    services' relative artifact paths must resolve from the working directory.
+    """
+
+    mode = "inprocess"
+
+    def __init__(self):
+        self.main = None
+        self.monthly_api = None
+
+    def open(self):
+        # Heavy imports (pandas feature pipeline, sklearn, TensorFlow via the loaders)
+        import main
+        import monthly_api
+        self.main, self.monthly_api = main, monthly_api
+        main.startup.run_in_background(main.load_artifacts)
+        monthly_api.startup.run_in_background(monthly_api.load_artifacts)
+
+    def five_min_input(self, series: FiveMinuteSeries, start: int, stop: int):
+        return self.main.raw_frame(series.window_columns(start, stop))
+
+    def monthly_input(self, series: MonthlySeries, start: int, stop: int):
+        return self.monthly_api.monthly_frame(series.window_columns(start, stop))
+
+    async def predict_5min(self, five_min_input) -> float | None:
+        predictions = await self.main.forecast_demand(five_min_input, 1)
+        return predictions[0] if predictions else None
+
+    async def predict_monthly(self, monthly_input) -> float | None:
+        result = await self.monthly_api.monthly_pool.run(self.monthly_api.forecast_from_frame, monthly_input)
+        return result.get("predicted_total_demand_kw")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "5min": self.main.startup.report() if self.main else None,
+            "monthly": self.monthly_api.startup.report() if self.monthly_api else None,
+        }
@@ -0,0 +1,151 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from wire_format import ARROW, NPZ, encode_arrow_table, encode_columns, pa
+
+# --- Pre-serialized simulation datasets ---
+#
+# The simulators used to rebuild every request body row by row with
+# iterrows() + strftime(). These classes keep the datasets as contiguous
+# columns and pre-built records, so building any window is a slice plus one
+# bulk encode. With pyarrow installed the columns are also wrapped (zero-copy)
+# in one Arrow table, and an Arrow body is a slice written to an IPC stream.
+
+# Columns sent to main.py's /predict, as {RawDataPoint field: dataset column}
+FIVE_MIN_API_COLUMNS = {
+    "Power_demand": "Power demand",
+    "temp": "temp",
+    "dwpt": "dwpt",
+    "rhum": "rhum",
+    "wdir": "wdir",
+    "wspd": "wspd",
+    "pres": "pres",
+    "moving_avg_3": "moving_avg_3",
+}
+
+# Columns sent to monthly_api.py's /predict_monthly, as {MonthlyDataPoint field: dataset column}
+MONTHLY_API_COLUMNS = {
+    "Year": "year",
+    "Month": "month",
+    **{name: name for name in [
+        "Total_Demand_kW", "temp", "dwpt", "rhum", "wdir", "wspd", "pres", "Total_Rainfall_mm",
+        "Companies_Newly_Registered", "Land_Net_Area_Sown", "Labour_Force_Participation_All",
+        "Total_Vehicles_Plying",
+    ]},
+}
+
+
+def format_times(datetimes: np.ndarray) -> np.ndarray:
+    """datetime64 values -> 'YYYY-MM-DD HH:MM:SS' strings."""
+    return np.char.replace(np.datetime_as_string(datetimes, unit='s'), 'T', ' ')
+
+
+class FiveMinuteSeries:
+    """
+    The 5-minute dataset as contiguous /predict columns. The arrays are views of
+    the DataFrame's columns (memory-mapped when it comes from dataset_cache.py),
+    so no per-worker copy of the dataset is made; timestamps are formatted and
+    values cast to float32 only for the rows a request actually uses.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.datetimes = df['datetime'].to_numpy()
+        self.columns = {}
+        for api_name, column in FIVE_MIN_API_COLUMNS.items():
+            if column in df.columns:
+                self.columns[api_name] = df[column].to_numpy()
+            else:
+                # Same default as the old row.get('moving_avg_3', 0.0)
+                self.columns[api_name] = np.zeros(len(df))
+
+        self._table = None
+        if pa is not None:
+            # Zero-copy over the NumPy arrays; slices are cast to the wire schema
+            self._table = pa.table({"datetime": self.datetimes, **self.columns})
+            self._wire_schema = pa.schema(
+                [("datetime", pa.timestamp(np.datetime_data(self.datetimes.dtype)[0]))] + [(name, pa.float32()) for name in self.columns]
+            )
+
+        # Every dataset column, for row() without a pandas .iloc per tick
+        self._row_columns = {name: df[name].to_numpy() for name in df.columns}
+
+    def __len__(self):
+        return len(self.datetimes)
+
+    def time(self, index: int) -> str:
+        """Formatted timestamp of one row."""
+        return str(format_times(self.datetimes[index:index + 1])[0])
+
+    def window_columns(self, start: int, stop: int) -> dict:
+        """Rows [start, stop) as {RawDataPoint field: array} (float32 values)."""
+        columns = {"datetime": self.datetimes[start:stop]}
+        columns.update({name: values[start:stop].astype(np.float32) for name, values in self.columns.items()})
+        return columns
+
+    def window_payload(self, start: int, stop: int, content_type: str = NPZ) -> bytes:
+        """Rows [start, stop) encoded as a columnar /predict body."""
+        if content_type == ARROW and self._table is not None:
+            return encode_arrow_table(self._table.slice(start, stop - start).cast(self._wire_schema))
+        return encode_columns(self.window_columns(start, stop), content_type)
+
+    def row(self, index: int) -> dict:
+        """
+        One full dataset row as a JSON-ready dict: formatted datetime, NaN -> None,
+        NumPy scalars -> Python values.
+        """
+        row = {}
+        for name, values in self._row_columns.items():
+            if name == 'datetime':
+                row[name] = self.time(index)
+                continue
+            value = values[index]
+            if isinstance(value, np.generic):
+                value = value.item()
+            row[name] = None if isinstance(value, float) and np.isnan(value) else value
+        return row
+
+    def graph_points(self, start: int, stop: int) -> list:
+        """Rows [start, stop) as GraphDataPoint dicts."""
+        times = format_times(self.datetimes[start:stop]).tolist()
+        values = self.columns["Power_demand"][start:stop].astype(np.float32).tolist()
+        return [{"time": t, "value": v} for t, v in zip(times, values)]
+
+
+class MonthlySeries:
+    """
+    The monthly dataset (indexed by month-end date) as pre-built /predict_monthly
+    records and graph points.
+    """
+
+    def __init__(self, monthly_df: pd.DataFrame):
+        self.dates = monthly_df.index.to_numpy()
+
+        # Same conversion the simulator used to do per tick
+        self.records = json.loads(monthly_df.reset_index(drop=True).to_json(orient='records', default_handler=str))
+        for record in self.records:
+            record['Year'] = int(record['year'])
+            record['Month'] = int(record['month'])
+
+        # /predict_monthly columns, for callers that skip the JSON records (in-process)
+        self.columns = {
+            api_name: monthly_df[column].to_numpy()
+            for api_name, column in MONTHLY_API_COLUMNS.items() if column in monthly_df.columns
+        }
+
+        graph_raw = json.loads(monthly_df[['year', 'month', 'Total_Demand_kW']].reset_index(drop=True).to_json(orient='records'))
+        self.graph = [
+            {"year": int(row['year']), "month": int(row['month']), "value": row['Total_Demand_kW']}
+            for row in graph_raw
+        ]
+
+    def window_columns(self, start: int, stop: int) -> dict:
+        """Months [start, stop) as {MonthlyDataPoint field: array}."""
+        return {name: values[start:stop] for name, values in self.columns.items()}
+
+    def bounds(self, start_date, end_date) -> tuple:
+        """[lo, hi) positions of the months with start_date <= date <= end_date."""
+        lo = int(np.searchsorted(self.dates, np.datetime64(start_date), side='left'))
+        hi = int(np.searchsorted(self.dates, np.datetime64(end_date), side='right'))
+        return lo, max(lo, hi)
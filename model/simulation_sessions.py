@@ -0,0 +1,176 @@
+import os
+import secrets
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- Per-session simulation cursors ---
+#
+# The simulators used to keep one module-global row index that every client
+# advanced (without a lock), so all viewers raced on a single timeline. Here
+# each session owns a small cursor: its own replay range [start, end) and
+# speed (rows per tick), advanced under the cursor's lock. Every cursor
+# indexes the same read-only dataset (FiveMinuteSeries, memory-mapped by
+# dataset_cache.py), so a replay costs a few integers, not a copy of the data.
+# Callers that pass no session id share the 'default' session, which behaves
+# like the old global cursor.
+#
+# Sessions live in the process that created them: with several workers, route
+# a session's requests to one worker (the id is in the query string).
+
+SESSION_IDLE_TTL_SECONDS = float(os.environ.get("SESSION_IDLE_TTL_SECONDS", 1800))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 1000))
+DEFAULT_SESSION_ID = "default"
+
+
+class SessionNotFound(Exception):
+    """Raised for an unknown (or expired) session id."""
+
+
+class SimulationCursor:
+    """
+    A replay over rows [start_index, end_index) of the shared dataset, moving
+    'speed' rows per tick. advance() may be called from any thread or task.
+    """
+
+    def __init__(self, session_id: str, start_index: int, end_index: int, speed: int = 1):
+        self.session_id = session_id
+        self.start_index = start_index
+        self.end_index = end_index
+        self.speed = speed
+        self.index = start_index
+        self.ticks = 0
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self) -> int | None:
+        """Claims the current row and moves past it; None once the replay is over."""
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self.index >= self.end_index:
+                return None
+            index = self.index
+            self.index += self.speed
+            self.ticks += 1
+            return index
+
+    def retry(self, index: int):
+        """Hands a claimed row back (its tick failed), unless the cursor moved on since."""
+        with self._lock:
+            if self.index == index + self.speed:
+                self.index = index
+                self.ticks -= 1
+
+    def has_next(self) -> bool:
+        return self.index < self.end_index
+
+    def describe(self, datetimes: np.ndarray) -> dict:
+        def time_at(i):
+            return str(pd.Timestamp(datetimes[min(i, len(datetimes) - 1)]))
+        return {
+            "session_id": self.session_id,
+            "start": time_at(self.start_index),
+            "end": time_at(self.end_index - 1),
+            "speed": self.speed,
+            "position": time_at(self.index) if self.has_next() else "End of data",
+            "ticks": self.ticks,
+        }
+
+
+class SessionRegistry:
+    """
+    Cursors by session id over one dataset's timestamps. 'min_start' is the
+    first row with enough history for a prediction; 'default_start' is where
+    sessions without a start time begin. Idle sessions expire after
+    'idle_ttl' seconds; past 'max_sessions' the least recently used one is
+    dropped. 'on_drop(session_id)' is called for every removed session.
+    """
+
+    def __init__(self, datetimes: np.ndarray, min_start: int, default_start: int,
+                 idle_ttl: float = SESSION_IDLE_TTL_SECONDS, max_sessions: int = MAX_SESSIONS,
+                 on_drop=None):
+        self.datetimes = datetimes
+        self.min_start = min_start
+        self.default_start = max(min_start, default_start)
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.on_drop = on_drop
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self._sessions[DEFAULT_SESSION_ID] = SimulationCursor(DEFAULT_SESSION_ID, self.default_start, len(datetimes))
+
+    def _index_at(self, when) -> int:
+        """First row at or after 'when'."""
+        return int(np.searchsorted(self.datetimes, np.datetime64(pd.Timestamp(when)), side='left'))
+
+    def create(self, start=None, end=None, speed: int = 1) -> SimulationCursor:
+        """
+        New session replaying from 'start' up to and including 'end' (anything
+        pd.Timestamp accepts; None for the default start / end of data). Raises
+        ValueError for an empty range or a start without enough history.
+        """
+        start_index = self.default_start if start is None else self._index_at(start)
+        end_index = len(self.datetimes) if end is None else int(
+            np.searchsorted(self.datetimes, np.datetime64(pd.Timestamp(end)), side='right'))
+        if start_index < self.min_start:
+            raise ValueError(f"Start must be at or after {pd.Timestamp(self.datetimes[self.min_start])} "
+                             f"(enough history for a prediction).")
+        if start_index >= end_index:
+            raise ValueError("Empty replay range: start is after end or the end of the data.")
+        if speed < 1:
+            raise ValueError("Speed must be at least 1 row per tick.")
+
+        cursor = SimulationCursor(secrets.token_urlsafe(12), start_index, end_index, speed)
+        with self._lock:
+            dropped = self._expire_locked()
+            if len(self._sessions) >= self.max_sessions:
+                oldest = min((c for c in self._sessions.values() if c.session_id != DEFAULT_SESSION_ID),
+                             key=lambda c: c.last_used)
+                dropped.append(self._sessions.pop(oldest.session_id).session_id)
+            self._sessions[cursor.session_id] = cursor
+            self.created += 1
+        self._dropped(dropped)
+        return cursor
+
+    def get(self, session_id: str | None) -> SimulationCursor:
+        """The session's cursor (the default session for None); raises SessionNotFound."""
+        with self._lock:
+            cursor = self._sessions.get(session_id or DEFAULT_SESSION_ID)
+        if cursor is None:
+            raise SessionNotFound(f"Unknown or expired session: {session_id}")
+        return cursor
+
+    def delete(self, session_id: str):
+        if session_id == DEFAULT_SESSION_ID:
+            raise ValueError("The default session cannot be deleted.")
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                raise SessionNotFound(f"Unknown or expired session: {session_id}")
+        self._dropped([session_id])
+
+    def _expire_locked(self) -> list:
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = [sid for sid, c in self._sessions.items() if sid != DEFAULT_SESSION_ID and c.last_used < cutoff]
+        for sid in idle:
+            del self._sessions[sid]
+        self.expired += len(idle)
+        return idle
+
+    def _dropped(self, session_ids: list):
+        if self.on_drop is not None:
+            for sid in session_ids:
+                self.on_drop(sid)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "expired": self.expired,
+            }
@@ -1,11 +1,18 @@
-import pandas as pd
-import numpy as np
 import uvicorn
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any
-import requests # Needed to call the other API
+import asyncio
+import httpx
+import os
 from datetime import datetime
+from dataset_cache import load_csv
+from simulation_data import FiveMinuteSeries
+from wire_format import NPZ
+from upstream_client import CircuitOpenError, Upstream, UpstreamClient
+from simulation_sessions import SessionNotFound, SessionRegistry
+from instrumentation import Instrumentation, add_profiler_routes, metrics_response
 
 # --- 1. Configuration ---
 
@@ -14,8 +21,14 @@ from datetime import datetime
 # Using the file created after adding cyclical features is a good choice.
 DATA_CSV_PATH = "delhi_demand_final_cyclical.csv" 
 
-# URL of your *running* 5-minute prediction API (main.py)
-PREDICTION_API_URL = "http://127.0.0.1:8000/predict?steps=1" 
+# Your *running* 5-minute prediction API (main.py), called through upstream_client.py
+PREDICTION_API_BASE = os.environ.get("PREDICTION_5MIN_API_BASE", "http://127.0.0.1:8000")
+PREDICTION_API_PATH = "/predict?steps=1"
+PREDICTION_API_TIMEOUT_SECONDS = 10
+PREDICTION_API_MAX_CONCURRENCY = 16
+
+# Body format for the prediction API (columnar, see wire_format.py)
+PREDICTION_API_WIRE_FORMAT = NPZ
 
 # How many rows of history the prediction API needs
 REQUIRED_HISTORY_ROWS = 2304 # 7 days + 24 hours
@@ -26,31 +39,48 @@ app = FastAPI(
     description="Simulates live data and calls the prediction API."
 )
 
+# Request counters and /metrics (see instrumentation.py)
+instrumentation = Instrumentation("simulator")
+app.middleware("http")(instrumentation.http_middleware)
+
 # --- 3. Load Data & Initialize State ---
 GLOBAL_DATA_DF = None
-current_data_index = -1
+FIVE_MIN_SERIES = None # Pre-serialized view of GLOBAL_DATA_DF, built once at startup
+# Per-session cursors over FIVE_MIN_SERIES (see simulation_sessions.py)
+sessions = None
+
+# Keep-alive connection pool to the prediction API, shared by every tick
+upstreams = UpstreamClient([
+    Upstream("5min", PREDICTION_API_BASE, PREDICTION_API_TIMEOUT_SECONDS, PREDICTION_API_MAX_CONCURRENCY),
+])
+
+@app.on_event("startup")
+async def open_http_client():
+    upstreams.open()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await upstreams.aclose()
 
 @app.on_event("startup")
 async def load_data():
-    global GLOBAL_DATA_DF, current_data_index
+    global GLOBAL_DATA_DF, FIVE_MIN_SERIES, sessions
     try:
         print(f"Loading simulation data from: {DATA_CSV_PATH}")
-        # Load the *entire* dataset into memory
-        GLOBAL_DATA_DF = pd.read_csv(DATA_CSV_PATH)
-        # Ensure datetime is usable if needed, though we primarily use index
-        GLOBAL_DATA_DF['datetime'] = pd.to_datetime(GLOBAL_DATA_DF['datetime']) 
+        # Memory-mapped from the columnar cache (built from the CSV on first run),
+        # so workers share one copy of the dataset
+        GLOBAL_DATA_DF = load_csv(DATA_CSV_PATH, datetime_columns=['datetime'])
+        FIVE_MIN_SERIES = FiveMinuteSeries(GLOBAL_DATA_DF)
         
         # Start simulation near the end (e.g., 100 steps from the end)
         # Ensure we start *after* the initial rows needed for lags
         start_offset = 100 
-        initial_index = len(GLOBAL_DATA_DF) - start_offset
-        if initial_index < REQUIRED_HISTORY_ROWS:
-             initial_index = REQUIRED_HISTORY_ROWS # Start as early as possible if dataset is small
-        
-        current_data_index = initial_index
+        sessions = SessionRegistry(
+            FIVE_MIN_SERIES.datetimes, REQUIRED_HISTORY_ROWS, len(GLOBAL_DATA_DF) - start_offset
+        )
         
         print(f"Data loaded. Total rows: {len(GLOBAL_DATA_DF)}")
-        print(f"Simulation starting at index: {current_data_index}")
+        print(f"Simulation starting at index: {sessions.default_start}")
         print("\n--- Simulator API Ready ---")
         
     except FileNotFoundError:
@@ -62,6 +92,11 @@ async def load_data():
 
 # --- 4. Define Output Schema ---
 
+class SessionRequest(BaseModel):
+    start: str | None = None # e.g. "2024-06-01 00:00:00"; default: 100 steps from the end
+    end: str | None = None # last row replayed; default: end of data
+    speed: int = Field(1, ge=1) # rows advanced per update
+
 class LiveUpdateResponse(BaseModel):
     current_data: Dict[str, Any] # The "current" row from the CSV
     predicted_next_5_min_demand_kw: float
@@ -69,68 +104,52 @@ class LiveUpdateResponse(BaseModel):
 
 # --- 5. The Simulation Endpoint ---
 
-@app.get("/get_live_update", response_model=LiveUpdateResponse)
-async def get_live_update():
-    global current_data_index
-    
+def get_session(session_id: str | None):
+    """The session's cursor; 500 while the data isn't loaded, 404 for an unknown session."""
     if GLOBAL_DATA_DF is None:
         raise HTTPException(status_code=500, detail="Simulation data not loaded.")
-        
-    # Check if we've run out of data
-    if current_data_index >= len(GLOBAL_DATA_DF):
+    try:
+        return sessions.get(session_id)
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/get_live_update", response_model=LiveUpdateResponse)
+async def get_live_update(session_id: str | None = None):
+    cursor = get_session(session_id)
+
+    # Claim this update's row under the cursor's lock; it is handed back below
+    # if the prediction fails, so the next call retries it
+    current_data_index = cursor.advance()
+    if current_data_index is None:
          raise HTTPException(status_code=404, detail="End of simulation data reached.")
 
-    # 1. Get the "current" row data
-    # Convert to dict; handle potential NaN JSON issues
-    current_row = GLOBAL_DATA_DF.iloc[current_data_index].replace({np.nan: None}).to_dict()
-    # Convert Timestamp to string for JSON compatibility
-    if isinstance(current_row.get('datetime'), pd.Timestamp):
-         current_row['datetime'] = current_row['datetime'].strftime('%Y-%m-%d %H:%M:%S')
+    # 1. Get the "current" row data, JSON-ready (formatted datetime, NaN -> None)
+    current_row = FIVE_MIN_SERIES.row(current_data_index)
 
     # 2. Get the required history for the prediction API
     history_start_index = max(0, current_data_index - REQUIRED_HISTORY_ROWS + 1)
     history_end_index = current_data_index + 1 # Include the current row
     
     if history_end_index - history_start_index < REQUIRED_HISTORY_ROWS:
+         cursor.retry(current_data_index)
          raise HTTPException(
              status_code=400, 
              detail=f"Not enough historical data available at index {current_data_index} "
                     f"to make prediction. Need {REQUIRED_HISTORY_ROWS} rows."
          )
          
-    history_df = GLOBAL_DATA_DF.iloc[history_start_index:history_end_index]
-
-    # 3. Format history for the prediction API (List of Dicts)
-    # The prediction API expects specific keys (RawDataPoint model)
-    # Ensure column names match what main.py expects ('Power_demand' vs 'Power demand')
-    # Use only the columns required by the RawDataPoint model in main.py
-    required_cols = ["datetime", "Power demand", "temp", "dwpt", "rhum", 
-                     "wdir", "wspd", "pres", "moving_avg_3"] 
-    
-    # Rename 'Power demand' to 'Power_demand' if needed by main.py's Pydantic model
-    # Adjust this based on your main.py RawDataPoint definition
-    history_df_renamed = history_df.rename(columns={"Power demand": "Power_demand"})
-
-    api_input_list = []
-    for _, row in history_df_renamed.iterrows():
-        point = {
-            "datetime": row['datetime'].strftime('%Y-%m-%d %H:%M:%S'),
-            "Power_demand": row['Power_demand'], 
-            "temp": row['temp'],
-            "dwpt": row['dwpt'],
-            "rhum": row['rhum'],
-            "wdir": row['wdir'],
-            "wspd": row['wspd'],
-            "pres": row['pres'],
-            "moving_avg_3": row.get('moving_avg_3', 0.0) # Use get() in case column is missing
-        }
-        api_input_list.append(point)
+    # 3. Format history for the prediction API: the same columns as main.py's
+    # RawDataPoint, sliced from the pre-serialized series and encoded in one go
+    api_input = FIVE_MIN_SERIES.window_payload(history_start_index, history_end_index, PREDICTION_API_WIRE_FORMAT)
 
     # 4. Call the prediction API
     predicted_demand = None
     try:
-        response = requests.post(PREDICTION_API_URL, json=api_input_list, timeout=10) # 10 sec timeout
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+        # Raises for bad status codes (4xx or 5xx), or right away while the API keeps failing
+        response = await upstreams.post(
+            "5min", PREDICTION_API_PATH, content=api_input,
+            headers={"content-type": PREDICTION_API_WIRE_FORMAT}
+        )
         prediction_result = response.json()
         
         # Get the first prediction from the list
@@ -139,21 +158,27 @@ async def get_live_update():
         else:
             print("Prediction API response missing 'predicted_demand_kw'")
             
-    except requests.exceptions.RequestException as e:
+    except asyncio.CancelledError:
+        # The client went away mid-call: don't skip its row
+        cursor.retry(current_data_index)
+        raise
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        cursor.retry(current_data_index)
         print(f"Error calling prediction API: {e}")
         # Optionally, raise an HTTPException or return a default/error value
         raise HTTPException(status_code=503, detail=f"Prediction API call failed: {e}")
     except Exception as e:
+        cursor.retry(current_data_index)
         print(f"Error processing prediction response: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing prediction: {e}")
 
-    # 5. Increment the index for the next call
-    current_data_index += 1
+    # 5. The session's next row (the cursor already moved past this one)
+    next_data_index = current_data_index + cursor.speed
     
     # Get the timestamp for the *next* step (for display)
     next_datetime_str = "End of data"
-    if current_data_index < len(GLOBAL_DATA_DF):
-         next_datetime_str = GLOBAL_DATA_DF.iloc[current_data_index]['datetime'].strftime('%Y-%m-%d %H:%M:%S')
+    if next_data_index < cursor.end_index:
+         next_datetime_str = FIVE_MIN_SERIES.time(next_data_index)
 
 
     return {
@@ -162,6 +187,56 @@ async def get_live_update():
         "next_simulated_datetime": next_datetime_str
     }
 
+@app.post("/sessions")
+def create_session(request: SessionRequest):
+    """
+    Starts a replay with its own start time, end and speed; pass the returned
+    session_id to /get_live_update.
+    """
+    get_session(None)
+    try:
+        cursor = sessions.create(request.start, request.end, request.speed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cursor.describe(FIVE_MIN_SERIES.datetimes)
+
+@app.get("/sessions/{session_id}")
+def get_session_info(session_id: str):
+    return get_session(session_id).describe(FIVE_MIN_SERIES.datetimes)
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    get_session(session_id)
+    try:
+        sessions.delete(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"deleted": session_id}
+
+@app.get("/upstream_stats")
+def upstream_stats():
+    """
+    Prediction API calls: in flight, failures, mean latency and circuit breaker state.
+    """
+    return upstreams.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: request counters, prediction API latency and the
+    upstream / session stats as gauges.
+    """
+    return metrics_response()
+
+# /debug/profiler, only with ENABLE_DEBUG_PROFILER=1 (see instrumentation.py)
+add_profiler_routes(app)
+
+# The existing stats, exported as gauges at /metrics too
+instrumentation.collect("upstream", upstreams.stats)
+instrumentation.collect("sessions", lambda: sessions.stats() if sessions else {})
+
 # --- 6. (Optional) Root Endpoint ---
 @app.get("/")
 def read_root():
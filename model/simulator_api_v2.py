@@ -1,25 +1,46 @@
 import pandas as pd
 import numpy as np
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
-import requests
+import asyncio
+import os
 from datetime import datetime
 import json # For handling numpy types in JSON
 # --- 1. Configuration ---
 # ... (existing imports)
 from fastapi.middleware.cors import CORSMiddleware # <--- ADD THIS LINE
 # ... (rest of your imports)
+from worker_pools import BoundedPool, pool_size_from_env
+from dataset_cache import load_csv
+from simulation_data import FiveMinuteSeries, MonthlySeries
+from wire_format import PREFERRED_COLUMNAR
+from upstream_client import Upstream, UpstreamClient
+from prediction_engines import PREDICTION_MODE, HttpEngine, InProcessEngine
+from live_stream import EndOfStream, LiveBroadcaster
+from simulation_sessions import SessionNotFound, SessionRegistry
+from instrumentation import Instrumentation, add_profiler_routes, metrics_response
+from functools import lru_cache, partial
 
 # --- 1. Configuration ---
 # Data Paths
 DATA_5MIN_CSV_PATH = "delhi_demand_final_cyclical.csv"
 DATA_MONTHLY_CSV_PATH = "delhi_monthly_features_v3.csv"
 
-# API URLs
-PREDICTION_5MIN_API_URL = "http://127.0.0.1:8000/predict?steps=1"
-PREDICTION_MONTHLY_API_URL = "http://127.0.0.1:8001/predict_monthly"
+# Prediction APIs (see upstream_client.py): base URL, timeout and concurrency limit each
+PREDICTION_5MIN_API_BASE = os.environ.get("PREDICTION_5MIN_API_BASE", "http://127.0.0.1:8000")
+PREDICTION_MONTHLY_API_BASE = os.environ.get("PREDICTION_MONTHLY_API_BASE", "http://127.0.0.1:8001")
+PREDICTION_5MIN_PATH = "/predict?steps=1"
+PREDICTION_MONTHLY_PATH = "/predict_monthly"
+PREDICTION_5MIN_TIMEOUT_SECONDS = 10
+PREDICTION_MONTHLY_TIMEOUT_SECONDS = 5
+PREDICTION_5MIN_MAX_CONCURRENCY = 16
+PREDICTION_MONTHLY_MAX_CONCURRENCY = 8
+
+# Body format for the 5-min API (columnar, see wire_format.py)
+PREDICTION_5MIN_WIRE_FORMAT = PREFERRED_COLUMNAR
 
 # History Requirements
 REQUIRED_5MIN_HISTORY_ROWS = 2304 # 7 days + 24 hours
@@ -41,48 +62,78 @@ app.add_middleware(
 )
 # ------------------------------------
 
+# Request counters, tick stages and /metrics (see instrumentation.py)
+instrumentation = Instrumentation("simulator-v2")
+app.middleware("http")(instrumentation.http_middleware)
+
 # --- 3. Load Data & Initialize State ---
 GLOBAL_DATA_5MIN_DF = None
 GLOBAL_DATA_MONTHLY_DF = None
-current_data_index_5min = -1
+# Pre-serialized views of the two datasets, built once at startup
+FIVE_MIN_SERIES = None
+MONTHLY_SERIES = None
+# Per-session cursors over FIVE_MIN_SERIES (see simulation_sessions.py)
+sessions = None
+
+# DataFrame slicing / payload building runs here instead of on the event loop
+data_pool = BoundedPool("data", pool_size_from_env("data", 4))
+# The two predictors, in this process (PREDICTION_MODE=inprocess) or over HTTP
+# through one keep-alive pool shared by every tick (see prediction_engines.py)
+if PREDICTION_MODE == "inprocess":
+    engine = InProcessEngine()
+else:
+    engine = HttpEngine(
+        UpstreamClient([
+            Upstream("5min", PREDICTION_5MIN_API_BASE, PREDICTION_5MIN_TIMEOUT_SECONDS,
+                     PREDICTION_5MIN_MAX_CONCURRENCY),
+            Upstream("monthly", PREDICTION_MONTHLY_API_BASE, PREDICTION_MONTHLY_TIMEOUT_SECONDS,
+                     PREDICTION_MONTHLY_MAX_CONCURRENCY),
+        ]),
+        PREDICTION_5MIN_PATH, PREDICTION_MONTHLY_PATH, PREDICTION_5MIN_WIRE_FORMAT
+    )
+
+@app.on_event("startup")
+async def open_engine():
+    engine.open()
 
-# Helper function to handle potential numpy types during JSON conversion
-def default_serializer(obj):
-    if isinstance(obj, (np.integer, np.floating, np.bool_)):
-        return obj.item()
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif pd.isna(obj):
-        return None # Convert Pandas NaT/NaN to None
-    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+@app.on_event("shutdown")
+async def close_engine():
+    await engine.close()
+    data_pool.shutdown()
 
 
 @app.on_event("startup")
 async def load_all_data():
-    global GLOBAL_DATA_5MIN_DF, GLOBAL_DATA_MONTHLY_DF, current_data_index_5min
+    global GLOBAL_DATA_5MIN_DF, GLOBAL_DATA_MONTHLY_DF
+    global FIVE_MIN_SERIES, MONTHLY_SERIES, sessions
     try:
         # Load 5-minute data
         print(f"Loading 5-minute data from: {DATA_5MIN_CSV_PATH}")
-        GLOBAL_DATA_5MIN_DF = pd.read_csv(DATA_5MIN_CSV_PATH)
-        GLOBAL_DATA_5MIN_DF['datetime'] = pd.to_datetime(GLOBAL_DATA_5MIN_DF['datetime'])
+        # Memory-mapped from the columnar cache (see dataset_cache.py), shared by all workers
+        GLOBAL_DATA_5MIN_DF = load_csv(DATA_5MIN_CSV_PATH, datetime_columns=['datetime'])
         print(f"  5-min data loaded. Total rows: {len(GLOBAL_DATA_5MIN_DF)}")
 
         # Load monthly data
         print(f"Loading monthly data from: {DATA_MONTHLY_CSV_PATH}")
-        GLOBAL_DATA_MONTHLY_DF = pd.read_csv(DATA_MONTHLY_CSV_PATH)
+        GLOBAL_DATA_MONTHLY_DF = load_csv(DATA_MONTHLY_CSV_PATH)
         # Create a proper date index for easier lookup
         GLOBAL_DATA_MONTHLY_DF['date'] = pd.to_datetime(GLOBAL_DATA_MONTHLY_DF[['year', 'month']].assign(day=1)) + pd.offsets.MonthEnd(0)
-        GLOBAL_DATA_MONTHLY_DF = GLOBAL_DATA_MONTHLY_DF.set_index('date')
+        GLOBAL_DATA_MONTHLY_DF = GLOBAL_DATA_MONTHLY_DF.set_index('date').sort_index()
         print(f"  Monthly data loaded. Total rows: {len(GLOBAL_DATA_MONTHLY_DF)}")
 
-        # Initialize 5-minute index
+        # Column views / pre-built monthly records, set up once, not per tick
+        FIVE_MIN_SERIES = FiveMinuteSeries(GLOBAL_DATA_5MIN_DF)
+        MONTHLY_SERIES = MonthlySeries(GLOBAL_DATA_MONTHLY_DF)
+
+        # Sessions start 100 steps from the end by default, never before the
+        # rows needed for the 5-min history
         start_offset = 100
-        initial_index = len(GLOBAL_DATA_5MIN_DF) - start_offset
-        if initial_index < REQUIRED_5MIN_HISTORY_ROWS:
-             initial_index = REQUIRED_5MIN_HISTORY_ROWS
-        current_data_index_5min = initial_index
+        sessions = SessionRegistry(
+            FIVE_MIN_SERIES.datetimes, REQUIRED_5MIN_HISTORY_ROWS, len(GLOBAL_DATA_5MIN_DF) - start_offset,
+            on_drop=drop_live_stream
+        )
 
-        print(f"Simulation starting at 5-min index: {current_data_index_5min}")
+        print(f"Simulation starting at 5-min index: {sessions.default_start}")
         print("\n--- Simulator API v2 Ready ---")
 
     except FileNotFoundError as e:
@@ -103,6 +154,11 @@ class MonthlyGraphDataPoint(BaseModel):
     month: int
     value: float | None
 
+class SessionRequest(BaseModel):
+    start: str | None = None # e.g. "2024-06-01 00:00:00"; default: 100 steps from the end
+    end: str | None = None # last row replayed; default: end of data
+    speed: int = Field(1, ge=1) # 5-min rows advanced per tick
+
 class LiveUpdateResponseV2(BaseModel):
     current_data_5min: Dict[str, Any]
     predicted_next_5_min_demand_kw: float | None # Allow None if prediction fails
@@ -113,55 +169,15 @@ class LiveUpdateResponseV2(BaseModel):
 
 # --- 5. The Simulation Endpoint ---
 
-@app.get("/get_live_update_v2", response_model=LiveUpdateResponseV2)
-async def get_live_update_v2():
-    global current_data_index_5min
-
-    if GLOBAL_DATA_5MIN_DF is None or GLOBAL_DATA_MONTHLY_DF is None:
-        raise HTTPException(status_code=500, detail="Simulation data not loaded.")
-
-    if current_data_index_5min >= len(GLOBAL_DATA_5MIN_DF):
-         raise HTTPException(status_code=404, detail="End of 5-min simulation data reached.")
-
-    # --- Part 1: 5-Minute Simulation & Prediction ---
-    current_row_5min_series = GLOBAL_DATA_5MIN_DF.iloc[current_data_index_5min]
-    current_row_5min = current_row_5min_series.replace({np.nan: None}).to_dict()
-    current_dt = current_row_5min_series['datetime'] # Get Timestamp object
-    if isinstance(current_dt, pd.Timestamp):
-         current_row_5min['datetime'] = current_dt.strftime('%Y-%m-%d %H:%M:%S')
-
-    # Get history for 5-min prediction
-    hist_5min_start = max(0, current_data_index_5min - REQUIRED_5MIN_HISTORY_ROWS + 1)
-    hist_5min_end = current_data_index_5min + 1
-    history_df_5min = GLOBAL_DATA_5MIN_DF.iloc[hist_5min_start:hist_5min_end]
-
-    # Format for 5-min API
-    history_df_renamed = history_df_5min.rename(columns={"Power demand": "Power_demand"})
-    api_input_5min = []
-    for _, row in history_df_5min.iterrows():
-        point = { # Match RawDataPoint from main.py
-            "datetime": row['datetime'].strftime('%Y-%m-%d %H:%M:%S'),
-            "Power_demand": row['Power demand'], "temp": row['temp'], "dwpt": row['dwpt'],
-            "rhum": row['rhum'], "wdir": row['wdir'], "wspd": row['wspd'],
-            "pres": row['pres'], "moving_avg_3": row.get('moving_avg_3', 0.0)
-        }
-        api_input_5min.append(point)
-
-    # Call 5-min Prediction API
-    predicted_5min = None
-    try:
-        response_5min = requests.post(PREDICTION_5MIN_API_URL, json=api_input_5min, timeout=10)
-        response_5min.raise_for_status()
-        result_5min = response_5min.json()
-        if result_5min.get("predicted_demand_kw"):
-            predicted_5min = result_5min["predicted_demand_kw"][0]
-    except Exception as e:
-        print(f"Warning: 5-min prediction API call failed: {e}")
-        # Continue without raising error, return None for prediction
-
-    # --- Part 2: Monthly Prediction ---
+@lru_cache(maxsize=None)
+def monthly_bounds(current_month: np.datetime64) -> tuple:
+    """
+    Positions of the monthly rows used while the simulation is in 'current_month':
+    (history start, history end, graph start, graph end). Cached, since they only
+    change once a month.
+    """
     # Find the end of the "current" month based on the 5-min index
-    current_month_end_dt = current_dt.to_period('M').end_time
+    current_month_end_dt = pd.Timestamp(current_month).to_period('M').end_time
 
     # Get history for monthly prediction (last 15 months ending *before* current month)
     # We need the data ending in the *previous* month to predict the *current* month if needed,
@@ -169,84 +185,320 @@ async def get_live_update_v2():
     # Let's predict the month *after* the current simulation month.
     hist_monthly_end_date = current_month_end_dt
     hist_monthly_start_date = hist_monthly_end_date - pd.DateOffset(months=REQUIRED_MONTHLY_HISTORY_ROWS - 1)
+    hist_lo, hist_hi = MONTHLY_SERIES.bounds(hist_monthly_start_date, hist_monthly_end_date)
 
-    # Slice the monthly dataframe using dates
-    history_df_monthly = GLOBAL_DATA_MONTHLY_DF[
-        (GLOBAL_DATA_MONTHLY_DF.index >= hist_monthly_start_date) &
-        (GLOBAL_DATA_MONTHLY_DF.index <= hist_monthly_end_date)
-    ].reset_index(drop=True) # Reset index for JSON conversion
-
-    predicted_monthly = None
-    if len(history_df_monthly) >= 12: # Need at least 12 for lags
-        # Format for monthly API (match MonthlyDataPoint)
-        # Convert df to list of dicts, handle numpy types
-        api_input_monthly = json.loads(history_df_monthly.to_json(orient='records', default_handler=str)) # Use string handler for dates/timestamps initially
-        
-        # Manually ensure types match Pydantic model if needed (e.g., Year/Month as int)
-        for record in api_input_monthly:
-            record['Year'] = int(record['year'])
-            record['Month'] = int(record['month'])
-            # Ensure other numeric types are floats/ints as expected by MonthlyDataPoint
-
-
-        try:
-            response_monthly = requests.post(PREDICTION_MONTHLY_API_URL, json=api_input_monthly, timeout=10)
-            response_monthly.raise_for_status()
-            result_monthly = response_monthly.json()
-            predicted_monthly = result_monthly.get("predicted_total_demand_kw")
-        except Exception as e:
-            print(f"Warning: Monthly prediction API call failed: {e}")
-            # Continue, return None for prediction
+    # Past 12 months for the graph
+    graph_monthly_end_date = current_month_end_dt
+    graph_monthly_start_date = graph_monthly_end_date - pd.DateOffset(months=11) # Go back 11 months to get 12 total
+    graph_lo, graph_hi = MONTHLY_SERIES.bounds(graph_monthly_start_date, graph_monthly_end_date)
+
+    return hist_lo, hist_hi, graph_lo, graph_hi
+
+@instrumentation.timed("prepare_tick")
+def prepare_tick(index_5min: int, next_index_5min: int | None) -> dict:
+    """
+    Blocking part of a tick: slices the pre-serialized datasets and builds both
+    prediction API payloads plus the graph data. Runs in the data pool.
+    'next_index_5min' is the session's next row (None at the end of its replay).
+    """
+    # --- Part 1: 5-Minute Simulation ---
+    current_row_5min = FIVE_MIN_SERIES.row(index_5min)
+
+    # Get history for 5-min prediction (a columnar body, or the raw columns in-process)
+    hist_5min_start = max(0, index_5min - REQUIRED_5MIN_HISTORY_ROWS + 1)
+    hist_5min_end = index_5min + 1
+    api_input_5min = engine.five_min_input(FIVE_MIN_SERIES, hist_5min_start, hist_5min_end)
+
+    # --- Part 2: Monthly History ---
+    # Month of the "current" 5-min row; the monthly slices only change once a month
+    current_month = FIVE_MIN_SERIES.datetimes[index_5min].astype('datetime64[M]')
+    hist_lo, hist_hi, graph_lo, graph_hi = monthly_bounds(current_month)
+
+    api_input_monthly = None
+    if hist_hi - hist_lo >= 12: # Need at least 12 for lags
+        api_input_monthly = engine.monthly_input(MONTHLY_SERIES, hist_lo, hist_hi)
     else:
-        print(f"Warning: Not enough monthly history ({len(history_df_monthly)} months) to call monthly API.")
-
+        print(f"Warning: Not enough monthly history ({hist_hi - hist_lo} months) to call monthly API.")
 
     # --- Part 3: Prepare Graph Data ---
     # Past 24 hours (288 steps) of 5-min data
-    graph_5min_start = max(0, current_data_index_5min - 288 + 1)
-    graph_5min_end = current_data_index_5min + 1
-    past_24h_df = GLOBAL_DATA_5MIN_DF.iloc[graph_5min_start:graph_5min_end][['datetime', 'Power demand']]
-    past_24h_data = [
-        {"time": row['datetime'].strftime('%Y-%m-%d %H:%M:%S'), "value": row['Power demand']}
-        for _, row in past_24h_df.iterrows()
-    ]
+    graph_5min_start = max(0, index_5min - 288 + 1)
+    graph_5min_end = index_5min + 1
+    past_24h_data = FIVE_MIN_SERIES.graph_points(graph_5min_start, graph_5min_end)
 
     # Past 12 months of monthly data
-    graph_monthly_end_date = current_month_end_dt
-    graph_monthly_start_date = graph_monthly_end_date - pd.DateOffset(months=11) # Go back 11 months to get 12 total
-    past_12m_df = GLOBAL_DATA_MONTHLY_DF[
-         (GLOBAL_DATA_MONTHLY_DF.index >= graph_monthly_start_date) &
-         (GLOBAL_DATA_MONTHLY_DF.index <= graph_monthly_end_date)
-    ][['year', 'month', 'Total_Demand_kW']].reset_index(drop=True)
-
-    # Convert df to list of dicts, handling potential NaNs
-    past_12m_data_raw = json.loads(past_12m_df.to_json(orient='records'))
-    # Clean up structure for MonthlyGraphDataPoint
-    past_12m_data = [
-        {"year": int(row['year']), "month": int(row['month']), "value": row['Total_Demand_kW']}
-        for row in past_12m_data_raw
-    ]
-
-
-    # --- Part 4: Increment Index and Return ---
-    current_data_index_5min += 1
+    past_12m_data = MONTHLY_SERIES.graph[graph_lo:graph_hi]
+
+    # Timestamp of the *next* step (for display)
     next_datetime_str_5min = "End of data"
-    if current_data_index_5min < len(GLOBAL_DATA_5MIN_DF):
-         next_datetime_str_5min = GLOBAL_DATA_5MIN_DF.iloc[current_data_index_5min]['datetime'].strftime('%Y-%m-%d %H:%M:%S')
+    if next_index_5min is not None:
+         next_datetime_str_5min = FIVE_MIN_SERIES.time(next_index_5min)
+
+    return {
+        "api_input_5min": api_input_5min,
+        "api_input_monthly": api_input_monthly,
+        "current_data_5min": current_row_5min,
+        "next_simulated_datetime_5min": next_datetime_str_5min,
+        "past_24_hours_demand": past_24h_data,
+        "past_12_months_demand": past_12m_data
+    }
 
-    # Use default_serializer to handle potential numpy types in current_row_5min
-    serializable_current_row = json.loads(json.dumps(current_row_5min, default=default_serializer))
+async def predict_5min(api_input) -> float | None:
+    """Next 5-min demand from the 5-min predictor, or None if the call fails."""
+    try:
+        return await engine.predict_5min(api_input)
+    except Exception as e:
+        print(f"Warning: 5-min prediction API call failed: {e}")
+        # Continue without raising error, return None for prediction
+    return None
 
+async def predict_monthly(api_input) -> float | None:
+    """Next month's demand from the monthly predictor, or None if skipped or the call fails."""
+    if api_input is None:
+        return None
+    try:
+        return await engine.predict_monthly(api_input)
+    except Exception as e:
+        print(f"Warning: Monthly prediction API call failed: {e}")
+        # Continue, return None for prediction
+    return None
+
+def get_session(session_id: str | None):
+    """The session's cursor; 500 while the data isn't loaded, 404 for an unknown session."""
+    if GLOBAL_DATA_5MIN_DF is None or GLOBAL_DATA_MONTHLY_DF is None:
+        raise HTTPException(status_code=500, detail="Simulation data not loaded.")
+    try:
+        return sessions.get(session_id)
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+async def advance_tick(session_id: str | None = None) -> dict:
+    """
+    Advances a session (the default one for None) by one tick and returns the
+    full update. Raises EndOfStream once its replay range is exhausted.
+    """
+    cursor = get_session(session_id)
+
+    # Claim this tick's row under the cursor's lock before awaiting anything,
+    # so concurrent callers on the same session don't read the same index
+    index_5min = cursor.advance()
+    if index_5min is None:
+         raise EndOfStream("End of 5-min simulation data reached.")
+
+    next_index_5min = index_5min + cursor.speed
+    if next_index_5min >= cursor.end_index:
+        next_index_5min = None
+
+    try:
+        tick = await data_pool.run(prepare_tick, index_5min, next_index_5min)
+
+        # Both prediction APIs are called concurrently, so the tick takes as long as
+        # the slower of the two rather than their sum
+        with instrumentation.stage("predict"):
+            predicted_5min, predicted_monthly = await asyncio.gather(
+                predict_5min(tick["api_input_5min"]), predict_monthly(tick["api_input_monthly"])
+            )
+    except (asyncio.CancelledError, Exception):
+        # Nobody got this row (the poller disconnected, the stream's last viewer
+        # left mid-tick, or the tick failed): hand it back so it isn't skipped
+        cursor.retry(index_5min)
+        raise
 
     return {
-        "current_data_5min": serializable_current_row,
+        "current_data_5min": tick["current_data_5min"],
         "predicted_next_5_min_demand_kw": predicted_5min,
         "predicted_next_month_demand_kw": predicted_monthly,
-        "next_simulated_datetime_5min": next_datetime_str_5min,
-        "past_24_hours_demand": past_24h_data,
-        "past_12_months_demand": past_12m_data
+        "next_simulated_datetime_5min": tick["next_simulated_datetime_5min"],
+        "past_24_hours_demand": tick["past_24_hours_demand"],
+        "past_12_months_demand": tick["past_12_months_demand"]
     }
 
+@app.get("/get_live_update_v2", response_model=LiveUpdateResponseV2)
+async def get_live_update_v2(session_id: str | None = None):
+    """
+    Polling variant: every call advances the session. Prefer the streams
+    below, which advance it once per tick for all its viewers.
+    """
+    try:
+        return await advance_tick(session_id)
+    except EndOfStream as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# --- 6. Live Update Streams ---
+
+def live_delta(previous: dict, update: dict) -> dict:
+    """
+    What a subscriber holding 'previous' needs to reach 'update': the new row and
+    predictions, the 5-min points newer than its last one (normally exactly one;
+    more if a poller advanced the simulation in between) and the monthly graph
+    only when it changed.
+    """
+    last_time = previous["past_24_hours_demand"][-1]["time"] if previous["past_24_hours_demand"] else ""
+    delta = {
+        "current_data_5min": update["current_data_5min"],
+        "predicted_next_5_min_demand_kw": update["predicted_next_5_min_demand_kw"],
+        "predicted_next_month_demand_kw": update["predicted_next_month_demand_kw"],
+        "next_simulated_datetime_5min": update["next_simulated_datetime_5min"],
+        # "YYYY-MM-DD HH:MM:SS" strings order like the timestamps
+        "new_points_5min": [p for p in update["past_24_hours_demand"] if p["time"] > last_time],
+    }
+    if update["past_12_months_demand"] != previous["past_12_months_demand"]:
+        delta["past_12_months_demand"] = update["past_12_months_demand"]
+    return delta
+
+# One broadcaster (and ticker) per session that has viewers
+live_streams = {}
+
+async def session_tick(session_id: str) -> dict:
+    try:
+        return await advance_tick(session_id)
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+        # Session deleted or expired under its viewers
+        raise EndOfStream(e.detail)
+
+def live_stream_for(session_id: str | None) -> LiveBroadcaster:
+    cursor = get_session(session_id)
+    broadcaster = live_streams.get(cursor.session_id)
+    if broadcaster is None:
+        broadcaster = LiveBroadcaster(partial(session_tick, cursor.session_id), live_delta)
+        live_streams[cursor.session_id] = broadcaster
+    return broadcaster
+
+def drop_live_stream(session_id: str):
+    # Subscribers still attached get 'end' on the ticker's next tick
+    live_streams.pop(session_id, None)
+
+@app.get("/stream_live_updates")
+async def stream_live_updates(request: Request, session_id: str | None = None):
+    """
+    Server-Sent Events: a 'snapshot' event (the full LiveUpdateResponseV2), then a
+    'delta' event per tick (see live_delta); 'end' when the session's data runs out.
+    """
+    live_updates = live_stream_for(session_id)
+    subscriber = live_updates.subscribe()
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+                if message["type"] == "end":
+                    return
+        finally:
+            live_updates.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/live_updates")
+async def ws_live_updates(websocket: WebSocket, session_id: str | None = None):
+    """
+    WebSocket variant of /stream_live_updates: the same messages as JSON text frames.
+    """
+    try:
+        live_updates = live_stream_for(session_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await websocket.accept()
+    subscriber = live_updates.subscribe()
+    try:
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_json(message)
+            if message["type"] == "end":
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_updates.unsubscribe(subscriber)
+
+@app.get("/stream_stats")
+def stream_stats():
+    """
+    Live update streams by session: subscribers, ticks computed, messages sent, resyncs.
+    """
+    return {session_id: broadcaster.stats() for session_id, broadcaster in live_streams.items()}
+
+# --- 7. Sessions ---
+
+@app.post("/sessions")
+def create_session(request: SessionRequest):
+    """
+    Starts a replay with its own start time, end and speed. Pass the returned
+    session_id to /get_live_update_v2, /stream_live_updates or /ws/live_updates.
+    """
+    get_session(None)
+    try:
+        cursor = sessions.create(request.start, request.end, request.speed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cursor.describe(FIVE_MIN_SERIES.datetimes)
+
+@app.get("/sessions/{session_id}")
+def get_session_info(session_id: str):
+    return get_session(session_id).describe(FIVE_MIN_SERIES.datetimes)
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    get_session(session_id)
+    try:
+        sessions.delete(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"deleted": session_id}
+
+@app.get("/session_stats")
+def session_stats():
+    """
+    Session count, limits, created and expired sessions.
+    """
+    get_session(None)
+    return sessions.stats()
+
+@app.get("/pool_stats")
+def pool_stats():
+    """
+    Worker pool usage: workers, concurrency limit, in-flight and waiting calls.
+    """
+    return {"data": data_pool.stats()}
+
+@app.get("/upstream_stats")
+def upstream_stats():
+    """
+    Prediction mode, plus per-API calls, failures, latency and circuit breaker
+    state (http) or the predictors' startup status (inprocess).
+    """
+    return engine.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: request counters, prediction API latency and the
+    pool / upstream / stream / session stats as gauges.
+    """
+    return metrics_response()
+
+# /debug/profiler, only with ENABLE_DEBUG_PROFILER=1 (see instrumentation.py)
+add_profiler_routes(app)
+
+# The existing stats, exported as gauges at /metrics too
+instrumentation.collect("worker_pool", lambda: {"data": data_pool.stats()})
+instrumentation.collect("upstream", lambda: engine.stats().get("upstreams") or {})
+instrumentation.collect("live_stream", stream_stats)
+instrumentation.collect("sessions", lambda: sessions.stats() if sessions else {})
+
 # --- Root Endpoint ---
 @app.get("/")
 def read_root():
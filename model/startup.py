@@ -0,0 +1,160 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# --- Startup: background artifact loading, readiness and stage timings ---
+#
+# The services used to import TensorFlow / sklearn and load every artifact at
+# module import, so a worker could not answer anything for ~9s and a failed
+# load only surfaced as a 500 on the first request. Now the heavy imports live
+# inside the loaders, the app comes up immediately and loads in a background
+# thread (independent artifacts in parallel), and:
+#   /healthz  liveness: the process is up (always 200)
+#   /readyz   readiness: 200 once every required stage succeeded, 503 while
+#             starting or after a required stage failed; the body has the
+#             per-stage timings either way
+#
+# With STARTUP_FAIL_FAST=1 a failed required stage stops the process instead of
+# leaving it running unready, so the supervisor restarts it.
+
+STARTUP_WORKERS = int(os.environ.get("STARTUP_WORKERS", 4))
+STARTUP_FAIL_FAST = os.environ.get("STARTUP_FAIL_FAST", "0") == "1"
+
+
+# Two threads importing the same package for the first time can see it half
+# initialized ("cannot import name ... from partially initialized module", seen
+# with sklearn when two services unpickle models at once). Loaders whose first
+# call imports a heavy package (TensorFlow, sklearn through unpickling) run
+# under this process-wide lock; the rest of the loading stays parallel.
+IMPORT_LOCK = threading.Lock()
+
+
+class StartupError(RuntimeError):
+    pass
+
+
+def with_import_lock(loader):
+    """Wraps a loader to run under IMPORT_LOCK."""
+    def locked(*args, **kwargs):
+        with IMPORT_LOCK:
+            return loader(*args, **kwargs)
+    return locked
+
+
+class Startup:
+    """
+    Runs a service's loading stages, records how long each took and whether it
+    succeeded, and answers the liveness / readiness probes.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+        self.status = "starting" # -> "ready" | "failed"
+        self.stages = {} # name -> {"seconds", "ok", "required", "error"}
+        self.created_at = time.perf_counter()
+        self.total_seconds = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, required: bool = True):
+        """
+        Times the block as stage 'name'. A failing optional stage is logged and
+        swallowed; a failing required one is recorded and re-raised.
+        """
+        start = time.perf_counter()
+        record = {"seconds": None, "ok": False, "required": required, "error": None}
+        try:
+            yield
+            record["ok"] = True
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            if required:
+                raise
+            print(f"WARNING: [{self.service}] optional startup stage '{name}' failed. {e}")
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            with self._lock:
+                self.stages[name] = record
+            # One write, so lines from parallel stages don't interleave
+            print(f"[{self.service}] {name}: {record['seconds']:.3f}s{'' if record['ok'] else ' (FAILED)'}\n", end="")
+
+    def run_parallel(self, loaders: dict, optional=()) -> dict:
+        """
+        Runs {stage name: zero-argument loader} concurrently, each as its own stage.
+        Returns {stage name: result} (None for failed optional stages) and raises
+        StartupError naming every required stage that failed.
+        """
+        def run(name, loader):
+            with self.stage(name, required=name not in optional):
+                return loader()
+
+        with ThreadPoolExecutor(max_workers=STARTUP_WORKERS, thread_name_prefix="startup") as executor:
+            futures = {name: executor.submit(run, name, loader) for name, loader in loaders.items()}
+        results, failed = {}, []
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception:
+                failed.append(name)
+        if failed:
+            raise StartupError(f"required startup stages failed: {', '.join(failed)}")
+        return results
+
+    def run(self, load_fn):
+        """
+        Runs 'load_fn' (which calls stage() / run_parallel()) and marks the service
+        ready or failed.
+        """
+        try:
+            load_fn()
+            self.status = "ready"
+        except Exception as e:
+            self.status = "failed"
+            print(f"FATAL ERROR: [{self.service}] startup failed. {e}")
+        finally:
+            self.total_seconds = round(time.perf_counter() - self.created_at, 4)
+            print(f"\n--- [{self.service}] {self.status.upper()} after {self.total_seconds:.2f}s ---")
+        if self.status == "failed" and STARTUP_FAIL_FAST:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def run_in_background(self, load_fn) -> threading.Thread:
+        """run(load_fn) in a daemon thread, so the server answers probes meanwhile."""
+        thread = threading.Thread(target=self.run, args=(load_fn,), name=f"{self.service}-startup", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def unavailable(self, detail: str) -> HTTPException:
+        """
+        The error for a request that needs artifacts that aren't loaded: 503 while
+        still starting (retry later), 500 if loading failed.
+        """
+        if self.status == "starting":
+            return HTTPException(status_code=503, detail=f"{self.service} is still starting up.")
+        return HTTPException(status_code=500, detail=detail)
+
+    def report(self) -> dict:
+        with self._lock:
+            stages = dict(self.stages)
+        return {
+            "service": self.service,
+            "status": self.status,
+            "total_seconds": self.total_seconds,
+            "stages": stages,
+            "errors": {name: s["error"] for name, s in stages.items() if s["error"]},
+        }
+
+    def liveness(self) -> dict:
+        return {"status": "alive", "uptime_seconds": round(time.perf_counter() - self.created_at, 3)}
+
+    def readiness(self) -> JSONResponse:
+        return JSONResponse(self.report(), status_code=200 if self.ready else 503)
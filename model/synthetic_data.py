@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from feature_buffer import WEATHER_COLUMNS
+
+# --- Synthetic request payloads ---
+#
+# Realistic-looking inputs for the prediction APIs, generated locally so load
+# tests and benchmarks don't need the real CSVs (or the rainfall artifact).
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+MONTHLY_ANNUAL_FEATURES = {
+    'Companies_Newly_Registered': 15000.0,
+    'Land_Net_Area_Sown': 22000.0,
+    'Labour_Force_Participation_All': 40.0,
+    'Total_Vehicles_Plying': 12000000.0,
+}
+
+
+def make_5min_frame(rows: int = 2304, start: str = "2024-10-01 00:00:00", seed: int = 0) -> pd.DataFrame:
+    """
+    5-minute raw history in the RawDataPoint layout ('Power_demand' column),
+    with a daily demand cycle and noisy weather.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(start, periods=rows, freq="5min")
+    day_phase = 2 * np.pi * np.arange(rows) / 288.0
+    demand = 3500 + 900 * np.sin(day_phase - np.pi / 2) + rng.normal(0, 60, rows)
+
+    df = pd.DataFrame({
+        'datetime': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+        'Power_demand': demand,
+        'temp': 28 + 6 * np.sin(day_phase - np.pi / 2) + rng.normal(0, 0.5, rows),
+        'dwpt': 15 + rng.normal(0, 1, rows),
+        'rhum': np.clip(55 + rng.normal(0, 8, rows), 5, 100),
+        'wdir': rng.uniform(0, 360, rows),
+        'wspd': np.abs(rng.normal(8, 3, rows)),
+        'pres': 1008 + rng.normal(0, 2, rows),
+    })
+    df['moving_avg_3'] = df['Power_demand'].rolling(3, min_periods=1).mean()
+    return df
+
+
+def make_5min_payload(rows: int = 2304, start: str = "2024-10-01 00:00:00", seed: int = 0) -> list:
+    """JSON body for POST /predict."""
+    return make_5min_frame(rows, start, seed).to_dict(orient='records')
+
+
+def make_monthly_frame(months: int = 15, start_year: int = 2023, start_month: int = 1,
+                       seed: int = 0) -> pd.DataFrame:
+    """
+    Monthly history in the MonthlyDataPoint layout, with a summer peak.
+    """
+    rng = np.random.default_rng(seed)
+    periods = pd.period_range(f"{start_year}-{start_month:02d}", periods=months, freq="M")
+    month = periods.month.to_numpy()
+    season = np.sin(2 * np.pi * (month - 4) / 12.0)
+
+    df = pd.DataFrame({
+        'Year': periods.year.to_numpy(),
+        'Month': month,
+        'Total_Demand_kW': 2.6e7 + 6e6 * season + rng.normal(0, 4e5, months),
+        'temp': 25 + 9 * season + rng.normal(0, 1, months),
+        'dwpt': 14 + 5 * season + rng.normal(0, 1, months),
+        'rhum': 55 + rng.normal(0, 5, months),
+        'wdir': rng.uniform(0, 360, months),
+        'wspd': np.abs(rng.normal(8, 2, months)),
+        'pres': 1008 + rng.normal(0, 2, months),
+        'Total_Rainfall_mm': np.clip(60 + 120 * season + rng.normal(0, 20, months), 0, None),
+    })
+    for name, value in MONTHLY_ANNUAL_FEATURES.items():
+        df[name] = value
+    return df
+
+
+def make_monthly_payload(months: int = 15, start_year: int = 2023, start_month: int = 1,
+                         seed: int = 0) -> list:
+    """JSON body for POST /predict_monthly."""
+    return make_monthly_frame(months, start_year, start_month, seed).to_dict(orient='records')
+
+
+def make_rainfall_frame(start_year: int = 2021, end_year: int = 2025, seed: int = 0) -> pd.DataFrame:
+    """
+    Monthly rainfall in the wide layout of model_artifacts/monthly_rainfall.csv
+    (Year, Metric, Jan..Dec; 'Rainy Days' and 'Total Rainfall' rows per year),
+    with a monsoon peak. Write it with to_csv(index=False).
+    """
+    rng = np.random.default_rng(seed)
+    monsoon = np.exp(-0.5 * ((np.arange(1, 13) - 7.5) / 1.5) ** 2)
+    rows = []
+    for year in range(start_year, end_year + 1):
+        total = np.clip(10 + 220 * monsoon + rng.normal(0, 10, 12), 0, None).round(1)
+        rainy_days = np.clip(1 + 14 * monsoon + rng.normal(0, 1, 12), 0, 31).round()
+        rows.append({'Year': year, 'Metric': 'Rainy Days', **dict(zip(MONTH_NAMES, rainy_days))})
+        rows.append({'Year': year, 'Metric': 'Total Rainfall', **dict(zip(MONTH_NAMES, total))})
+    return pd.DataFrame(rows)
+
+
+def save_demand_model(path: str, n_features: int, timesteps: int = 288, seed: int = 0):
+    """
+    Saves an untrained Keras model with the layers of best_demand_model.keras
+    (LSTM 100 -> LSTM 50 -> Dense 1) for (timesteps, n_features) windows, so
+    benchmarks and tests can load a model as wide as whatever scaler they use.
+    """
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(seed)
+    model = tf.keras.Sequential([
+        tf.keras.Input((timesteps, n_features)),
+        tf.keras.layers.LSTM(100, return_sequences=True),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.LSTM(50),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(1),
+    ])
+    model.save(path)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The services are flat scripts run from model/: import them from there and
+# resolve their relative model_artifacts/ paths from there
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODEL_DIR)
+os.chdir(MODEL_DIR)
+
+# Tests exercise the uncached path unless they build their own cache
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+
+
+@pytest.fixture(scope="session")
+def suite():
+    """
+    The benchmark suite's setup: main.py on synthetic rainfall (features()) or
+    fully loaded with an untrained scaler-width demand model (main()).
+    """
+    from benchmark import Suite
+    return Suite()
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from affine_scaler import AffineScaler
+from feature_buffer import WEATHER_COLUMNS, RollingFeatureBuffer
+from synthetic_data import make_5min_frame
+
+# The fast paths against the pandas pipeline they replaced: the calendar table
+# against feature_engineer()'s step-by-step columns, and the rolling buffer
+# against re-running feature_engineer() + the sklearn scaler on the grown window.
+
+
+@pytest.fixture(scope="module")
+def main(suite):
+    return suite.features()
+
+
+@pytest.fixture(scope="module")
+def sklearn_scaler(main):
+    return main.load_scaler()
+
+
+def raw_window(rows: int = 2304, start: str = "2024-10-01 00:00:00") -> pd.DataFrame:
+    return make_5min_frame(rows, start).rename(columns={"Power_demand": "Power demand"})
+
+
+def old_loop_row(window: pd.DataFrame, predicted: float) -> dict:
+    """The raw row the original recursive loop appended for a prediction."""
+    last = window.iloc[-1]
+    return {
+        "datetime": (pd.to_datetime(last['datetime']) + timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S'),
+        "Power demand": predicted,
+        "moving_avg_3": (predicted + last['Power demand'] + window.iloc[-2]['Power demand']) / 3.0,
+        **{col: last[col] for col in WEATHER_COLUMNS},
+    }
+
+
+def scaled_tail(main, sklearn_scaler, window: pd.DataFrame) -> np.ndarray:
+    features_df = main.feature_engineer(window)
+    return sklearn_scaler.transform(features_df.tail(main.TIMESTEPS)[sklearn_scaler.feature_names_in_])
+
+
+# The second window crosses into October (rainfall and season change) and
+# over the Oct 2 holiday
+@pytest.mark.parametrize("start", ["2024-10-01 00:00:00", "2024-09-24 13:35:00"])
+def test_calendar_table_matches_pandas_pipeline(main, monkeypatch, start):
+    window = raw_window(start=start)
+    from_table = main.feature_engineer(window)
+    monkeypatch.setattr(main, "CALENDAR", None)
+    step_by_step = main.feature_engineer(window)
+    # Same columns, order and values; pandas' .dt accessors may return int32
+    pd.testing.assert_frame_equal(from_table, step_by_step, check_dtype=False)
+
+
+def test_calendar_table_falls_back_outside_its_years(main):
+    window = raw_window(start=f"{main.CALENDAR_END_YEAR + 1}-03-01 00:00:00")
+    assert main.CALENDAR.offsets(pd.to_datetime(window['datetime']).to_numpy()) is None
+
+
+def test_rolling_buffer_matches_feature_engineer(main, sklearn_scaler):
+    window = raw_window()
+    buffer = RollingFeatureBuffer(
+        window, main.feature_engineer(window), AffineScaler.from_sklearn(sklearn_scaler),
+        main.HOLIDAY_DATES, main.RAINFALL_LOOKUP, main.TIMESTEPS
+    )
+    np.testing.assert_allclose(buffer.window(), scaled_tail(main, sklearn_scaler, window), atol=1e-5)
+
+    # Predictions that cross midnight, fed back like the recursive loop does
+    for predicted in np.linspace(3000.0, 4200.0, 300):
+        buffer.advance(predicted)
+        window = pd.concat([window, pd.DataFrame([old_loop_row(window, predicted)])], ignore_index=True)
+    np.testing.assert_allclose(buffer.window(), scaled_tail(main, sklearn_scaler, window), atol=1e-5)
+
+
+def test_forked_trajectories_match_separate_buffers(main, sklearn_scaler):
+    window = raw_window()
+    buffer = RollingFeatureBuffer(
+        window, main.feature_engineer(window), AffineScaler.from_sklearn(sklearn_scaler),
+        main.HOLIDAY_DATES, main.RAINFALL_LOOKUP, main.TIMESTEPS
+    )
+    ensemble = buffer.fork(2)
+    rng = np.random.default_rng(0)
+    weather = rng.normal(20.0, 5.0, (5, 2, len(WEATHER_COLUMNS)))
+    demand = rng.normal(3500.0, 100.0, (5, 2))
+    singles = [buffer.fork(1), buffer.fork(1)]
+    for step in range(5):
+        ensemble.advance(demand[step], weather[step])
+        for k, single in enumerate(singles):
+            single.advance(demand[step, k], weather[step, k:k + 1])
+
+    for k, single in enumerate(singles):
+        np.testing.assert_array_equal(ensemble.windows()[k], single.window())
+    # fork() leaves the original alone
+    np.testing.assert_allclose(buffer.window(), scaled_tail(main, sklearn_scaler, window), atol=1e-5)
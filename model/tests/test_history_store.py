@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from history_store import VALUE_COLUMNS, HistoryStore, RowNotStored
+
+
+def rows(start: str, count: int, first_value: float = 0.0) -> pd.DataFrame:
+    """'count' raw rows every 5 minutes from 'start'; every column holds the row number."""
+    values = first_value + np.arange(count, dtype=np.float64)
+    return pd.DataFrame({
+        'datetime': pd.date_range(start, periods=count, freq="5min").strftime('%Y-%m-%d %H:%M:%S'),
+        **{col: values for col in VALUE_COLUMNS},
+    })
+
+
+def test_window_returns_the_rows_ending_at_a_timestamp():
+    store = HistoryStore(capacity=100)
+    assert store.append(rows("2024-01-01 00:00:00", 50)) == 50
+
+    window = store.window(10, end="2024-01-01 01:00:00")
+    assert list(window['Power demand']) == list(np.arange(3.0, 13.0))
+    assert window['datetime'].iloc[-1] == pd.Timestamp("2024-01-01 01:00:00")
+    assert list(store.window(5)['Power demand']) == list(np.arange(45.0, 50.0))
+
+
+def test_retried_rows_are_skipped():
+    store = HistoryStore(capacity=100)
+    store.append(rows("2024-01-01 00:00:00", 10))
+    # Overlaps the last 5 stored rows, then continues
+    assert store.append(rows("2024-01-01 00:25:00", 10, first_value=5.0)) == 5
+    assert store.append(rows("2024-01-01 00:25:00", 10, first_value=5.0)) == 0
+    assert len(store) == 15
+    assert list(store.window(15)['Power demand']) == list(np.arange(15.0))
+
+
+@pytest.mark.parametrize("batch", [
+    rows("2024-01-01 01:00:00", 3), # gap after the stored rows
+    pd.concat([rows("2024-01-01 00:50:00", 2), rows("2024-01-01 01:10:00", 2)]), # gap inside the batch
+])
+def test_appends_off_the_5_minute_grid_are_rejected(batch):
+    store = HistoryStore(capacity=100)
+    store.append(rows("2024-01-01 00:00:00", 10))
+    with pytest.raises(ValueError, match="5 minutes apart"):
+        store.append(batch)
+    assert len(store) == 10
+
+
+def test_unordered_rows_are_rejected():
+    store = HistoryStore(capacity=100)
+    with pytest.raises(ValueError, match="increasing"):
+        store.append(rows("2024-01-01 00:00:00", 5).iloc[::-1])
+
+
+def test_only_the_newest_capacity_rows_are_kept():
+    store = HistoryStore(capacity=20)
+    for batch in range(7): # 70 rows through a buffer of 2 * 20
+        store.append(rows("2024-01-01 00:00:00", 70).iloc[batch * 10:(batch + 1) * 10])
+
+    assert len(store) <= 2 * 20
+    window = store.window(20)
+    assert list(window['Power demand']) == list(np.arange(50.0, 70.0))
+    assert store.latest == np.datetime64("2024-01-01 05:45:00")
+    # Evicted rows are gone
+    with pytest.raises(ValueError, match="Not enough history"):
+        store.window(len(store) + 1)
+
+
+def test_missing_rows_and_short_history():
+    store = HistoryStore(capacity=100)
+    with pytest.raises(ValueError, match="empty"):
+        store.window(1)
+    store.append(rows("2024-01-01 00:00:00", 10))
+    with pytest.raises(RowNotStored):
+        store.window(1, end="2024-01-01 00:02:00")
+    with pytest.raises(RowNotStored):
+        store.window(1, end="2023-12-31 23:55:00")
+    with pytest.raises(ValueError, match="Not enough history"):
+        store.window(11)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "history.npz")
+    store = HistoryStore(capacity=100, path=path)
+    store.append(rows("2024-01-01 00:00:00", 30))
+    store.save()
+
+    reloaded = HistoryStore(capacity=100, path=path)
+    pd.testing.assert_frame_equal(reloaded.window(30), store.window(30))
+
+
+def test_predict_at_answers_404_for_an_unknown_timestamp(monkeypatch):
+    import main
+    store = HistoryStore(capacity=100)
+    store.append(rows("2024-01-01 00:00:00", 10))
+    monkeypatch.setattr(main, "history_store", store)
+    # Past the "artifacts loaded" check; the store lookup fails first
+    monkeypatch.setattr(main, "runner", object())
+    monkeypatch.setattr(main, "scaler", object())
+
+    client = TestClient(main.app)
+    response = client.post("/predict_at", params={"timestamp": "2024-01-01 00:02:00"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No stored row at 2024-01-01T00:02:00."
+
+    response = client.post("/predict_at")
+    assert response.status_code == 400
+    assert "Not enough history" in response.json()["detail"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from inference import load_runner
+from micro_batcher import MicroBatcher
+from synthetic_data import save_demand_model
+
+# Batched forward passes against one-window calls of the same model, and the
+# batcher's dispatch / failure behaviour on a NumPy stand-in model.
+
+
+@pytest.fixture(scope="module")
+def runner(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("model") / "demand_model.keras")
+    save_demand_model(path, n_features=13)
+    model_runner = load_runner(path, "demand", backend="keras")
+    model_runner.warm_up()
+    return model_runner
+
+
+def windows(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((count, 288, 13), dtype=np.float32)
+
+
+async def submit_all(batcher: MicroBatcher, batch: np.ndarray) -> list:
+    return await asyncio.gather(*(batcher.submit(window) for window in batch))
+
+
+def test_batched_outputs_match_sequential_calls(runner):
+    inputs = windows(20)
+    batcher = MicroBatcher(runner.predict, max_batch_size=8, max_wait_ms=50)
+    batched = np.stack(asyncio.run(submit_all(batcher, inputs)))
+    sequential = np.stack([runner.predict(window[None])[0] for window in inputs])
+
+    assert batcher.batches < len(inputs) # the windows really were batched
+    # Scaled outputs; batching only changes float32 rounding
+    np.testing.assert_allclose(batched, sequential, atol=1e-5)
+
+
+def test_each_caller_gets_its_own_row():
+    batcher = MicroBatcher(lambda batch: batch[:, 0, :1] * 2.0, max_batch_size=4, max_wait_ms=50)
+    inputs = windows(10)
+    outputs = asyncio.run(submit_all(batcher, inputs))
+    np.testing.assert_array_equal(np.stack(outputs), inputs[:, 0, :1] * 2.0)
+    stats = batcher.stats()
+    assert stats["requests"] == 10
+    assert max(stats["batch_size_counts"]) <= 4
+
+
+def test_lone_caller_does_not_wait():
+    batcher = MicroBatcher(lambda batch: batch[:, 0, :1], max_wait_ms=10_000)
+
+    async def recursive(steps: int):
+        with batcher.active():
+            for window in windows(steps):
+                await batcher.submit(window)
+
+    asyncio.run(asyncio.wait_for(recursive(5), timeout=5))
+    assert batcher.immediate_batches == batcher.batches == 5
+
+
+def test_model_errors_reach_every_caller():
+    def broken(batch):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(broken, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(window) for window in windows(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache, cache_key, frame_fingerprint
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache.time, "time", clock.time)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache("test", max_entries=4, ttl_seconds=60, shared_path=None)
+    cache.put("key", [1.0, 2.0])
+    clock.now += 59
+    assert cache.get("key") == [1.0, 2.0]
+    clock.now += 2
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PredictionCache("test", max_entries=2, ttl_seconds=60, shared_path=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_store_serves_other_workers_until_expiry(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = PredictionCache("test", max_entries=4, ttl_seconds=60, shared_path=path)
+    reader = PredictionCache("test", max_entries=4, ttl_seconds=60, shared_path=path)
+    writer.put("key", {"predicted_demand_kw": [1.5]})
+    assert reader.get("key") == {"predicted_demand_kw": [1.5]}
+    assert reader.stats()["shared_hits"] == 1
+
+    clock.now += 61
+    assert PredictionCache("test", max_entries=4, ttl_seconds=60, shared_path=path).get("key") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache("test", max_entries=0, shared_path=None)
+    cache.put("key", 1)
+    assert cache.get("key") is None
+
+
+def test_fingerprint_changes_with_any_value():
+    frame = pd.DataFrame({"datetime": ["2024-01-01 00:00:00"] * 3, "value": np.arange(3.0)})
+    changed = frame.copy()
+    changed.loc[2, "value"] = 2.0000001
+    assert frame_fingerprint(frame) == frame_fingerprint(frame.copy())
+    assert frame_fingerprint(frame) != frame_fingerprint(changed)
+    assert cache_key("predict", 1, frame_fingerprint(frame)) != cache_key("predict", 2, frame_fingerprint(frame))
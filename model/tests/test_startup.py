@@ -0,0 +1,51 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from startup import Startup
+from synthetic_data import make_rainfall_frame, save_demand_model
+
+# main.py's load_artifacts() against synthetic rainfall and an untrained demand
+# model whose width is chosen per test; the scaler is the shipped one.
+
+
+@pytest.fixture
+def main_module(tmp_path, monkeypatch):
+    import main
+    # Start unloaded and undo everything load_artifacts() assigns, so other
+    # tests see main.py as it was
+    for name in ["runner", "scaler", "feature_scaler", "RESIDUAL_SIGMA", "RAINFALL_DATA", "HOLIDAY_LIST",
+                 "RAINFALL_LOOKUP", "HOLIDAY_DATES", "CALENDAR"]:
+        monkeypatch.setattr(main, name, None)
+    for name in ["horizon_runners", "batchers", "MODEL_VERSIONS"]:
+        monkeypatch.setattr(main, name, {})
+    monkeypatch.setattr(main, "startup", Startup("demand-api"))
+    monkeypatch.setattr(main, "HORIZON_MODEL_PATHS", {})
+    monkeypatch.setattr(main, "MODEL_PATH", str(tmp_path / "demand_model.keras"))
+    monkeypatch.setattr(main, "RAINFALL_CSV_PATH", str(tmp_path / "monthly_rainfall.csv"))
+    monkeypatch.setattr(main, "CALENDAR_TABLE_PATH", str(tmp_path / "calendar_features.npz"))
+    make_rainfall_frame(main.CALENDAR_START_YEAR, main.CALENDAR_END_YEAR).to_csv(main.RAINFALL_CSV_PATH, index=False)
+    return main
+
+
+def load_with_width(main, n_features: int):
+    save_demand_model(main.MODEL_PATH, n_features, main.TIMESTEPS)
+    main.startup.run(main.load_artifacts)
+    return TestClient(main.app).get("/readyz")
+
+
+def test_matching_model_is_ready(main_module):
+    response = load_with_width(main_module, len(main_module.load_scaler().feature_names_in_))
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert response.json()["stages"]["input_width"]["ok"]
+
+
+def test_mismatched_model_fails_readiness(main_module):
+    n_features = len(main_module.load_scaler().feature_names_in_)
+    response = load_with_width(main_module, n_features + 1)
+    assert response.status_code == 503
+    body = response.json()
+    assert body["status"] == "failed"
+    assert f"expects {n_features + 1} input features" in body["errors"]["input_width"]
+    assert f"has {n_features}" in body["errors"]["input_width"]
+    assert main_module.runner is None
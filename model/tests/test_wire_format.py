@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from wire_format import (
+    ARROW, JSON, MSGPACK, NPZ, WireFormatError, columns_to_frame, decode_columns, encode_columns, msgpack,
+    negotiate, pa, parse_rows
+)
+
+# Columnar bodies must parse to the same DataFrame as the JSON rows they replace.
+
+SCHEMA = {"datetime": "datetime", "count": "int", "value": "float"}
+
+FORMATS = [
+    NPZ,
+    pytest.param(ARROW, marks=pytest.mark.skipif(pa is None, reason="pyarrow not installed")),
+    pytest.param(MSGPACK, marks=pytest.mark.skipif(msgpack is None, reason="msgpack not installed")),
+]
+
+
+class Row(BaseModel):
+    datetime: str
+    count: int
+    value: float
+
+
+def columns() -> dict:
+    return {
+        "datetime": pd.date_range("2024-01-01", periods=5, freq="5min").to_numpy(),
+        "count": np.arange(5, dtype=np.int64),
+        "value": np.linspace(0.1, 0.5, 5),
+    }
+
+
+def json_rows() -> bytes:
+    frame = pd.DataFrame(columns())
+    frame["datetime"] = frame["datetime"].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return json.dumps(frame.to_dict(orient="records")).encode()
+
+
+@pytest.mark.parametrize("content_type", FORMATS)
+def test_columns_round_trip(content_type):
+    decoded = decode_columns(encode_columns(columns(), content_type), content_type)
+    np.testing.assert_array_equal(decoded["count"], columns()["count"])
+    np.testing.assert_array_equal(decoded["value"], columns()["value"])
+    assert list(pd.to_datetime(decoded["datetime"])) == list(pd.to_datetime(columns()["datetime"]))
+
+
+@pytest.mark.parametrize("content_type", FORMATS)
+def test_columnar_body_parses_like_json_rows(content_type):
+    from_json = parse_rows(json_rows(), JSON, Row, SCHEMA)
+    from_columns = parse_rows(encode_columns(columns(), content_type), content_type, Row, SCHEMA)
+    pd.testing.assert_frame_equal(from_columns, from_json)
+
+
+def test_in_process_frames_keep_datetime64():
+    frame = columns_to_frame(columns(), SCHEMA, normalize_datetimes=False)
+    assert frame["datetime"].dtype.kind == "M"
+    assert list(frame["datetime"]) == list(pd.to_datetime(columns()["datetime"]))
+
+
+@pytest.mark.parametrize("broken, message", [
+    ({"count": np.arange(5), "value": np.zeros(5)}, "Missing columns"),
+    ({**columns(), "value": np.zeros(4)}, "different lengths"),
+    ({**columns(), "value": np.zeros((5, 2))}, "1-D"),
+    ({**columns(), "count": np.linspace(0, 1, 5)}, "whole numbers"),
+    ({**columns(), "value": np.array(["a"] * 5)}, "not a valid float column"),
+])
+def test_invalid_columns_are_rejected(broken, message):
+    with pytest.raises(WireFormatError, match=message):
+        columns_to_frame(broken, SCHEMA)
+
+
+def test_bad_bodies_map_to_http_errors():
+    with pytest.raises(HTTPException) as error:
+        parse_rows(b"not json", JSON, Row, SCHEMA)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        parse_rows(b"[]", "text/csv", Row, SCHEMA)
+    assert error.value.status_code == 415
+    with pytest.raises(HTTPException) as error:
+        parse_rows(b"garbage", NPZ, Row, SCHEMA)
+    assert error.value.status_code == 400
+
+
+def test_negotiate_prefers_the_first_supported_columnar_type():
+    assert negotiate(None) == JSON
+    assert negotiate("text/html, application/x-npz;q=0.9") == NPZ
+    assert negotiate("application/x-unknown") == JSON
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+
+import httpx
+
+from instrumentation import UPSTREAM_SECONDS
+
+# --- Pooled async client for the prediction APIs ---
+#
+# The simulators call main.py (8000) and monthly_api.py (8001) on every tick.
+# All calls go through one httpx.AsyncClient, so connections are kept alive
+# and reused instead of opening a new TCP connection per request. Each
+# upstream has its own timeout and concurrency limit, plus a circuit breaker:
+# after 'failure_threshold' consecutive failures (connection errors, timeouts,
+# 5xx) calls fail immediately with CircuitOpenError for 'reset_timeout'
+# seconds, then a single trial request decides whether to close it again.
+
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", 20))
+UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", 5))
+UPSTREAM_RESET_TIMEOUT_SECONDS = float(os.environ.get("UPSTREAM_RESET_TIMEOUT_SECONDS", 10))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after 'failure_threshold' consecutive failures; open -> half-open
+    after 'reset_timeout' seconds, where one trial call closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = UPSTREAM_FAILURE_THRESHOLD,
+                 reset_timeout: float = UPSTREAM_RESET_TIMEOUT_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the trial slot when half-open)."""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_cancelled(self):
+        """The call never finished (caller went away): free the trial slot, no verdict."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class Upstream:
+    """
+    One upstream API: base URL, timeout (seconds), concurrency limit and breaker.
+    """
+
+    def __init__(self, name: str, base_url: str, timeout: float, max_concurrency: int):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 2.0))
+        self.max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.total_ms = 0.0
+
+
+class UpstreamClient:
+    """
+    Shared keep-alive client for a set of named Upstreams.
+    """
+
+    def __init__(self, upstreams, max_connections: int = UPSTREAM_MAX_CONNECTIONS):
+        self.upstreams = {u.name: u for u in upstreams}
+        self.max_connections = max_connections
+        self._client = None
+
+    def open(self):
+        """Creates the connection pool. Call from the app's startup event."""
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections)
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, upstream_name: str, path: str, **kwargs) -> httpx.Response:
+        """
+        POSTs to 'path' on the named upstream and returns the response after
+        raise_for_status(). Raises CircuitOpenError without calling it if its
+        circuit is open, httpx.HTTPError on failure.
+        """
+        upstream = self.upstreams[upstream_name]
+        if not upstream.breaker.allow():
+            UPSTREAM_SECONDS.observe(0.0, upstream=upstream_name, outcome="circuit_open")
+            raise CircuitOpenError(f"{upstream_name} is failing, circuit open.")
+
+        async with upstream._semaphore:
+            upstream.in_flight += 1
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = await self._client.post(upstream.base_url + path, timeout=upstream.timeout, **kwargs)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                # A 4xx is the caller's fault, the upstream itself is healthy
+                outcome = f"http_{e.response.status_code // 100}xx"
+                if e.response.status_code >= 500:
+                    upstream.failures += 1
+                    upstream.breaker.record_failure()
+                else:
+                    upstream.breaker.record_success()
+                raise
+            except httpx.HTTPError:
+                upstream.failures += 1
+                upstream.breaker.record_failure()
+                raise
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                upstream.breaker.record_cancelled()
+                raise
+            else:
+                outcome = "ok"
+            finally:
+                elapsed = time.perf_counter() - start
+                upstream.in_flight -= 1
+                upstream.calls += 1
+                upstream.total_ms += elapsed * 1000.0
+                UPSTREAM_SECONDS.observe(elapsed, upstream=upstream_name, outcome=outcome)
+            upstream.breaker.record_success()
+            return response
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "base_url": u.base_url,
+                "timeout_seconds": u.timeout.read,
+                "max_concurrency": u.max_concurrency,
+                "in_flight": u.in_flight,
+                "calls": u.calls,
+                "failures": u.failures,
+                "mean_ms": round(u.total_ms / u.calls, 3) if u.calls else None,
+                "circuit": u.breaker.stats(),
+            }
+            for name, u in self.upstreams.items()
+        }
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# --- Bounded worker pools for blocking work ---
+#
+# The FastAPI handlers are 'async def', so any pandas / TensorFlow / sklearn
+# work done inline blocks every other request on the uvicorn worker. Handlers
+# hand that work to a named pool instead. Each pool has a fixed number of
+# workers plus a concurrency limit: at most 'max_concurrency' calls are queued
+# or running at once, later callers wait on the event loop (cheaply) instead
+# of piling up inside the executor.
+
+
+def pool_size_from_env(name: str, default: int) -> int:
+    """Reads e.g. FEATURES_POOL_WORKERS for a pool called 'features'."""
+    return int(os.environ.get(f"{name.upper()}_POOL_WORKERS", default))
+
+
+class BoundedPool:
+    """
+    A thread (or process) pool with an async, concurrency-limited run().
+    """
+
+    def __init__(self, name: str, max_workers: int, max_concurrency: int = None,
+                 kind: str = "thread"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers * 2
+        self.kind = kind
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) in the pool and awaits the result.
+        Exceptions (including HTTPException) propagate to the caller unchanged.
+        """
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)